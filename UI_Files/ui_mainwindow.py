@@ -2,7 +2,7 @@
 
 # Form implementation generated from reading ui file 'mainwindow.ui'
 #
-# Created by: PyQt5 UI code generator 5.15.10
+# Created by: PyQt5 UI code generator 5.15.11
 #
 # WARNING: Any manual changes made to this file will be lost when pyuic5 is
 # run again.  Do not edit this file unless you know what you are doing.
@@ -171,12 +171,10 @@ class Ui_MainWindow(object):
         self.fatLineEdit.setEnabled(True)
         self.fatLineEdit.setGeometry(QtCore.QRect(660, 320, 113, 26))
         self.fatLineEdit.setObjectName("fatLineEdit")
-        self.resultsTable = QtWidgets.QTableWidget(self.findArecipePage)
+        self.resultsTable = QtWidgets.QTableView(self.findArecipePage)
         self.resultsTable.setEnabled(False)
         self.resultsTable.setGeometry(QtCore.QRect(80, 380, 701, 192))
         self.resultsTable.setObjectName("resultsTable")
-        self.resultsTable.setColumnCount(0)
-        self.resultsTable.setRowCount(0)
         self.stackedWidget.addWidget(self.findArecipePage)
         self.recipePage = QtWidgets.QWidget()
         self.recipePage.setObjectName("recipePage")
@@ -308,18 +306,9 @@ class Ui_MainWindow(object):
         font.setBold(True)
         self.recipeIngredientsLabel.setFont(font)
         self.recipeIngredientsLabel.setObjectName("recipeIngredientsLabel")
-        self.recipeIngredientsList = QtWidgets.QTableWidget(self.addFoodsToRecipePage)
+        self.recipeIngredientsList = QtWidgets.QTableView(self.addFoodsToRecipePage)
         self.recipeIngredientsList.setGeometry(QtCore.QRect(50, 240, 921, 111))
         self.recipeIngredientsList.setObjectName("recipeIngredientsList")
-        self.recipeIngredientsList.setColumnCount(2)
-        self.recipeIngredientsList.setRowCount(0)
-        item = QtWidgets.QTableWidgetItem()
-        font = QtGui.QFont()
-        font.setBold(True)
-        item.setFont(font)
-        self.recipeIngredientsList.setHorizontalHeaderItem(0, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.recipeIngredientsList.setHorizontalHeaderItem(1, item)
         self.saveButton_4 = QtWidgets.QPushButton(self.addFoodsToRecipePage)
         self.saveButton_4.setGeometry(QtCore.QRect(350, 640, 261, 41))
         font = QtGui.QFont()
@@ -496,7 +485,7 @@ class Ui_MainWindow(object):
         font.setBold(True)
         self.tagsNameLabel.setFont(font)
         self.tagsNameLabel.setObjectName("tagsNameLabel")
-        self.tagsTableWidget = QtWidgets.QTableWidget(self.editCustomTagsPage)
+        self.tagsTableWidget = QtWidgets.QTableView(self.editCustomTagsPage)
         self.tagsTableWidget.setGeometry(QtCore.QRect(110, 280, 761, 241))
         sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Expanding)
         sizePolicy.setHorizontalStretch(0)
@@ -507,21 +496,6 @@ class Ui_MainWindow(object):
         font.setBold(False)
         self.tagsTableWidget.setFont(font)
         self.tagsTableWidget.setObjectName("tagsTableWidget")
-        self.tagsTableWidget.setColumnCount(3)
-        self.tagsTableWidget.setRowCount(0)
-        item = QtWidgets.QTableWidgetItem()
-        font = QtGui.QFont()
-        font.setBold(True)
-        item.setFont(font)
-        self.tagsTableWidget.setHorizontalHeaderItem(0, item)
-        item = QtWidgets.QTableWidgetItem()
-        item.setTextAlignment(QtCore.Qt.AlignTrailing|QtCore.Qt.AlignVCenter)
-        font = QtGui.QFont()
-        font.setBold(True)
-        item.setFont(font)
-        self.tagsTableWidget.setHorizontalHeaderItem(1, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.tagsTableWidget.setHorizontalHeaderItem(2, item)
         self.addNewTagButton = QtWidgets.QPushButton(self.editCustomTagsPage)
         self.addNewTagButton.setGeometry(QtCore.QRect(600, 200, 221, 41))
         font = QtGui.QFont()
@@ -571,29 +545,9 @@ class Ui_MainWindow(object):
         self.returnTohomeButton_3.setFont(font)
         self.returnTohomeButton_3.setStyleSheet("background-color: rgb(139, 196, 190);")
         self.returnTohomeButton_3.setObjectName("returnTohomeButton_3")
-        self.foodsTable = QtWidgets.QTableWidget(self.editFoodsandNutInfoPage)
+        self.foodsTable = QtWidgets.QTableView(self.editFoodsandNutInfoPage)
         self.foodsTable.setGeometry(QtCore.QRect(10, 260, 971, 192))
-        self.foodsTable.setColumnCount(9)
         self.foodsTable.setObjectName("foodsTable")
-        self.foodsTable.setRowCount(0)
-        item = QtWidgets.QTableWidgetItem()
-        self.foodsTable.setHorizontalHeaderItem(0, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.foodsTable.setHorizontalHeaderItem(1, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.foodsTable.setHorizontalHeaderItem(2, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.foodsTable.setHorizontalHeaderItem(3, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.foodsTable.setHorizontalHeaderItem(4, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.foodsTable.setHorizontalHeaderItem(5, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.foodsTable.setHorizontalHeaderItem(6, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.foodsTable.setHorizontalHeaderItem(7, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.foodsTable.setHorizontalHeaderItem(8, item)
         self.stackedWidget.addWidget(self.editFoodsandNutInfoPage)
         self.editFoodPage = QtWidgets.QWidget()
         self.editFoodPage.setObjectName("editFoodPage")
@@ -682,7 +636,7 @@ class Ui_MainWindow(object):
         self.addNewProteinTypeButton.setFont(font)
         self.addNewProteinTypeButton.setStyleSheet("background-color: rgb(139, 196, 190);")
         self.addNewProteinTypeButton.setObjectName("addNewProteinTypeButton")
-        self.proteinTypesTable = QtWidgets.QTableWidget(self.editProteinTypesPage)
+        self.proteinTypesTable = QtWidgets.QTableView(self.editProteinTypesPage)
         self.proteinTypesTable.setGeometry(QtCore.QRect(100, 250, 791, 192))
         sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Fixed, QtWidgets.QSizePolicy.Fixed)
         sizePolicy.setHorizontalStretch(3)
@@ -690,17 +644,6 @@ class Ui_MainWindow(object):
         sizePolicy.setHeightForWidth(self.proteinTypesTable.sizePolicy().hasHeightForWidth())
         self.proteinTypesTable.setSizePolicy(sizePolicy)
         self.proteinTypesTable.setObjectName("proteinTypesTable")
-        self.proteinTypesTable.setColumnCount(3)
-        self.proteinTypesTable.setRowCount(0)
-        item = QtWidgets.QTableWidgetItem()
-        font = QtGui.QFont()
-        font.setBold(True)
-        item.setFont(font)
-        self.proteinTypesTable.setHorizontalHeaderItem(0, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.proteinTypesTable.setHorizontalHeaderItem(1, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.proteinTypesTable.setHorizontalHeaderItem(2, item)
         self.newProteinTypeLabel = QtWidgets.QLabel(self.editProteinTypesPage)
         self.newProteinTypeLabel.setGeometry(QtCore.QRect(250, 160, 171, 31))
         font = QtGui.QFont()
@@ -788,8 +731,6 @@ class Ui_MainWindow(object):
         self.addFoodsButton.setText(_translate("MainWindow", "Add Foods"))
         self.submitArecipeLabel_2.setText(_translate("MainWindow", "Add or Edit Foods for Recipe"))
         self.recipeIngredientsLabel.setText(_translate("MainWindow", "Recipe Ingredients:"))
-        item = self.recipeIngredientsList.horizontalHeaderItem(0)
-        item.setText(_translate("MainWindow", "Food Name"))
         self.saveButton_4.setText(_translate("MainWindow", "Save and Continue"))
         self.findFoodLabel.setText(_translate("MainWindow", "Find food to add:"))
         self.ingredientSearchButton.setText(_translate("MainWindow", "Search"))
@@ -829,28 +770,12 @@ class Ui_MainWindow(object):
         self.notesLabel.setText(_translate("MainWindow", "Add Notes:"))
         self.editCustomTagsLabel.setText(_translate("MainWindow", "Manage Custom Tags"))
         self.tagsNameLabel.setText(_translate("MainWindow", "Existing Tags:"))
-        item = self.tagsTableWidget.horizontalHeaderItem(0)
-        item.setText(_translate("MainWindow", "Tag Name"))
         self.addNewTagButton.setText(_translate("MainWindow", "Add New Tag"))
         self.newTagNameLabel.setText(_translate("MainWindow", "New Tag Name:"))
         self.returnTohomeButton_2.setText(_translate("MainWindow", "Return to Home"))
         self.editFoodsAndNutLabel.setText(_translate("MainWindow", "Manage Foods and Nutrition Information"))
         self.addNewFoodItemButton.setText(_translate("MainWindow", "Add New Food Item"))
         self.returnTohomeButton_3.setText(_translate("MainWindow", "Return to Home"))
-        item = self.foodsTable.horizontalHeaderItem(0)
-        item.setText(_translate("MainWindow", "Food Name"))
-        item = self.foodsTable.horizontalHeaderItem(1)
-        item.setText(_translate("MainWindow", "Quantity"))
-        item = self.foodsTable.horizontalHeaderItem(2)
-        item.setText(_translate("MainWindow", "Size"))
-        item = self.foodsTable.horizontalHeaderItem(3)
-        item.setText(_translate("MainWindow", "Calories"))
-        item = self.foodsTable.horizontalHeaderItem(4)
-        item.setText(_translate("MainWindow", "Carbs"))
-        item = self.foodsTable.horizontalHeaderItem(5)
-        item.setText(_translate("MainWindow", "Fat"))
-        item = self.foodsTable.horizontalHeaderItem(6)
-        item.setText(_translate("MainWindow", "Protein"))
         self.addFoodsAndNutLabel.setText(_translate("MainWindow", "Add New Food and Nutrition Information"))
         self.foodNameLabel.setText(_translate("MainWindow", "Food Name:"))
         self.quantityLabel.setText(_translate("MainWindow", "Quantity:"))
@@ -863,8 +788,6 @@ class Ui_MainWindow(object):
         self.saveButton_7.setText(_translate("MainWindow", "Save and Return to New Recipe"))
         self.manageProteinTypesLabel.setText(_translate("MainWindow", "Manage Protein Types"))
         self.addNewProteinTypeButton.setText(_translate("MainWindow", "Add New Protein Type"))
-        item = self.proteinTypesTable.horizontalHeaderItem(0)
-        item.setText(_translate("MainWindow", "Protein Type"))
         self.newProteinTypeLabel.setText(_translate("MainWindow", "New Protein Type:"))
         self.returnTohomeButton_4.setText(_translate("MainWindow", "Return to Home"))
         self.menuManage_Data.setTitle(_translate("MainWindow", "Manage Data"))
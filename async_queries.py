@@ -0,0 +1,185 @@
+# async_queries.py
+import itertools
+import logging
+import threading
+import time
+
+from PyQt5.QtCore import QObject, QRunnable, QThread, QThreadPool, pyqtSignal
+
+from query_metrics import query_metrics
+
+
+class QuerySignals(QObject):
+    # Emitted from the worker thread, delivered to the GUI thread through queued connections
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, object)
+    # Always emitted last, also for cancelled requests
+    done = pyqtSignal(int)
+
+
+class QueryTask(QRunnable):
+    def __init__(self, request_id, database_manager, function, args, kwargs, action=None):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.request_id = request_id
+        self.database_manager = database_manager
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        # UI action the task's queries are attributed to in query_metrics
+        self.action = action
+        self.signals = QuerySignals()
+        self._cancelled = threading.Event()
+        # Set while the task holds its pooled connection, guarded by _connection_lock so cancel
+        # never interrupts a connection that has gone back to the pool
+        self._connection = None
+        self._connection_lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+        # Best effort, SQLite connections can abort a running statement
+        with self._connection_lock:
+            interrupt = getattr(self._connection, 'interrupt', None)
+            if interrupt is not None:
+                interrupt()
+
+    def run(self):
+        try:
+            with query_metrics.action(self.action):
+                self._run()
+        finally:
+            self.signals.done.emit(self.request_id)
+
+    def _run(self):
+        if self.cancelled:
+            return
+        try:
+            with self.database_manager.get_connection() as connection:
+                with self._connection_lock:
+                    self._connection = connection
+                try:
+                    if self.cancelled:
+                        return
+                    result = self.function(connection, *self.args, **self.kwargs)
+                finally:
+                    # Cleared before the connection goes back to the pool and to another task
+                    with self._connection_lock:
+                        self._connection = None
+        except Exception as error:
+            if not self.cancelled:
+                self.signals.failed.emit(self.request_id, error)
+            return
+        if not self.cancelled:
+            self.signals.finished.emit(self.request_id, result)
+
+
+class AsyncQueryRunner(QObject):
+    # Runs function(connection, *args) on a worker thread with its own pooled connection.
+    # A request submitted under a key supersedes the previous one with the same key, whose
+    # result is then dropped.
+    busy_changed = pyqtSignal(bool)
+
+    def __init__(self, database_manager, max_threads=None, parent=None):
+        super().__init__(parent)
+        self.database_manager = database_manager
+        self.thread_pool = QThreadPool(self)
+        if max_threads is None:
+            # One pooled connection stays pinned to the GUI thread
+            max_threads = max(1, min(database_manager.max_connections - 1, QThread.idealThreadCount()))
+        self.thread_pool.setMaxThreadCount(max_threads)
+        self._ids = itertools.count(1)
+        # request_id -> (key, task, on_result, on_error, submitted at)
+        self._requests = {}
+        self._latest = {}
+        # Tasks handed to the thread pool, kept referenced until they have run or been taken back
+        self._alive = {}
+
+    def submit(self, key, function, *args, on_result=None, on_error=None, **kwargs):
+        if key is not None:
+            self.cancel(key)
+        request_id = next(self._ids)
+        # Keyed requests are named after their key, the others after the slot that submitted them
+        action = key if key is not None else query_metrics.current_action()
+        task = QueryTask(request_id, self.database_manager, function, args, kwargs, action)
+        task.signals.finished.connect(self._on_finished)
+        task.signals.failed.connect(self._on_failed)
+        task.signals.done.connect(self._on_done)
+        self._alive[request_id] = task
+        was_busy = self.is_busy()
+        self._requests[request_id] = (key, task, on_result, on_error, time.perf_counter())
+        if key is not None:
+            self._latest[key] = request_id
+        self.thread_pool.start(task)
+        if not was_busy:
+            self.busy_changed.emit(True)
+        return request_id
+
+    def cancel(self, key):
+        request_id = self._latest.pop(key, None)
+        if request_id is not None:
+            self._cancel_request(request_id)
+
+    def cancel_all(self):
+        for request_id in list(self._requests):
+            self._cancel_request(request_id)
+        self._latest.clear()
+
+    def is_busy(self):
+        return bool(self._requests)
+
+    def wait(self, timeout_ms=-1):
+        return self.thread_pool.waitForDone(timeout_ms)
+
+    def _cancel_request(self, request_id):
+        request = self._requests.pop(request_id, None)
+        if request is None:
+            return
+        task = request[1]
+        task.cancel()
+        # Requests still queued never start, running ones finish and are ignored
+        if self.thread_pool.tryTake(task):
+            self._alive.pop(request_id, None)
+        logging.debug("Cancelled query request %s (%s)", request_id, request[0])
+        if not self._requests:
+            self.busy_changed.emit(False)
+
+    def _complete(self, request_id):
+        request = self._requests.pop(request_id, None)
+        if request is None:
+            return None
+        key = request[0]
+        if key is not None and self._latest.get(key) == request_id:
+            del self._latest[key]
+        elapsed_ms = (time.perf_counter() - request[4]) * 1000
+        logging.debug("Query request %s (%s) completed in %.0f ms", request_id, key, elapsed_ms)
+        if not self._requests:
+            self.busy_changed.emit(False)
+        return request
+
+    def _on_finished(self, request_id, result):
+        request = self._complete(request_id)
+        if request is not None and request[2] is not None:
+            self._deliver(request, request[2], result)
+
+    def _on_done(self, request_id):
+        self._alive.pop(request_id, None)
+
+    def _on_failed(self, request_id, error):
+        request = self._complete(request_id)
+        if request is None:
+            return
+        logging.error(f"Query request {request_id} ({request[0]}) failed: {error}")
+        if request[3] is not None:
+            self._deliver(request, request[3], error)
+
+    @staticmethod
+    def _deliver(request, callback, value):
+        # An exception escaping a slot would abort the application
+        try:
+            callback(value)
+        except Exception:
+            logging.exception(f"Error handling the result of query request ({request[0]})")
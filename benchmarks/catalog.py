@@ -0,0 +1,124 @@
+# benchmarks/catalog.py
+# Deterministic synthetic catalog for the benchmarks: the same counts and seed always give the
+# same foods, recipes, steps, tags and proteins, so timings can be compared run to run.
+import random
+
+from db_backends import SqliteBackend
+
+# Foods and recipes at each named scale, the related tables grow with them
+SCALES = {'10k': 10_000, '100k': 100_000, '1M': 1_000_000}
+
+DEFAULT_SEED = 20240
+# Recipes generated and inserted per batch, bounds memory at the 1M scale
+BATCH_SIZE = 50_000
+
+MEAL_TYPES = ["Breakfast", "Lunch", "Dinner", "Snack"]
+PROTEIN_NAMES = ["Chicken", "Beef", "Pork", "Tofu", "Salmon", "Tuna", "Turkey", "Lamb", "Shrimp", "Lentils",
+                 "Eggs", "Tempeh", "Cod", "Duck", "Chickpeas", "Seitan", "Beans", "Venison", "Crab", "Paneer"]
+FOOD_WORDS = ["apple", "banana", "rice", "oat", "bean", "lentil", "tomato", "onion", "garlic", "pepper",
+              "carrot", "potato", "spinach", "kale", "cheese", "yogurt", "milk", "butter", "flour", "sugar",
+              "almond", "walnut", "honey", "lemon", "lime", "basil", "ginger", "mushroom", "pasta", "bread"]
+FOOD_STYLES = ["raw", "cooked", "dried", "fresh", "frozen", "canned", "roasted", "ground", "sliced", "whole"]
+DISH_WORDS = ["salad", "soup", "stew", "curry", "bowl", "bake", "stir fry", "pie", "wrap", "skillet",
+              "casserole", "tacos", "risotto", "noodles", "sandwich", "porridge", "chili", "roast"]
+STEP_VERBS = ["chop", "mix", "simmer", "bake", "whisk", "fold", "grill", "season", "stir", "serve"]
+TAG_WORDS = ["Quick", "Vegan", "Cheap", "Spicy", "Family", "Holiday", "Light", "Hearty", "Kids", "Prep"]
+# (base serving amount, size) of a food's ServingInfo
+SERVINGS = [(1, 'cup'), (100, 'g'), (1, 'piece'), (1, 'tbsp'), (100, 'ml')]
+# Multiples of the base serving a recipe uses
+AMOUNTS = [0.5, 1, 1.5, 2, 3]
+
+
+def scale_counts(scale, steps_per_recipe=5, foods_per_recipe=6, tags=200, tags_per_recipe=2, proteins=20):
+    size = SCALES[scale] if isinstance(scale, str) else int(scale)
+    return {
+        'foods': size,
+        'recipes': size,
+        'steps_per_recipe': steps_per_recipe,
+        'foods_per_recipe': foods_per_recipe,
+        'tags': tags,
+        'tags_per_recipe': tags_per_recipe,
+        'proteins': proteins,
+    }
+
+
+def protein_name(protein_id):
+    base = PROTEIN_NAMES[(protein_id - 1) % len(PROTEIN_NAMES)]
+    return base if protein_id <= len(PROTEIN_NAMES) else f"{base} {protein_id}"
+
+
+def tag_name(tag_id):
+    return f"{TAG_WORDS[(tag_id - 1) % len(TAG_WORDS)]} {tag_id}"
+
+
+def generate_catalog(path, counts, seed=DEFAULT_SEED):
+    # Writes a fresh catalog into the SQLite database at path, recipe totals match their foods
+    rng = random.Random(seed)
+    connection = SqliteBackend(path).connect()
+    raw = connection.raw
+    cursor = raw.cursor()
+    foods, recipes = counts['foods'], counts['recipes']
+
+    cursor.executemany("INSERT INTO MealType (MealTypeId, MealTypeName) VALUES (?, ?)",
+                       enumerate(MEAL_TYPES, start=1))
+    cursor.executemany("INSERT INTO Proteins (ProteinId, ProteinName) VALUES (?, ?)",
+                       ((protein_id, protein_name(protein_id)) for protein_id in range(1, counts['proteins'] + 1)))
+    cursor.executemany("INSERT INTO CustomTags (TagId, TagName) VALUES (?, ?)",
+                       ((tag_id, tag_name(tag_id)) for tag_id in range(1, counts['tags'] + 1)))
+
+    # Nutrition per food is kept to derive the recipe totals without a recompute pass
+    nutrition = [None]
+    servings = []
+    names = []
+    for food_id in range(1, foods + 1):
+        serving = rng.choice(SERVINGS)
+        values = (round(rng.uniform(10, 400), 1), round(rng.uniform(0, 40), 1),
+                  round(rng.uniform(0, 80), 1), round(rng.uniform(0, 30), 1))
+        nutrition.append(values)
+        servings.append((food_id, serving[0], serving[1]))
+        names.append((food_id, food_id, f"{rng.choice(FOOD_STYLES)} {rng.choice(FOOD_WORDS)} {food_id}"))
+    cursor.executemany("INSERT INTO ServingInfo (ServId, NoServe, ServSize) VALUES (?, ?, ?)", servings)
+    cursor.executemany("INSERT INTO Foods (FoodId, ServId, FoodName) VALUES (?, ?, ?)", names)
+    cursor.executemany("INSERT INTO Nutrition (FoodId, Calories, Protein, Carbs, Fat) VALUES (?, ?, ?, ?, ?)",
+                       ((food_id, *nutrition[food_id]) for food_id in range(1, foods + 1)))
+    base_serving = [None] + [serving[1] for serving in servings]
+    del servings, names
+
+    tag_ids = range(1, counts['tags'] + 1)
+    tags_per_recipe = min(counts['tags_per_recipe'], counts['tags'])
+    for start in range(1, recipes + 1, BATCH_SIZE):
+        recipe_rows, food_rows, step_rows, tag_rows = [], [], [], []
+        for recipe_id in range(start, min(start + BATCH_SIZE, recipes + 1)):
+            totals = [0.0, 0.0, 0.0, 0.0]
+            ingredients = []
+            for _ in range(counts['foods_per_recipe']):
+                food_id = rng.randrange(1, foods + 1)
+                amount = rng.choice(AMOUNTS)
+                food_rows.append((recipe_id, food_id, amount * base_serving[food_id]))
+                ingredients.append(food_id)
+                for index, value in enumerate(nutrition[food_id]):
+                    totals[index] += value * amount
+            dish = rng.choice(DISH_WORDS)
+            main = rng.choice(FOOD_WORDS)
+            recipe_rows.append((
+                recipe_id, f"{main.title()} {dish} {recipe_id}", rng.randint(1, 6),
+                f"Cook the {main} {dish} and serve.", None if rng.random() < 0.5 else f"Tested {rng.randint(1, 9)}x",
+                *(round(total, 2) for total in totals),
+                rng.randint(1, counts['proteins']), rng.randint(1, len(MEAL_TYPES))))
+            for number in range(1, counts['steps_per_recipe'] + 1):
+                step_rows.append((recipe_id, number,
+                                  f"{rng.choice(STEP_VERBS).title()} the {rng.choice(FOOD_WORDS)} for {number} minutes"))
+            tag_rows.extend((recipe_id, tag_id) for tag_id in rng.sample(tag_ids, tags_per_recipe))
+        cursor.executemany("""
+            INSERT INTO Recipes (RecId, RecName, RecServings, RecInstructions, RecNotes,
+                                 RecCals, RecProtein, RecCarbs, RecFat, ProteinId, MealTypeId)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, recipe_rows)
+        cursor.executemany("INSERT INTO RecipeFoods (RecId, FoodId, NoServe) VALUES (?, ?, ?)", food_rows)
+        cursor.executemany("INSERT INTO RecipeSteps (RecId, StepNumber, StepDescription) VALUES (?, ?, ?)", step_rows)
+        cursor.executemany("INSERT INTO RecipeTags (RecipeId, TagId) VALUES (?, ?)", tag_rows)
+
+    raw.commit()
+    raw.execute("ANALYZE")
+    connection.close()
+    return counts
@@ -0,0 +1,219 @@
+# benchmarks/operations.py
+# Timings of the database operations against a synthetic SQLite catalog, from the repository root:
+#     python -m benchmarks.operations [--scales 10k,100k,1M] [--output results.json] [--compare old.json]
+# Each scale runs in a fresh process on a freshly generated catalog (benchmarks.catalog). The
+# results file holds the median/p95/min/max per benchmark; with --compare the run exits with
+# status 1 when a median got slower than the baseline by more than the tolerance.
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks.catalog import (DEFAULT_SEED, FOOD_WORDS, MEAL_TYPES, SCALES, generate_catalog, protein_name,
+                                scale_counts, tag_name)
+
+# Runs per benchmark, fewer when the time budget runs out first (but never below MIN_RUNS)
+RUNS = 20
+MIN_RUNS = 3
+BUDGET_SECONDS = 5.0
+# Median slowdown tolerated by --compare before it counts as a regression
+TOLERANCE = 1.25
+
+# fetch_recipes_by_criteria categories and their criteria. Meal Plan is left out, it searches
+# for as long as its time budget allows
+CRITERIA_SEARCHES = [
+    ("Recipe Name", lambda rng, counts: rng.choice(FOOD_WORDS)),
+    ("Calorie Range", lambda rng, counts: "800-1200"),
+    ("Macros", lambda rng, counts: "20,60,40,120,10,40"),
+    ("Meal Type", lambda rng, counts: rng.choice(MEAL_TYPES)),
+    ("Protein Type", lambda rng, counts: protein_name(rng.randint(1, counts['proteins']))),
+    ("Custom Tags", lambda rng, counts: tag_name(rng.randint(1, counts['tags']))),
+    ("Keyword", lambda rng, counts: f"{rng.choice(FOOD_WORDS)} {rng.choice(FOOD_WORDS)}"),
+    ("Closest Macros", lambda rng, counts: f"protein={rng.randint(20, 80)}, carbs={rng.randint(40, 200)}, "
+                                           f"fat={rng.randint(10, 60)}"),
+]
+
+
+def time_runs(function, setup=None, runs=RUNS, budget=BUDGET_SECONDS):
+    # function(argument) per run, argument comes from setup() which is not timed. The first run
+    # is reported on its own, it pays for lazily built indexes and cold caches
+    times = []
+    deadline = time.perf_counter() + budget
+    while len(times) < runs and (len(times) < MIN_RUNS or time.perf_counter() < deadline):
+        argument = setup() if setup is not None else None
+        started = time.perf_counter()
+        function(argument)
+        times.append((time.perf_counter() - started) * 1000)
+    steady = times[1:] or times
+    return {
+        'runs': len(times),
+        'first_ms': round(times[0], 3),
+        'median_ms': round(statistics.median(steady), 3),
+        'p95_ms': round(sorted(steady)[min(len(steady) - 1, int(0.95 * len(steady)))], 3),
+        'min_ms': round(min(steady), 3),
+        'max_ms': round(max(steady), 3),
+    }
+
+
+def measure(path, counts, seed, runs, budget):
+    # Runs in the child process, returns {benchmark name: timings}
+    from PyQt5.QtWidgets import QApplication
+
+    from food_operations import FoodOperations
+    from recipe_cache import recipe_cache
+    from recipes_operations import RecipeOperations
+
+    rng = random.Random(seed)
+    results = {}
+
+    def recipe_id():
+        return rng.randint(1, counts['recipes'])
+
+    def cold_recipe_id():
+        # A cache hit would time the cache, not the query
+        recipe_cache.clear()
+        return recipe_id()
+
+    def run(name, function, setup=None, **options):
+        results[name] = time_runs(function, setup, options.get('runs', runs), options.get('budget', budget))
+
+    app = QApplication(sys.argv[:1])
+    from ui_operations import MainWindow
+
+    # The window connects and loads the search indexes itself, the operations run first on their
+    # own connection so search_foods is also timed before its index exists
+    from db_backends import SqliteBackend
+    connection = SqliteBackend(path, create_schema=False).connect()
+
+    run("FoodOperations.search_foods[sql]", lambda term: FoodOperations.search_foods(connection, term),
+        lambda: rng.choice(FOOD_WORDS))
+    run("FoodOperations.load_search_index", lambda _: FoodOperations.load_search_index(connection), runs=1)
+    run("FoodOperations.search_foods[index]", lambda term: FoodOperations.search_foods(connection, term),
+        lambda: rng.choice(FOOD_WORDS))
+    run("RecipeOperations.get_recipe_details",
+        lambda rec_id: RecipeOperations.get_recipe_details(connection, rec_id), cold_recipe_id)
+    run("RecipeOperations.get_recipe_foods",
+        lambda rec_id: RecipeOperations.get_recipe_foods(connection, rec_id), cold_recipe_id)
+    run("RecipeOperations.save_recipe_steps",
+        lambda rec_id: RecipeOperations.save_recipe_steps(
+            connection, rec_id, [f"Benchmark step {number}" for number in range(1, counts['steps_per_recipe'] + 1)]),
+        recipe_id)
+    run("RecipeOperations.update_recipe_nutrition",
+        lambda rec_id: RecipeOperations.update_recipe_nutrition(connection, rec_id), recipe_id)
+    connection.close()
+
+    window = MainWindow()
+    window.startup.wait()
+    app.processEvents()
+    if not window.startup.connected:
+        raise RuntimeError("MainWindow could not connect to the benchmark catalog")
+    connection = window.database_manager.connection
+    for category, criteria in CRITERIA_SEARCHES:
+        run(f"fetch_recipes_by_criteria[{category}]",
+            lambda criteria, category=category: window.query_recipes(connection, category, criteria),
+            lambda criteria=criteria: criteria(rng, counts))
+    window.close()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    # (scale, benchmark, baseline median, median, ratio) for every median slower than tolerance allows
+    regressions = []
+    for scale, current in results['scales'].items():
+        previous = baseline.get('scales', {}).get(scale)
+        if previous is None:
+            continue
+        for name, timings in current['benchmarks'].items():
+            old = previous['benchmarks'].get(name)
+            if old is None or not old['median_ms']:
+                continue
+            ratio = timings['median_ms'] / old['median_ms']
+            if ratio > tolerance:
+                regressions.append((scale, name, old['median_ms'], timings['median_ms'], round(ratio, 2)))
+    return regressions
+
+
+def run_scale(scale, args):
+    counts = scale_counts(scale, args.steps_per_recipe, args.foods_per_recipe, args.tags, args.tags_per_recipe,
+                          args.proteins)
+    with tempfile.TemporaryDirectory() as directory:
+        path = args.db or os.path.join(directory, f'catalog-{scale}.db')
+        started = time.perf_counter()
+        if not os.path.exists(path):
+            generate_catalog(path, counts, args.seed)
+        generate_seconds = time.perf_counter() - started
+        # Timings of the operations themselves, not of the query instrumentation
+        environment = dict(os.environ, QT_QPA_PLATFORM='offscreen', RECIPEJOY_BACKEND='sqlite',
+                           RECIPEJOY_SQLITE_PATH=path, RECIPEJOY_QUERY_METRICS='0')
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.operations', '--measure', path, '--counts', json.dumps(counts),
+             '--seed', str(args.seed), '--runs', str(args.runs), '--budget', str(args.budget)],
+            env=environment, capture_output=True, text=True, check=True).stdout
+    return {
+        'counts': counts,
+        'generate_seconds': round(generate_seconds, 1),
+        'benchmarks': json.loads(output.strip().splitlines()[-1]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the database operations on a synthetic catalog")
+    parser.add_argument('--scales', default='10k', help=f"comma separated, from {', '.join(SCALES)}")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help="results file of an earlier run to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--db', help="catalog to reuse (generated there when missing), one scale only")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--runs', type=int, default=RUNS)
+    parser.add_argument('--budget', type=float, default=BUDGET_SECONDS, help="seconds per benchmark")
+    parser.add_argument('--steps-per-recipe', type=int, default=5)
+    parser.add_argument('--foods-per-recipe', type=int, default=6)
+    parser.add_argument('--tags', type=int, default=200)
+    parser.add_argument('--tags-per-recipe', type=int, default=2)
+    parser.add_argument('--proteins', type=int, default=20)
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    parser.add_argument('--counts', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        print(json.dumps(measure(args.measure, json.loads(args.counts), args.seed, args.runs, args.budget)))
+        return 0
+
+    scales = [scale.strip() for scale in args.scales.split(',') if scale.strip()]
+    unknown = [scale for scale in scales if scale not in SCALES]
+    if unknown or (args.db and len(scales) != 1):
+        parser.error(f"unknown scale(s) {unknown}" if unknown else "--db takes a single scale")
+
+    results = {
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'sqlite': sqlite3.sqlite_version,
+        'seed': args.seed,
+        'scales': {},
+    }
+    for scale in scales:
+        print(f"Running the {scale} scale...", file=sys.stderr)
+        results['scales'][scale] = run_scale(scale, args)
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2)
+    print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for scale, name, old, new, ratio in regressions:
+            print(f"REGRESSION {scale} {name}: {old} ms -> {new} ms ({ratio}x)", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+# benchmarks/startup.py
+# Startup time of MainWindow against a throwaway SQLite catalog, from the repository root:
+#     python -m benchmarks.startup [--runs 5] [--foods 20000] [--recipes 5000]
+# Each run is a fresh process so imports are paid again. Prints one JSON summary and exits
+# with status 1 when the median run is over either budget.
+import time
+
+_STARTED = time.perf_counter()
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Process start until the home page has been painted
+SHOWN_BUDGET_MS = 400
+# Process start until the database is connected and the caches are loaded
+READY_BUDGET_MS = 1500
+
+
+def seed(path, foods, recipes):
+    from db_backends import SqliteBackend
+
+    connection = SqliteBackend(path).connect()
+    cursor = connection.raw.cursor()
+    cursor.executemany("INSERT INTO ServingInfo (ServId, NoServe, ServSize) VALUES (?, 1, 'cup')",
+                       ((food_id,) for food_id in range(1, foods + 1)))
+    cursor.executemany("INSERT INTO Foods (FoodId, ServId, FoodName) VALUES (?, ?, ?)",
+                       ((food_id, food_id, f"Food {food_id}") for food_id in range(1, foods + 1)))
+    cursor.executemany("INSERT INTO Nutrition (FoodId, Calories, Protein, Carbs, Fat) VALUES (?, 100, 5, 10, 3)",
+                       ((food_id,) for food_id in range(1, foods + 1)))
+    cursor.executemany("INSERT INTO Recipes (RecId, RecName, RecInstructions) VALUES (?, ?, 'Mix and cook')",
+                       ((recipe_id, f"Recipe {recipe_id}") for recipe_id in range(1, recipes + 1)))
+    cursor.executemany("INSERT INTO RecipeFoods (RecId, FoodId, NoServe) VALUES (?, ?, 1)",
+                       ((recipe_id, (recipe_id * 7 + offset) % foods + 1)
+                        for recipe_id in range(1, recipes + 1) for offset in range(5)))
+    connection.commit()
+    connection.close()
+
+
+def measure():
+    # Runs in the child process, prints {'shown_ms', 'ready_ms', 'connected'}
+    from PyQt5.QtWidgets import QApplication
+
+    app = QApplication(sys.argv[:1])
+    from ui_operations import MainWindow
+
+    window = MainWindow()
+    app.processEvents()
+    window.repaint()
+    shown_ms = (time.perf_counter() - _STARTED) * 1000
+
+    deadline = time.perf_counter() + 60
+    while not window.startup.done and time.perf_counter() < deadline:
+        app.processEvents()
+        time.sleep(0.001)
+    ready_ms = (time.perf_counter() - _STARTED) * 1000
+    connected = window.startup.connected
+    window.close()
+    print(json.dumps({'shown_ms': round(shown_ms, 1), 'ready_ms': round(ready_ms, 1), 'connected': connected}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--foods', type=int, default=20000)
+    parser.add_argument('--recipes', type=int, default=5000)
+    parser.add_argument('--shown-budget-ms', type=float, default=SHOWN_BUDGET_MS)
+    parser.add_argument('--ready-budget-ms', type=float, default=READY_BUDGET_MS)
+    parser.add_argument('--measure', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        measure()
+        return 0
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'startup.db')
+        seed(path, args.foods, args.recipes)
+        environment = dict(os.environ, QT_QPA_PLATFORM='offscreen', RECIPEJOY_BACKEND='sqlite',
+                           RECIPEJOY_SQLITE_PATH=path)
+        runs = []
+        for _ in range(args.runs):
+            output = subprocess.run([sys.executable, '-m', 'benchmarks.startup', '--measure'], env=environment,
+                                    capture_output=True, text=True, check=True).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    shown_ms = statistics.median(run['shown_ms'] for run in runs)
+    ready_ms = statistics.median(run['ready_ms'] for run in runs)
+    passed = (all(run['connected'] for run in runs)
+              and shown_ms <= args.shown_budget_ms and ready_ms <= args.ready_budget_ms)
+    print(json.dumps({
+        'foods': args.foods,
+        'recipes': args.recipes,
+        'runs': runs,
+        'median_shown_ms': shown_ms,
+        'median_ready_ms': ready_ms,
+        'shown_budget_ms': args.shown_budget_ms,
+        'ready_budget_ms': args.ready_budget_ms,
+        'passed': passed,
+    }, indent=2))
+    return 0 if passed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
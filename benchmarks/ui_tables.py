@@ -0,0 +1,225 @@
+# benchmarks/ui_tables.py
+# Timings of the MainWindow table population paths under the offscreen platform, from the
+# repository root:
+#     python -m benchmarks.ui_tables [--paths foods_table,steps_table] [--sizes 100,500,2000]
+#                                    [--output ui_results.json] [--compare old.json]
+# Rows come from stubs instead of the database (an empty in-memory SQLite catalog backs the
+# window). Each path and row count runs in a fresh process so its peak RSS is its own. Reports
+# the median wall time of populating and painting the page, the widgets created and peak RSS;
+# with --compare the run exits with status 1 when one got worse than the baseline allows.
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+SIZES = (100, 500, 2000)
+REPEATS = 3
+# Wall time slowdown tolerated by --compare, any extra widget counts as a regression
+TOLERANCE = 1.25
+
+
+def food_rows(count):
+    # (FoodId, FoodName, NoServe, ServSize, Calories, Carbs, Fat, Protein) like get_foods_page
+    return [(food_id, f"Food {food_id}", 1, 'cup', 100 + food_id % 50, 10, 5, 3) for food_id in range(1, count + 1)]
+
+
+def recipe_rows(count):
+    # Recipes rows as the SQL searches return them
+    return [(recipe_id, f"Recipe {recipe_id}", 2, "Cook it.", None, 500.0, 30.0, 60.0, 15.0, 1, 1)
+            for recipe_id in range(1, count + 1)]
+
+
+def foods(count):
+    from food_operations import Food
+
+    return [Food(*row) for row in food_rows(count)]
+
+
+def recipe_aggregate(count):
+    return {
+        'details': {'name': "Benchmark recipe", 'servings': 2, 'instructions': "", 'notes': "Notes"},
+        'foods': [{'name': f"Food {number}", 'amount': 1, 'unit': 'cup'} for number in range(1, count + 1)],
+        'steps': [{'number': number, 'description': f"Step {number}"} for number in range(1, count + 1)],
+        'nutrition': {'calories': 500.0, 'carbs': 60.0, 'fat': 15.0, 'protein': 30.0},
+        'tags': [{'id': number, 'name': f"Tag {number}"} for number in range(1, count + 1)],
+    }
+
+
+def steps_table(window, count):
+    def populate():
+        window.ui.recipeStepsTable.setRowCount(0)
+        for number in range(1, count + 1):
+            window.insert_step(f"Step {number}")
+    return populate
+
+
+def recipe_ingredients_table(window, count):
+    window.current_recipe_foods = foods(count)
+    return window.update_recipe_ingredients_table
+
+
+def tags_table(window, count):
+    tags = [(tag_id, f"Tag {tag_id}") for tag_id in range(1, count + 1)]
+    window.custom_tag_operations.get_all_tags = lambda connection: tags
+    return window.populate_tags_table
+
+
+def tags_list(window, count):
+    tags = [(tag_id, f"Tag {tag_id}") for tag_id in range(1, count + 1)]
+    window.custom_tag_operations.get_all_tags = lambda connection: tags
+    return window.populate_tags_list
+
+
+def protein_types_table(window, count):
+    from unittest import mock
+
+    from proteins_operations import ProteinOperations
+
+    proteins = [(protein_id, f"Protein {protein_id}") for protein_id in range(1, count + 1)]
+    mock.patch.object(ProteinOperations, 'get_all_proteins', lambda connection: proteins).start()
+    return window.populate_protein_types_table
+
+
+# name -> (widget whose page is shown, setup(window, count) returning the population call)
+POPULATION_PATHS = {
+    'foods_table': ('foodsTable', lambda window, count: lambda rows=food_rows(count): window.fill_foods_table(
+        (rows, None))),
+    'results_table': ('resultsTable', lambda window, count: lambda rows=recipe_rows(count):
+                      window.populate_results_table((rows, None), "Recipe Name", "Recipe")),
+    'matching_foods_list': ('recipeIngredientsList', lambda window, count: lambda rows=foods(count):
+                            window.populate_matching_foods_list((rows, None), "Food")),
+    'recipe_ingredients_table': ('recipeIngredientsTable', recipe_ingredients_table),
+    'steps_table': ('recipeStepsTable', steps_table),
+    'recipe_page': ('stepsTable', lambda window, count: lambda aggregate=recipe_aggregate(count):
+                    window.show_recipe_page(1, aggregate)),
+    'tags_table': ('tagsTableWidget', tags_table),
+    'tags_list': ('tagsListWidget', tags_list),
+    'protein_types_table': ('proteinTypesTable', protein_types_table),
+}
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def measure(path, count, repeats):
+    # Runs in the child process, returns the timings of one path at one row count
+    from PyQt5.QtWidgets import QApplication
+
+    app = QApplication(sys.argv[:1])
+    from ui_operations import MainWindow
+
+    window = MainWindow()
+    window.startup.wait()
+    app.processEvents()
+
+    widget_name, setup = POPULATION_PATHS[path]
+    widget = getattr(window.ui, widget_name)
+    page = widget
+    while page.parentWidget() is not window.ui.stackedWidget:
+        page = page.parentWidget()
+    window.ui.stackedWidget.setCurrentWidget(page)
+    app.processEvents()
+    populate = setup(window, count)
+
+    widgets_before = len(QApplication.allWidgets())
+    rss_before = peak_rss_mb()
+    times, widgets_created = [], None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        populate()
+        # Layout and paint are part of what the user waits for
+        app.processEvents()
+        window.grab()
+        times.append((time.perf_counter() - started) * 1000)
+        if widgets_created is None:
+            widgets_created = len(QApplication.allWidgets()) - widgets_before
+    window.close()
+    return {
+        'wall_ms': round(statistics.median(times), 3),
+        'first_ms': round(times[0], 3),
+        'widgets_created': widgets_created,
+        'peak_rss_mb': peak_rss_mb(),
+        'peak_rss_growth_mb': round(peak_rss_mb() - rss_before, 1),
+    }
+
+
+def compare(results, baseline, tolerance):
+    # (path, rows, what, baseline value, value) for every measurement worse than the baseline allows
+    regressions = []
+    for path, sizes in results['paths'].items():
+        for count, current in sizes.items():
+            previous = baseline.get('paths', {}).get(path, {}).get(count)
+            if previous is None:
+                continue
+            if previous['wall_ms'] and current['wall_ms'] / previous['wall_ms'] > tolerance:
+                regressions.append((path, count, 'wall_ms', previous['wall_ms'], current['wall_ms']))
+            if current['widgets_created'] > previous['widgets_created']:
+                regressions.append((path, count, 'widgets_created', previous['widgets_created'],
+                                    current['widgets_created']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the MainWindow table population paths")
+    parser.add_argument('--paths', default=','.join(POPULATION_PATHS), help="comma separated path names")
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)), help="comma separated row counts")
+    parser.add_argument('--repeats', type=int, default=REPEATS)
+    parser.add_argument('--output', default='ui_benchmark_results.json')
+    parser.add_argument('--compare', help="results file of an earlier run to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    parser.add_argument('--count', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.count, args.repeats)))
+        return 0
+
+    paths = [path.strip() for path in args.paths.split(',') if path.strip()]
+    unknown = [path for path in paths if path not in POPULATION_PATHS]
+    if unknown:
+        parser.error(f"unknown path(s) {unknown}, choose from {', '.join(POPULATION_PATHS)}")
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+
+    environment = dict(os.environ, QT_QPA_PLATFORM='offscreen', RECIPEJOY_BACKEND='sqlite',
+                       RECIPEJOY_SQLITE_PATH=':memory:', RECIPEJOY_QUERY_METRICS='0')
+    results = {
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeats': args.repeats,
+        'paths': {},
+    }
+    for path in paths:
+        results['paths'][path] = {}
+        for count in sizes:
+            print(f"Populating {path} with {count} rows...", file=sys.stderr)
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.ui_tables', '--measure', path, '--count', str(count),
+                 '--repeats', str(args.repeats)],
+                env=environment, capture_output=True, text=True, check=True).stdout
+            # Keyed by string, JSON object keys are strings anyway
+            results['paths'][path][str(count)] = json.loads(output.strip().splitlines()[-1])
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2)
+    print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for path, count, what, old, new in regressions:
+            print(f"REGRESSION {path} at {count} rows, {what}: {old} -> {new}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
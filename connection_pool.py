@@ -0,0 +1,210 @@
+# connection_pool.py
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class PoolTimeoutError(Exception):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, connect, min_size=1, max_size=5, checkout_timeout=10.0,
+                 validate_after=30.0, validation_query="SELECT 1"):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool bounds: min_size={min_size}, max_size={max_size}")
+
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.validate_after = validate_after
+        self.validation_query = validation_query
+
+        self._lock = threading.Condition()
+        # Idle connections as (connection, time returned to the pool)
+        self._idle = deque()
+        self._in_use = set()
+        self._closed = False
+
+        # Metrics
+        self._checkouts = 0
+        self._misses = 0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def warm(self):
+        # Pre-open connections up to min_size so the first checkouts don't pay the connect cost
+        opened = 0
+        while True:
+            with self._lock:
+                if self._closed or len(self._idle) + len(self._in_use) >= self.min_size:
+                    break
+                # Reserve the slot so concurrent checkouts respect max_size while we connect
+                placeholder = object()
+                self._in_use.add(id(placeholder))
+            try:
+                connection = self._connect()
+            finally:
+                with self._lock:
+                    self._in_use.discard(id(placeholder))
+            with self._lock:
+                self._idle.append((connection, time.monotonic()))
+                self._created += 1
+                self._lock.notify()
+            opened += 1
+        logging.debug("Connection pool warmed with %s connection(s)", opened)
+
+    def acquire(self, timeout=None):
+        timeout = self.checkout_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        with self._lock:
+            if self._closed:
+                raise PoolTimeoutError("Connection pool is closed")
+
+            missed = False
+            while True:
+                if self._idle:
+                    connection, returned_at = self._idle.pop()
+                    self._in_use.add(id(connection))
+                    break
+
+                if len(self._in_use) < self.max_size:
+                    # Reserve a slot and open a new connection outside the lock
+                    missed = True
+                    placeholder = object()
+                    self._in_use.add(id(placeholder))
+                    connection = None
+                    break
+
+                missed = True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(f"Timed out after {timeout:.1f}s waiting for a database connection")
+                self._lock.wait(remaining)
+
+            if missed:
+                self._misses += 1
+
+        if connection is None:
+            try:
+                connection = self._connect()
+            except Exception:
+                with self._lock:
+                    self._in_use.discard(id(placeholder))
+                    self._lock.notify()
+                raise
+            with self._lock:
+                self._in_use.discard(id(placeholder))
+                self._in_use.add(id(connection))
+                self._created += 1
+        elif time.monotonic() - returned_at > self.validate_after and not self._is_healthy(connection):
+            # Stale connection failed its health check, replace it while keeping its slot
+            stale = connection
+            self._close_quietly(stale)
+            try:
+                connection = self._connect()
+            except Exception:
+                with self._lock:
+                    self._in_use.discard(id(stale))
+                    self._discarded += 1
+                    self._lock.notify()
+                raise
+            with self._lock:
+                self._in_use.discard(id(stale))
+                self._in_use.add(id(connection))
+                self._discarded += 1
+                self._created += 1
+
+        waited = time.monotonic() - started
+        with self._lock:
+            self._checkouts += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+        return connection
+
+    def release(self, connection, broken=False):
+        with self._lock:
+            if id(connection) not in self._in_use:
+                logging.warning("Attempted to release a connection that is not checked out from this pool")
+                return
+            self._in_use.discard(id(connection))
+
+            if broken or self._closed:
+                self._discarded += 1 if broken else 0
+                close_it = True
+            else:
+                self._idle.append((connection, time.monotonic()))
+                close_it = False
+            self._lock.notify()
+
+        if close_it:
+            self._close_quietly(connection)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        connection = self.acquire(timeout)
+        broken = False
+        try:
+            yield connection
+        except Exception:
+            # Leave nothing half-done on a connection that goes back to the pool
+            try:
+                connection.rollback()
+            except Exception as error:
+                logging.warning(f"Rollback failed, discarding pooled connection: {error}")
+                broken = True
+            raise
+        finally:
+            self.release(connection, broken=broken)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            self._lock.notify_all()
+        for connection in idle:
+            self._close_quietly(connection)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'in_use': len(self._in_use),
+                'idle': len(self._idle),
+                'checkouts': self._checkouts,
+                'misses': self._misses,
+                'timeouts': self._timeouts,
+                'created': self._created,
+                'discarded': self._discarded,
+                'total_wait_seconds': round(self._total_wait, 6),
+                'avg_wait_seconds': round(self._total_wait / self._checkouts, 6) if self._checkouts else 0.0,
+                'max_wait_seconds': round(self._max_wait, 6),
+            }
+
+    def _is_healthy(self, connection):
+        try:
+            cursor = connection.cursor()
+            cursor.execute(self.validation_query)
+            cursor.fetchone()
+            return True
+        except Exception as error:
+            logging.warning(f"Pooled connection failed health check: {error}")
+            return False
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except Exception as error:
+            logging.debug("Error while closing pooled connection: %s", error)
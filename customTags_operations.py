@@ -1,8 +1,8 @@
 # customTags_operations.py
-import pyodbc
 import logging
-
-logging.basicConfig(level=logging.DEBUG)
+from db_backends import DB_ERRORS
+from recipe_cache import recipe_cache
+from reference_cache import reference_cache
 
 class CustomTagOperations:
     def add_tag(self, connection, tag_name):
@@ -19,12 +19,14 @@ class CustomTagOperations:
             cursor.execute(insert_query, (tag_name,))
             tag_id = cursor.fetchone()[0]
             if tag_id:
+                connection.commit()
+                reference_cache.upsert('tags', tag_id, tag_name)
                 logging.info(f"Successfully added tag with id: {tag_id}")
                 return tag_id
             else:
                 logging.error(f"Failed to retrieve tag id after adding")
                 return None
-        except pyodbc.Error as error:
+        except DB_ERRORS as error:
             logging.error(f"Error adding tag: {error}")
             connection.rollback()
             return None
@@ -34,7 +36,10 @@ class CustomTagOperations:
             cursor = connection.cursor()
             cursor.execute("UPDATE CustomTags SET TagName = ? WHERE TagId = ?", (new_tag_name, tag_id))
             connection.commit()
-        except pyodbc.Error as error:
+            reference_cache.upsert('tags', tag_id, new_tag_name)
+            # Tag names are part of every cached recipe that uses them
+            recipe_cache.clear()
+        except DB_ERRORS as error:
             logging.error(f"Error while updating tag: {error}")
 
     def delete_tag(self, connection, tag_id):
@@ -42,14 +47,21 @@ class CustomTagOperations:
             cursor = connection.cursor()
             cursor.execute("DELETE FROM CustomTags WHERE TagId = ?", (tag_id,))
             connection.commit()
-        except pyodbc.Error as error:
+            reference_cache.remove('tags', tag_id)
+            recipe_cache.clear()
+        except DB_ERRORS as error:
             logging.error(f"Error while deleting tag: {error}")
 
     def get_all_tags(self, connection):
         try:
-            cursor = connection.cursor()
-            cursor.execute("SELECT TagId, TagName FROM CustomTags ORDER BY TagName")
-            return cursor.fetchall()
-        except pyodbc.Error as error:
+            return reference_cache.rows(connection, 'tags')
+        except DB_ERRORS as error:
             logging.error(f"Error while getting tags: {error}")
-            return[]
\ No newline at end of file
+            return[]
+
+    def get_tag_name(self, connection, tag_id):
+        try:
+            return reference_cache.name_of(connection, 'tags', tag_id) or ""
+        except DB_ERRORS as error:
+            logging.error(f"Error while getting tag name: {error}")
+            return ""
\ No newline at end of file
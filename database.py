@@ -1,29 +1,58 @@
 # database.py
-import pyodbc
 import logging
+from connection_pool import ConnectionPool
+from db_backends import ADDED_SEARCH_CATEGORIES, DB_ERRORS, backend_from_env
+from query_metrics import query_metrics
+from reference_cache import reference_cache
 
 class DatabaseManager:
-    def __init__(self):
+    def __init__(self, backend=None, min_connections=2, max_connections=8):
+        # SQL Server by default, or an SqliteBackend for local/offline use
+        self.backend = backend or backend_from_env()
         self.connection = None
+        self.pool = None
+        self.min_connections = min_connections
+        self.max_connections = max_connections
 
     def connect_to_database(self):
         try:
-            # Establish a connection to the SQL Server database
-            self.connection = pyodbc.connect(
-                "Driver={SQL Server};"
-                "Server=Laptop-YOGA\SQLEXPRESS;"
-                "Database=RecipeJoy;"
-                "Trusted_Connection=yes;"
+            # Establish a pool of connections to the configured database
+            # Pooled connections time every statement for query_metrics
+            self.pool = ConnectionPool(
+                query_metrics.instrument(self.backend.connect),
+                min_size=self.min_connections,
+                max_size=self.max_connections,
             )
-            print("Connected to database successfully.")
+            self.pool.warm()
+
+            # The GUI thread keeps one connection checked out for its own queries
+            self.connection = self.pool.acquire()
+            logging.info("Connected to database successfully.")
+            self.add_missing_search_categories()
             return True
-        except pyodbc.Error as error:
-            logging.error(f"Error while connecting to SQL Server: {error}")
+        except (RuntimeError,) + DB_ERRORS as error:
+            logging.error(f"Error while connecting to the {self.backend.dialect} database: {error}")
+            if self.pool:
+                self.pool.close()
+                self.pool = None
             return False
 
+    def get_connection(self, timeout=None):
+        # Check out a pooled connection for background work: `with manager.get_connection() as connection:`
+        return self.pool.connection(timeout)
+
+    def get_pool_stats(self):
+        return self.pool.stats() if self.pool else {}
+
     def close_connection(self):
-        if self.connection:
+        if self.pool:
+            if self.connection:
+                self.pool.release(self.connection)
+            self.pool.close()
+            self.pool = None
+        elif self.connection:
             self.connection.close()
+        self.connection = None
 
     def add_example_data(self):
         try:
@@ -36,7 +65,7 @@ class DatabaseManager:
             # Add a new meal type and get meal_type_id
             meal_type_id = add_meal_type(self.connection, meal_type_name)
             if meal_type_id is None:
-                print("Failed to add meal type.")
+                logging.error("Failed to add meal type.")
                 return False
 
             return True
@@ -46,23 +75,43 @@ class DatabaseManager:
 
     def get_search_categories(self):
         try:
-            cursor = self.connection.cursor()
-            cursor.execute("SELECT CategoryName FROM SearchCategories")
-            categories = cursor.fetchall()
-            return [category[0] for category in categories]
+            categories = reference_cache.rows(self.connection, 'search_categories')
+            return [category_name for _, category_name in categories]
         except Exception as error:
             logging.error(f"Error getting search categories: {error}")
             return[]
 
+    def add_missing_search_categories(self):
+        # Idempotent, only inserts the added categories the database does not list yet
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute("SELECT CategoryName FROM SearchCategories")
+            existing = {row[0] for row in cursor.fetchall()}
+            missing = [name for name in ADDED_SEARCH_CATEGORIES if name not in existing]
+            for category_name in missing:
+                cursor.execute("INSERT INTO SearchCategories (CategoryId, CategoryName) VALUES (NEWID(), ?)",
+                               (category_name,))
+            if missing:
+                self.connection.commit()
+                reference_cache.invalidate('search_categories')
+                logging.info(f"Added search categories: {', '.join(missing)}")
+        except DB_ERRORS as error:
+            # The app still works without them, they just cannot be picked
+            self.connection.rollback()
+            logging.warning(f"Error adding missing search categories: {error}")
+
     def insert_search_category(self, category_name):
         try:
             cursor = self.connection.cursor()
             cursor.execute("""
                 INSERT INTO SearchCategories (CategoryId, CategoryName)
+                OUTPUT INSERTED.CategoryId
                 VALUES (NEWID(), ?)
             """, (category_name,))
+            category_id = cursor.fetchone()[0]
             self.connection.commit()
-            print("Search category inserted successfully.")
+            reference_cache.upsert('search_categories', category_id, category_name)
+            logging.info("Search category inserted successfully.")
         except Exception as error:
             logging.error(f"Error inserting search category: {error}")
 
@@ -0,0 +1,312 @@
+# db_backends.py
+import logging
+import os
+import re
+import sqlite3
+import threading
+import uuid
+from functools import lru_cache
+
+try:
+    import pyodbc
+except ImportError:
+    # pyodbc (and the ODBC driver manager it links against) is only needed for SQL Server
+    pyodbc = None
+
+# Exceptions raised by any supported driver, for `except DB_ERRORS as error:`
+DB_ERRORS = (sqlite3.Error,) + ((pyodbc.Error,) if pyodbc is not None else ())
+
+SQLSERVER_CONNECTION_STRING = (
+    "Driver={SQL Server};"
+    "Server=Laptop-YOGA\\SQLEXPRESS;"
+    "Database=RecipeJoy;"
+    "Trusted_Connection=yes;"
+)
+
+
+def dialect_of(connection):
+    # Pooled SQLite connections carry their dialect, raw pyodbc connections are SQL Server
+    return getattr(connection, 'dialect', 'mssql')
+
+
+def begin_write(connection):
+    # Bulk inserts on SQLite assign ids from MAX(...) themselves. The write lock is taken before
+    # reading it so no other writer can claim the same ids, unless the open transaction already
+    # holds it (sqlite3 only opens one at the first write). SQL Server generates its own ids
+    if dialect_of(connection) == 'sqlite' and not connection.in_transaction:
+        connection.cursor().execute("BEGIN IMMEDIATE")
+
+
+def backend_from_env():
+    # RECIPEJOY_BACKEND=sqlite runs against a local file (RECIPEJOY_SQLITE_PATH) instead of SQL Server
+    if os.environ.get('RECIPEJOY_BACKEND', 'mssql').lower() == 'sqlite':
+        return SqliteBackend(os.environ.get('RECIPEJOY_SQLITE_PATH', 'recipejoy.db'))
+    return SqlServerBackend(os.environ.get('RECIPEJOY_CONNECTION_STRING', SQLSERVER_CONNECTION_STRING))
+
+
+class SqlServerBackend:
+    dialect = 'mssql'
+
+    def __init__(self, connection_string=SQLSERVER_CONNECTION_STRING):
+        self.connection_string = connection_string
+
+    def connect(self):
+        if pyodbc is None:
+            raise RuntimeError("pyodbc is not available, install it or set RECIPEJOY_BACKEND=sqlite")
+        return pyodbc.connect(self.connection_string)
+
+
+class SqliteBackend:
+    dialect = 'sqlite'
+
+    def __init__(self, path='recipejoy.db', create_schema=True):
+        self.path = path
+        self.create_schema = create_schema
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self._keeper = None
+
+        if path == ':memory:':
+            # A named shared-cache database so every pooled connection sees the same data
+            self._uri = f"file:recipejoy_{uuid.uuid4().hex}?mode=memory&cache=shared"
+        else:
+            self._uri = None
+
+    def connect(self):
+        if self._uri:
+            raw = sqlite3.connect(self._uri, uri=True, check_same_thread=False, timeout=30)
+            if self._keeper is None:
+                # The in-memory database lives only while at least one connection is open
+                self._keeper = sqlite3.connect(self._uri, uri=True, check_same_thread=False)
+        else:
+            raw = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            raw.execute("PRAGMA journal_mode=WAL")
+            raw.execute("PRAGMA synchronous=NORMAL")
+
+        connection = SqliteConnection(raw)
+        if self.create_schema and not self._schema_ready:
+            with self._schema_lock:
+                if not self._schema_ready:
+                    create_sqlite_schema(connection)
+                    self._schema_ready = True
+        return connection
+
+
+class SqliteConnection:
+    dialect = 'sqlite'
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def cursor(self):
+        return SqliteCursor(self.raw.cursor())
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def close(self):
+        self.raw.close()
+
+    @property
+    def in_transaction(self):
+        return self.raw.in_transaction
+
+    def interrupt(self):
+        # Aborts a statement running on another thread, used to cancel superseded queries
+        self.raw.interrupt()
+
+    @property
+    def autocommit(self):
+        return self.raw.isolation_level is None
+
+    @autocommit.setter
+    def autocommit(self, value):
+        self.raw.isolation_level = None if value else ''
+
+
+class SqliteCursor:
+    def __init__(self, raw):
+        self.raw = raw
+        # Accepted for pyodbc compatibility, sqlite3 executemany is already a single prepared loop
+        self.fast_executemany = False
+
+    def execute(self, sql, *params):
+        self.raw.execute(translate_sql(sql), _flatten_params(params))
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self.raw.executemany(translate_sql(sql), seq_of_params)
+        return self
+
+    def fetchone(self):
+        return self.raw.fetchone()
+
+    def fetchall(self):
+        return self.raw.fetchall()
+
+    def fetchmany(self, size=None):
+        return self.raw.fetchmany(size) if size is not None else self.raw.fetchmany()
+
+    def nextset(self):
+        # sqlite3 runs one statement per execute, there is never a second result set
+        return None
+
+    def close(self):
+        self.raw.close()
+
+    @property
+    def description(self):
+        return self.raw.description
+
+    @property
+    def rowcount(self):
+        return self.raw.rowcount
+
+    def __iter__(self):
+        return iter(self.raw)
+
+
+def _flatten_params(params):
+    # pyodbc accepts both execute(sql, (a, b)) and execute(sql, a, b)
+    if len(params) == 1 and isinstance(params[0], (list, tuple)):
+        return params[0]
+    return params
+
+
+_OUTPUT_CLAUSE = re.compile(
+    r"\s+OUTPUT\s+((?:INSERTED|DELETED)\.\w+(?:\s*,\s*(?:INSERTED|DELETED)\.\w+)*)", re.IGNORECASE)
+_OUTPUT_PREFIX = re.compile(r"(?:INSERTED|DELETED)\.", re.IGNORECASE)
+_FETCH_NEXT = re.compile(r"OFFSET\s+(\?|\d+)\s+ROWS\s+FETCH\s+NEXT\s+(\?|\d+)\s+ROWS\s+ONLY", re.IGNORECASE)
+_SIMPLE_REWRITES = [
+    (re.compile(r"NEWID\(\)", re.IGNORECASE), "lower(hex(randomblob(16)))"),
+    (re.compile(r"@@IDENTITY|SCOPE_IDENTITY\(\)", re.IGNORECASE), "last_insert_rowid()"),
+    (re.compile(r"\bISNULL\(", re.IGNORECASE), "IFNULL("),
+    (re.compile(r"\bLEN\(", re.IGNORECASE), "LENGTH("),
+    (re.compile(r"\bGETDATE\(\)", re.IGNORECASE), "CURRENT_TIMESTAMP"),
+]
+
+
+@lru_cache(maxsize=1024)
+def translate_sql(sql):
+    # Rewrite the T-SQL constructs used by the *Operations classes into SQLite syntax
+    translated = sql
+
+    match = _OUTPUT_CLAUSE.search(translated)
+    if match:
+        columns = _OUTPUT_PREFIX.sub("", match.group(1))
+        translated = translated[:match.start()] + translated[match.end():]
+        translated = translated.rstrip().rstrip(";").rstrip() + f" RETURNING {columns}"
+
+    # SQLite's "LIMIT offset, count" form binds its placeholders in the same order as OFFSET/FETCH
+    translated = _FETCH_NEXT.sub(r"LIMIT \1, \2", translated)
+
+    for pattern, replacement in _SIMPLE_REWRITES:
+        translated = pattern.sub(replacement, translated)
+    return translated
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ServingInfo (
+    ServId INTEGER PRIMARY KEY,
+    NoServe REAL,
+    ServSize TEXT
+);
+CREATE TABLE IF NOT EXISTS Foods (
+    FoodId INTEGER PRIMARY KEY,
+    ServId INTEGER REFERENCES ServingInfo(ServId),
+    FoodName TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS Nutrition (
+    NutId INTEGER PRIMARY KEY,
+    FoodId INTEGER NOT NULL REFERENCES Foods(FoodId),
+    Calories REAL,
+    Protein REAL,
+    Carbs REAL,
+    Fat REAL
+);
+CREATE TABLE IF NOT EXISTS Measurements (
+    MeasId INTEGER PRIMARY KEY,
+    MeasName TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS SearchCategories (
+    CategoryId TEXT PRIMARY KEY,
+    CategoryName TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS Proteins (
+    ProteinId INTEGER PRIMARY KEY,
+    ProteinName TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS MealType (
+    MealTypeId INTEGER PRIMARY KEY,
+    MealTypeName TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS CustomTags (
+    TagId INTEGER PRIMARY KEY,
+    TagName TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS Recipes (
+    RecId INTEGER PRIMARY KEY,
+    RecName TEXT NOT NULL,
+    RecServings INTEGER DEFAULT 1,
+    RecInstructions TEXT,
+    RecNotes TEXT,
+    RecCals REAL,
+    RecProtein REAL,
+    RecCarbs REAL,
+    RecFat REAL,
+    ProteinId INTEGER REFERENCES Proteins(ProteinId),
+    MealTypeId INTEGER REFERENCES MealType(MealTypeId)
+);
+CREATE TABLE IF NOT EXISTS RecipeFoods (
+    RecFoodId INTEGER PRIMARY KEY,
+    RecId INTEGER NOT NULL REFERENCES Recipes(RecId),
+    FoodId INTEGER NOT NULL REFERENCES Foods(FoodId),
+    NoServe REAL,
+    ServSize TEXT
+);
+CREATE TABLE IF NOT EXISTS RecipeSteps (
+    StepId INTEGER PRIMARY KEY,
+    RecId INTEGER NOT NULL REFERENCES Recipes(RecId),
+    StepNumber INTEGER NOT NULL,
+    StepDescription TEXT
+);
+CREATE TABLE IF NOT EXISTS RecipeTags (
+    RecipeId INTEGER NOT NULL REFERENCES Recipes(RecId),
+    TagId INTEGER NOT NULL REFERENCES CustomTags(TagId),
+    PRIMARY KEY (RecipeId, TagId)
+);
+CREATE INDEX IF NOT EXISTS IX_Foods_FoodName ON Foods(FoodName);
+CREATE INDEX IF NOT EXISTS IX_Nutrition_FoodId ON Nutrition(FoodId);
+CREATE INDEX IF NOT EXISTS IX_Recipes_RecName ON Recipes(RecName);
+CREATE INDEX IF NOT EXISTS IX_Recipes_ProteinId ON Recipes(ProteinId);
+CREATE INDEX IF NOT EXISTS IX_RecipeFoods_RecId ON RecipeFoods(RecId);
+CREATE INDEX IF NOT EXISTS IX_RecipeFoods_FoodId ON RecipeFoods(FoodId);
+CREATE INDEX IF NOT EXISTS IX_RecipeSteps_RecId ON RecipeSteps(RecId, StepNumber);
+CREATE INDEX IF NOT EXISTS IX_RecipeTags_TagId ON RecipeTags(TagId);
+"""
+
+DEFAULT_SEARCH_CATEGORIES = [
+    "Recipe Name", "Calorie Range", "Macros", "Meal Type", "Protein Type", "Custom Tags", "Keyword", "Closest Macros", "Meal Plan",
+]
+# Categories added after the original schema. Databases created before them (SQL Server ones are
+# never created by this code) get them at connect time
+ADDED_SEARCH_CATEGORIES = ["Keyword", "Closest Macros", "Meal Plan"]
+DEFAULT_MEASUREMENTS = ["cup", "g", "ml", "oz", "piece", "tbsp", "tsp"]
+
+
+def create_sqlite_schema(connection):
+    raw = connection.raw if isinstance(connection, SqliteConnection) else connection
+    raw.executescript(SQLITE_SCHEMA)
+
+    # Seed the lookup tables the UI expects to be populated
+    if raw.execute("SELECT COUNT(*) FROM SearchCategories").fetchone()[0] == 0:
+        raw.executemany("INSERT INTO SearchCategories (CategoryId, CategoryName) VALUES (?, ?)",
+                        [(uuid.uuid4().hex, name) for name in DEFAULT_SEARCH_CATEGORIES])
+    if raw.execute("SELECT COUNT(*) FROM Measurements").fetchone()[0] == 0:
+        raw.executemany("INSERT INTO Measurements (MeasName) VALUES (?)",
+                        [(name,) for name in DEFAULT_MEASUREMENTS])
+    raw.commit()
+    logging.debug("SQLite schema ready")
@@ -0,0 +1,267 @@
+# food_import.py
+# Bulk import of a nutrition catalog, from the repository root:
+#     python food_import.py foods.csv [--format csv|jsonl] [--batch-size 5000]
+# Columns (CSV header or JSON keys, case and underscores ignored): FoodName (or name), NoServe,
+# ServSize, Calories, Protein, Carbs, Fat. Only the name is required.
+import argparse
+import csv
+import itertools
+import json
+import logging
+import re
+import sys
+import time
+
+from db_backends import begin_write, dialect_of
+from food_index import food_index
+
+# Foods written per batch and transaction, memory stays bounded by one batch whatever the file size
+IMPORT_BATCH_SIZE = 5000
+
+# Fields of an import row, in order
+IMPORT_FIELDS = ('FoodName', 'NoServe', 'ServSize', 'Calories', 'Protein', 'Carbs', 'Fat')
+_FIELD_KEYS = {field.lower(): position for position, field in enumerate(IMPORT_FIELDS)}
+_FIELD_KEYS['name'] = 0
+_NUMERIC = (1, 3, 4, 5, 6)
+_KEY_CHARACTERS = re.compile(r"[^a-z]")
+
+# Staging tables of the SQL Server path, created by the first batch of the session and emptied
+# for each one. Created in a transaction that rolls back they are gone again, hence the checks
+PREPARE_STAGING_SQL = """
+    SET NOCOUNT ON;
+    IF OBJECT_ID('tempdb..#FoodImport') IS NULL
+        CREATE TABLE #FoodImport (
+            RowNo INT PRIMARY KEY, FoodName NVARCHAR(255), NoServe FLOAT, ServSize NVARCHAR(50),
+            Calories FLOAT, Protein FLOAT, Carbs FLOAT, Fat FLOAT);
+    IF OBJECT_ID('tempdb..#ImportServIds') IS NULL
+        CREATE TABLE #ImportServIds (RowNo INT PRIMARY KEY, ServId INT);
+    IF OBJECT_ID('tempdb..#ImportFoodIds') IS NULL
+        CREATE TABLE #ImportFoodIds (FoodId INT PRIMARY KEY, ServId INT);
+    TRUNCATE TABLE #FoodImport;
+    TRUNCATE TABLE #ImportServIds;
+    TRUNCATE TABLE #ImportFoodIds
+"""
+STAGE_ROWS_SQL = "INSERT INTO #FoodImport VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+
+# Set-based insert of a staged batch. MERGE can output the source RowNo next to the generated
+# ServId, Foods rows are then matched back to their batch row through their (unique) ServId
+WRITE_STAGED_SQL = """
+    SET NOCOUNT ON;
+    MERGE INTO ServingInfo USING #FoodImport AS S ON 1 = 0
+    WHEN NOT MATCHED THEN INSERT (NoServe, ServSize) VALUES (S.NoServe, S.ServSize)
+    OUTPUT S.RowNo, INSERTED.ServId INTO #ImportServIds (RowNo, ServId);
+    INSERT INTO Foods (ServId, FoodName)
+    OUTPUT INSERTED.FoodId, INSERTED.ServId INTO #ImportFoodIds (FoodId, ServId)
+    SELECT I.ServId, S.FoodName FROM #FoodImport S JOIN #ImportServIds I ON I.RowNo = S.RowNo;
+    INSERT INTO Nutrition (FoodId, Calories, Protein, Carbs, Fat)
+    SELECT F.FoodId, S.Calories, S.Protein, S.Carbs, S.Fat
+    FROM #ImportFoodIds F
+    JOIN #ImportServIds I ON I.ServId = F.ServId
+    JOIN #FoodImport S ON S.RowNo = I.RowNo;
+    SELECT F.FoodId, S.RowNo
+    FROM #ImportFoodIds F
+    JOIN #ImportServIds I ON I.ServId = F.ServId
+    JOIN #FoodImport S ON S.RowNo = I.RowNo
+"""
+
+
+class FoodImportError(Exception):
+    pass
+
+
+def _key(name):
+    return _KEY_CHARACTERS.sub("", str(name).lower())
+
+
+def _food_row(values, line):
+    # values in IMPORT_FIELDS order, numbers may still be text. None for a line that did not parse
+    if values is None:
+        raise FoodImportError(f"line {line}: not a JSON object")
+    name = str(values[0]).strip() if values[0] is not None else ""
+    if not name:
+        raise FoodImportError(f"line {line}: missing food name")
+    row = list(values)
+    row[0] = name
+    for position in _NUMERIC:
+        value = row[position]
+        if value is None or (isinstance(value, str) and not value.strip()):
+            row[position] = None
+            continue
+        try:
+            row[position] = float(value)
+        except (TypeError, ValueError):
+            raise FoodImportError(f"line {line}: {IMPORT_FIELDS[position]} is not a number: {value!r}")
+    if row[2] is not None:
+        row[2] = str(row[2]).strip() or None
+    return tuple(row)
+
+
+def read_csv(file):
+    reader = csv.reader(file)
+    header = next(reader, None)
+    if header is None:
+        return
+    positions = [None] * len(IMPORT_FIELDS)
+    for column, name in enumerate(header):
+        position = _FIELD_KEYS.get(_key(name))
+        if position is not None and positions[position] is None:
+            positions[position] = column
+    if positions[0] is None:
+        raise FoodImportError("CSV header has no FoodName column")
+    for line, record in enumerate(reader, start=2):
+        if not record:
+            continue
+        yield line, [record[column] if column is not None and column < len(record) else None
+                     for column in positions]
+
+
+def read_jsonl(file):
+    for line, text in enumerate(file, start=1):
+        if not text.strip():
+            continue
+        try:
+            item = json.loads(text)
+        except ValueError:
+            item = None
+        if not isinstance(item, dict):
+            yield line, None
+            continue
+        values = [None] * len(IMPORT_FIELDS)
+        for name, value in item.items():
+            position = _FIELD_KEYS.get(_key(name))
+            if position is not None:
+                values[position] = value
+        yield line, values
+
+
+class FoodImporter:
+    # Streams foods from CSV/JSONL into ServingInfo, Foods and Nutrition a batch at a time, one
+    # transaction per batch. SQL Server stages each batch with fast_executemany and inserts it
+    # set-based, resolving the generated ids in the same round trip. SQLite assigns the ids
+    # itself under a write lock and inserts with executemany. Invalid rows are skipped.
+
+    def __init__(self, connection, batch_size=IMPORT_BATCH_SIZE):
+        self.connection = connection
+        self.batch_size = batch_size
+        self.dialect = dialect_of(connection)
+
+    def import_file(self, path, file_format=None):
+        file_format = file_format or ('jsonl' if path.lower().endswith(('.jsonl', '.ndjson')) else 'csv')
+        with open(path, encoding='utf-8-sig', newline='') as file:
+            reader = read_jsonl(file) if file_format == 'jsonl' else read_csv(file)
+            return self.import_rows(reader)
+
+    def import_rows(self, records):
+        # records are (line, values in IMPORT_FIELDS order), returns the import statistics
+        started = time.perf_counter()
+        imported = skipped = 0
+        # Adding foods one by one to a loaded search index only pays off for small imports,
+        # past max_delta foods it is rebuilt once at the end instead
+        rebuild_index = False
+        records = iter(records)
+        while True:
+            chunk = list(itertools.islice(records, self.batch_size))
+            if not chunk:
+                break
+            batch = []
+            for line, values in chunk:
+                try:
+                    batch.append(_food_row(values, line))
+                except FoodImportError as error:
+                    skipped += 1
+                    if skipped <= 10:
+                        logging.warning(f"Skipping food: {error}")
+            if not batch:
+                continue
+            food_ids = self.write_batch(batch)
+            imported += len(batch)
+            if food_index.loaded and not rebuild_index:
+                if imported <= food_index.max_delta:
+                    for food_id, (name, no_serve, serv_size, calories, protein, carbs, fat) in zip(food_ids, batch):
+                        food_index.add((food_id, name, no_serve, serv_size, calories, carbs, fat, protein))
+                else:
+                    rebuild_index = True
+            logging.debug("Imported %s food(s) so far", imported)
+        if rebuild_index:
+            food_index.build(self.connection)
+        elapsed = time.perf_counter() - started
+        stats = {
+            'imported': imported,
+            'skipped': skipped,
+            'seconds': round(elapsed, 3),
+            'foods_per_second': round(imported / elapsed) if elapsed else imported,
+        }
+        logging.info(f"Food import finished: {stats}")
+        return stats
+
+    def write_batch(self, batch):
+        # Rows in IMPORT_FIELDS order, one transaction; returns their FoodIds in order
+        try:
+            food_ids = self.insert_batch(batch)
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        return food_ids
+
+    def insert_batch(self, batch):
+        # Same as write_batch inside the caller's transaction, which commits or rolls back
+        if self.dialect == 'mssql':
+            return self._write_batch_mssql(batch)
+        return self._write_batch_sqlite(batch)
+
+    def _write_batch_mssql(self, batch):
+        cursor = self.connection.cursor()
+        cursor.execute(PREPARE_STAGING_SQL)
+        cursor.fast_executemany = True
+        cursor.executemany(STAGE_ROWS_SQL, [(row_no, *row) for row_no, row in enumerate(batch)])
+        cursor.execute(WRITE_STAGED_SQL)
+        food_ids = [None] * len(batch)
+        for food_id, row_no in cursor.fetchall():
+            food_ids[row_no] = food_id
+        return food_ids
+
+    def _write_batch_sqlite(self, batch):
+        begin_write(self.connection)
+        cursor = self.connection.cursor()
+        cursor.execute("SELECT COALESCE(MAX(ServId), 0) FROM ServingInfo")
+        first_serv_id = cursor.fetchone()[0] + 1
+        cursor.execute("SELECT COALESCE(MAX(FoodId), 0) FROM Foods")
+        first_food_id = cursor.fetchone()[0] + 1
+        food_ids = range(first_food_id, first_food_id + len(batch))
+        serv_ids = range(first_serv_id, first_serv_id + len(batch))
+        cursor.executemany("INSERT INTO ServingInfo (ServId, NoServe, ServSize) VALUES (?, ?, ?)",
+                           [(serv_id, row[1], row[2]) for serv_id, row in zip(serv_ids, batch)])
+        cursor.executemany("INSERT INTO Foods (FoodId, ServId, FoodName) VALUES (?, ?, ?)",
+                           [(food_id, serv_id, row[0]) for food_id, serv_id, row in zip(food_ids, serv_ids, batch)])
+        cursor.executemany("INSERT INTO Nutrition (FoodId, Calories, Protein, Carbs, Fat) VALUES (?, ?, ?, ?, ?)",
+                           [(food_id, *row[3:]) for food_id, row in zip(food_ids, batch)])
+        return list(food_ids)
+
+
+def main():
+    from logging_config import logging_setup
+    from db_backends import backend_from_env
+
+    parser = argparse.ArgumentParser(description="Bulk import foods from a CSV or JSONL file")
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=('csv', 'jsonl'))
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    logging_setup.configure()
+    # RECIPEJOY_BACKEND and friends pick the database, as for the application
+    connection = backend_from_env().connect()
+    try:
+        stats = FoodImporter(connection, args.batch_size).import_file(args.path, args.format)
+    except (FoodImportError, OSError) as error:
+        logging.error(f"Food import failed: {error}")
+        return 1
+    finally:
+        connection.close()
+    print(json.dumps(stats))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,225 @@
+# food_index.py
+import bisect
+import heapq
+import logging
+import threading
+import time
+from array import array
+from collections import defaultdict
+
+# Same columns, in the same order, as the rows FoodOperations.search_foods turns into Food objects
+FOOD_INDEX_QUERY = """
+    SELECT F.FoodId, F.FoodName, S.NoServe, S.ServSize,
+           N.Calories, N.Carbs, N.Fat, N.Protein
+    FROM Foods F
+    JOIN ServingInfo S ON F.ServId = S.ServId
+    JOIN Nutrition N ON F.FoodId = N.FoodId
+"""
+
+GRAM_SIZE = 3
+
+
+def _grams(text):
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+class FoodNameIndex:
+    def __init__(self, compact_ratio=0.25):
+        self._lock = threading.RLock()
+        # food_id -> (FoodId, FoodName, NoServe, ServSize, Calories, Carbs, Fat, Protein)
+        self._rows = {}
+        # food_id -> case-folded name, what substring matches are checked against
+        self._names = {}
+        # trigram -> food ids containing it, in name order as of the last build
+        self._postings = defaultdict(lambda: array('q'))
+        # foods added or renamed since the last build, their posting entries are out of name order
+        self._delta = set()
+        self.max_delta = 4096
+        # sorted (word, food_id) pairs for prefix lookups
+        self._words = []
+        # every food id in name order as of the last build, scanned for terms shorter than a trigram
+        self._order = array('q')
+        self._posting_count = 0
+        self._stale = 0
+        self.compact_ratio = compact_ratio
+        # Bumped on every change, lets callers tell whether earlier search results are still current
+        self.version = 0
+        self.loaded = False
+
+    def build(self, connection, batch_size=10000):
+        started = time.perf_counter()
+        cursor = connection.cursor()
+        cursor.execute(FOOD_INDEX_QUERY)
+        with self._lock:
+            self._clear()
+            self.version += 1
+            words = []
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    row = tuple(row)
+                    food_id, name = row[0], (row[1] or "").casefold()
+                    self._rows[food_id] = row
+                    self._names[food_id] = name
+                    words.extend((word, food_id) for word in set(name.split()))
+            words.sort()
+            self._words = words
+            self._compact()
+            self.loaded = True
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        logging.info(f"Food search index built for {len(self._rows)} foods in {elapsed_ms:.0f} ms")
+
+    def add(self, row):
+        row = tuple(row)
+        with self._lock:
+            self.version += 1
+            if not self.loaded:
+                return
+            food_id = row[0]
+            if food_id in self._rows:
+                self._remove(food_id)
+            name = (row[1] or "").casefold()
+            self._rows[food_id] = row
+            self._names[food_id] = name
+            for gram in _grams(name):
+                self._postings[gram].append(food_id)
+                self._posting_count += 1
+            for word in set(name.split()):
+                bisect.insort(self._words, (word, food_id))
+            self._delta.add(food_id)
+            if len(self._delta) > self.max_delta:
+                self._compact()
+
+    def update(self, row):
+        self.add(row)
+
+    def remove(self, food_id):
+        with self._lock:
+            self.version += 1
+            if self.loaded and food_id in self._rows:
+                self._remove(food_id)
+
+    def search(self, term, limit=None, after=None):
+        # Rows whose name contains term, like FoodName LIKE '%term%', ordered by name.
+        # after is the sort_key of the last row of the previous page
+        term = (term or "").strip().casefold()
+        with self._lock:
+            if not term:
+                return []
+            names = self._names
+            if len(term) < GRAM_SIZE:
+                # Too short for a trigram lookup, scan every name in order instead
+                candidates = self._order
+            else:
+                postings = []
+                for gram in _grams(term):
+                    posting = self._postings.get(gram)
+                    if not posting:
+                        return []
+                    postings.append(posting)
+                candidates = min(postings, key=len)
+
+            # Walk the candidates (the rarest trigram's foods) in name order and confirm the full
+            # substring, so a limited search can stop as soon as it has enough matches
+            delta = self._delta
+            matches = []
+            for food_id in candidates:
+                if food_id not in delta and term in names.get(food_id, ""):
+                    if after is not None and (names[food_id], food_id) <= after:
+                        continue
+                    matches.append(food_id)
+                    if limit is not None and len(matches) >= limit:
+                        break
+            recent = [food_id for food_id in delta if term in names.get(food_id, "")
+                      and (after is None or (names[food_id], food_id) > after)]
+            if recent:
+                return self._ordered_rows(matches + recent, limit)
+            return [self._rows[food_id] for food_id in matches]
+
+    @staticmethod
+    def sort_key(row):
+        # Position of a row in search order, for keyset paging through search results
+        return ((row[1] or "").casefold(), row[0])
+
+    def search_prefix(self, term, limit=None):
+        # Rows whose name starts with term
+        term = (term or "").strip().casefold()
+        with self._lock:
+            if not term:
+                return []
+            first_word = term.split()[0]
+            matches = {food_id for food_id in self._word_prefix_ids(first_word)
+                       if self._names[food_id].startswith(term)}
+            return self._ordered_rows(matches, limit)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'foods': len(self._rows),
+                'trigrams': len(self._postings),
+                'postings': self._posting_count,
+                'words': len(self._words),
+                'stale_postings': self._stale,
+                'unordered_foods': len(self._delta),
+            }
+
+    def _word_prefix_ids(self, prefix):
+        words = self._words
+        position = bisect.bisect_left(words, (prefix,))
+        matches = set()
+        while position < len(words) and words[position][0].startswith(prefix):
+            matches.add(words[position][1])
+            position += 1
+        return matches
+
+    def _ordered_rows(self, food_ids, limit):
+        names = self._names
+        if limit is not None:
+            ordered = heapq.nsmallest(limit, food_ids, key=lambda food_id: (names[food_id], food_id))
+        else:
+            ordered = sorted(food_ids, key=lambda food_id: (names[food_id], food_id))
+        return [self._rows[food_id] for food_id in ordered]
+
+    def _remove(self, food_id):
+        name = self._names.pop(food_id)
+        del self._rows[food_id]
+        for word in set(name.split()):
+            position = bisect.bisect_left(self._words, (word, food_id))
+            if position < len(self._words) and self._words[position] == (word, food_id):
+                del self._words[position]
+        # Trigram postings are cleaned up lazily, searches re-check names anyway
+        self._stale += len(_grams(name))
+        if self._stale > self.compact_ratio * self._posting_count:
+            self._compact()
+
+    def _compact(self):
+        # Rebuild the postings with every food in name order
+        postings = defaultdict(lambda: array('q'))
+        order = array('q')
+        count = 0
+        for food_id, name in sorted(self._names.items(), key=lambda item: (item[1], item[0])):
+            order.append(food_id)
+            for gram in _grams(name):
+                postings[gram].append(food_id)
+                count += 1
+        self._postings = postings
+        self._order = order
+        self._posting_count = count
+        self._stale = 0
+        self._delta.clear()
+
+    def _clear(self):
+        self._rows.clear()
+        self._names.clear()
+        self._postings = defaultdict(lambda: array('q'))
+        self._words = []
+        self._order = array('q')
+        self._delta.clear()
+        self._posting_count = 0
+        self._stale = 0
+
+
+# Kept in sync by FoodOperations.add_food_item/update_food_item/delete_food_item
+food_index = FoodNameIndex()
@@ -1,5 +1,27 @@
 # food_operations.py
 import logging
+from reference_cache import reference_cache
+from food_index import FOOD_INDEX_QUERY, food_index
+from recipes_operations import RecipeOperations
+from unit_of_work import UnitOfWork
+
+# Rows per page of the foods table and the food search
+PAGE_SIZE = 200
+
+# Keyset pages in FoodId order, {after} is empty for the first page
+FOODS_PAGE_QUERY = FOOD_INDEX_QUERY + """
+    {after}
+    ORDER BY F.FoodId
+    OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY
+"""
+
+# Keyset pages in (FoodName, FoodId) order, {after} is empty for the first page
+FOOD_SEARCH_PAGE_QUERY = FOOD_INDEX_QUERY + """
+    WHERE F.FoodName LIKE ?{after}
+    ORDER BY F.FoodName, F.FoodId
+    OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY
+"""
+FOOD_SEARCH_AFTER = " AND (F.FoodName > ? OR (F.FoodName = ? AND F.FoodId > ?))"
 
 class FoodOperations:
 
@@ -23,6 +45,7 @@ class FoodOperations:
                            (food_id, calories, protein, carbs, fat))
 
             connection.commit()
+            food_index.add((food_id, food_name, no_serve, serv_size, calories, carbs, fat, protein))
             return food_id
         except Exception as error:
             logging.error(f"Error adding food item: {error}")
@@ -32,88 +55,133 @@ class FoodOperations:
     @staticmethod
     def update_food_item(connection, food_id, new_food_name, new_no_serve, new_serv_size, new_calories, new_protein, new_carbs, new_fat):
         try:
-            cursor = connection.cursor()
-
-            # Update the ServingInfo table
-            cursor.execute("""
-                UPDATE ServingInfo
-                SET NoServe = ?, servsize = ?
-                WHERE ServId = (SELECT ServId FROM Foods WHERE FoodId = ?)
-                """,
-                (new_no_serve, new_serv_size, food_id))
-            connection.commit()
-
-            # Update the Foods table
-            cursor.execute("""
-                UPDATE Foods
-                SET FoodName = ?
-                WHERE FoodId = ?
-                """,
-                (new_food_name, food_id))
-            connection.commit()
-
-            # Update the Nutrition table
-            cursor.execute("""
-                UPDATE Nutrition
-                SET Calories = ?, Protein = ?, Carbs = ?, Fat = ?
-                WHERE FoodId = ?
-                """,
-                (new_calories, new_protein, new_carbs, new_fat, food_id))
-
-            connection.commit()
+            # All three tables and the recipe totals change in one transaction and one batch
+            with UnitOfWork(connection) as work:
+                work.cursor.execute("SELECT FoodName FROM Foods WHERE FoodId = ?", (food_id,))
+                old_name = work.cursor.fetchone()
+
+                # Update the ServingInfo table
+                work.execute("""
+                    UPDATE ServingInfo
+                    SET NoServe = ?, servsize = ?
+                    WHERE ServId = (SELECT ServId FROM Foods WHERE FoodId = ?)
+                    """,
+                    (new_no_serve, new_serv_size, food_id))
+
+                # Update the Foods table
+                work.execute("""
+                    UPDATE Foods
+                    SET FoodName = ?
+                    WHERE FoodId = ?
+                    """,
+                    (new_food_name, food_id))
+
+                # Update the Nutrition table
+                work.execute("""
+                    UPDATE Nutrition
+                    SET Calories = ?, Protein = ?, Carbs = ?, Fat = ?
+                    WHERE FoodId = ?
+                    """,
+                    (new_calories, new_protein, new_carbs, new_fat, food_id))
+
+                # Recompute the stored totals of every recipe using this food in the same transaction
+                recipe_ids = RecipeOperations.propagate_food_change(work, food_id)
+
+                work.after_commit(food_index.update, (food_id, new_food_name, new_no_serve, new_serv_size,
+                                                      new_calories, new_carbs, new_fat, new_protein))
+                # Only the recipes using this food show its name and nutrition
+                work.after_commit(RecipeOperations.recipes_changed, recipe_ids,
+                                  text_changed=old_name is None or old_name[0] != new_food_name)
             logging.info(f"Food item with ID {food_id} udpated successfully.")
         except Exception as error:
             logging.error(f"Error updating food item: {error}")
-            connection.rollback()
             raise
 
     @staticmethod
     def delete_food_item(connection, food_id):
         try:
-            cursor = connection.cursor()
-
-            # Delete from the Nutrition table
-            cursor.execute("""
-                DELETE FROM Nutrition
-                WHERE FoodId = ?
-                """,
-                (food_id,))
-            connection.commit()
-
-            # Delete from the Foods table and retrieve the ServId
-            cursor.execute("""
-                DELETE FROM Foods
-                OUTPUT DELETED.ServId
-                WHERE FoodId = ?
-                """,
-                (food_id,))
-            serve_id = cursor.fetchone()[0]
-            connection.commit()
-
-            # Delete from the ServingInfo table
-            cursor.execute("""
-                DELETE FROM ServingInfo
-                WHERE ServId = ?
-                """,
-                (serve_id,))
-            connection.commit()
-
-            print ("Food item deleted successfully.")
+            with UnitOfWork(connection) as work:
+                # The ServId is read up front so the deletes can go out as one batch
+                work.cursor.execute("SELECT ServId FROM Foods WHERE FoodId = ?", (food_id,))
+                row = work.cursor.fetchone()
+                if row is None:
+                    logging.warning(f"Food item with ID {food_id} not found.")
+                    return
+
+                # Delete from the Nutrition table
+                work.execute("""
+                    DELETE FROM Nutrition
+                    WHERE FoodId = ?
+                    """,
+                    (food_id,))
+
+                # Delete from the Foods table, the recipes using it are recomputed without it
+                work.execute("""
+                    DELETE FROM Foods
+                    WHERE FoodId = ?
+                    """,
+                    (food_id,))
+                recipe_ids = RecipeOperations.propagate_food_change(work, food_id)
+
+                # Delete from the ServingInfo table
+                work.execute("""
+                    DELETE FROM ServingInfo
+                    WHERE ServId = ?
+                    """,
+                    (row[0],))
+                work.after_commit(food_index.remove, food_id)
+                work.after_commit(RecipeOperations.recipes_changed, recipe_ids, text_changed=True)
+
+            logging.info("Food item deleted successfully.")
         except Exception as error:
             logging.error(f"Error while deleting food item: {error}")
 
+    @staticmethod
+    def get_all_foods(connection):
+        # (FoodId, FoodName, NoServe, ServSize, Calories, Carbs, Fat, Protein) rows for the foods table
+        cursor = connection.cursor()
+        cursor.execute(FOOD_INDEX_QUERY)
+        return cursor.fetchall()
+
+    @staticmethod
+    def get_foods_page(connection, after=None, limit=PAGE_SIZE):
+        # (rows, after) with rows like get_all_foods, pass after back for the next page, None after the last one
+        cursor = connection.cursor()
+        if after is None:
+            cursor.execute(FOODS_PAGE_QUERY.format(after=""), (limit,))
+        else:
+            cursor.execute(FOODS_PAGE_QUERY.format(after="WHERE F.FoodId > ?"), (after, limit))
+        rows = cursor.fetchall()
+        return rows, (rows[-1][0] if len(rows) == limit else None)
+
     @staticmethod
     def get_measurements(connection):
         try:
-            cursor = connection.cursor()
-            cursor.execute("SELECT MeasId, MeasName FROM Measurements ORDER BY MeasName")
-            return cursor.fetchall()
+            return reference_cache.rows(connection, 'measurements')
         except Exception as error:
             logging.error(f"Error while getting measurements: {error}")
             return []
 
+    @staticmethod
+    def load_search_index(connection):
+        try:
+            food_index.build(connection)
+            return True
+        except Exception as error:
+            logging.error(f"Error building food search index: {error}")
+            return False
+
+    @staticmethod
+    def data_version():
+        # Changes whenever a food is added, edited or removed
+        return food_index.version
+
     @staticmethod
     def search_foods(connection, search_term):
+        # Served from the in-memory name index once it is built
+        if food_index.loaded:
+            return [Food(*row) for row in food_index.search(search_term)]
+
         cursor = connection.cursor()
         query = """
                 SELECT F.FoodId, F.FoodName, S.NoServe, S.ServSize, 
@@ -126,6 +194,28 @@ class FoodOperations:
         cursor.execute(query, (f'%{search_term}%',))
         return [Food(*row) for row in cursor.fetchall()]
 
+    @staticmethod
+    def search_foods_page(connection, search_term, after=None, limit=PAGE_SIZE):
+        # (foods, after) a page at a time in name order, pass after back for the next page. The
+        # index and SQL orders differ (casefold vs collation), so after names the path that made
+        # it and later pages stay on that path, also once the index has finished loading
+        path = after[0] if after is not None else ('index' if food_index.loaded else 'sql')
+        if path == 'index':
+            rows = food_index.search(search_term, limit, after[1] if after is not None else None)
+            after = ('index', food_index.sort_key(rows[-1])) if len(rows) == limit else None
+            return [Food(*row) for row in rows], after
+
+        cursor = connection.cursor()
+        if after is None:
+            cursor.execute(FOOD_SEARCH_PAGE_QUERY.format(after=""), (f'%{search_term}%', limit))
+        else:
+            _, name, food_id = after
+            cursor.execute(FOOD_SEARCH_PAGE_QUERY.format(after=FOOD_SEARCH_AFTER),
+                           (f'%{search_term}%', name, name, food_id, limit))
+        rows = cursor.fetchall()
+        after = ('sql', rows[-1][1], rows[-1][0]) if len(rows) == limit else None
+        return [Food(*row) for row in rows], after
+
 class Food:
     def __init__(self, food_id, name, no_serve, serv_size, calories, carbs, fat, protein):
         self.food_id = food_id
@@ -0,0 +1,87 @@
+# incremental_search.py
+import logging
+
+from PyQt5.QtCore import QObject, QTimer
+
+# Quiet period after the last keystroke before a search runs
+DEBOUNCE_MS = 250
+
+
+class IncrementalSearch(QObject):
+    # Search-as-you-type on top of AsyncQueryRunner: keystrokes are debounced, a newer term
+    # supersedes the query still running for an older one, and a term that narrows the last
+    # one (contains it) is answered by refining the last result set in memory.
+
+    def __init__(self, runner, key, query, on_result, refine=None, version=None, on_error=None,
+                 delay_ms=DEBOUNCE_MS, parent=None):
+        super().__init__(parent)
+        self.runner = runner
+        self.key = key
+        # query(connection, term) runs on a worker, refine(results, term) on the GUI thread
+        self.query = query
+        self.refine = refine
+        # version() changes whenever the searched data does, older result sets are not refined
+        self.version = version
+        self.on_result = on_result
+        self.on_error = on_error
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay_ms)
+        self._timer.timeout.connect(self._fire)
+        self._term = ""
+        # (term, version, results) of the last completed search
+        self._last = None
+        self.refined = 0
+        self.queried = 0
+
+    def set_term(self, term):
+        # Connected to textChanged, restarts the debounce window
+        self._term = term.strip()
+        self._timer.start()
+
+    def run_now(self, term=None, on_result=None):
+        # Search immediately, e.g. from a button, optionally with a one-off result handler
+        self._timer.stop()
+        if term is not None:
+            self._term = term.strip()
+        self._search(self._term, on_result or self.on_result)
+
+    def invalidate(self):
+        self._timer.stop()
+        self._last = None
+
+    def _fire(self):
+        self._search(self._term, self.on_result)
+
+    def _search(self, term, on_result):
+        if not term:
+            self.runner.cancel(self.key)
+            return
+
+        version = self.version() if self.version is not None else None
+        if self.refine is not None and self._last is not None:
+            last_term, last_version, last_results = self._last
+            if last_version == version and last_term.casefold() in term.casefold():
+                # Narrower term over unchanged data, its matches are a subset of the last ones.
+                # refine returns None when the results cannot be narrowed this way
+                results = self.refine(last_results, term)
+                if results is not None:
+                    self.runner.cancel(self.key)
+                    self._last = (term, version, results)
+                    self.refined += 1
+                    logging.debug("Search '%s' refined in memory to %s result(s)", term, len(results))
+                    on_result(term, results)
+                    return
+
+        def finished(results):
+            self._last = (term, version, results)
+            on_result(term, results)
+
+        self.queried += 1
+        self.runner.submit(self.key, self.query, term, on_result=finished,
+                           on_error=lambda error: self._failed(term, error))
+
+    def _failed(self, term, error):
+        logging.warning(f"Search '{term}' failed: {error}")
+        if self.on_error is not None:
+            self.on_error(error)
@@ -0,0 +1,171 @@
+# logging_config.py
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from collections import deque
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(module)s: %(message)s"
+
+# Records kept in memory for dump-on-error when RECIPEJOY_LOG_RING_SIZE is not set. Off by default,
+# with the ring buffer on every debug record is created whatever the output level
+RING_BUFFER_SIZE = 0
+# Buffered records with a longer list (or other collection) among their args keep the formatted
+# message instead, so the buffer does not keep the rows they were logged with alive
+RING_ARG_MAX_ITEMS = 32
+
+
+def _level(value):
+    if isinstance(value, int):
+        return value
+    level = logging.getLevelName(str(value).strip().upper())
+    if not isinstance(level, int):
+        raise ValueError(f"Unknown log level: {value}")
+    return level
+
+
+def parse_module_levels(text):
+    # "connection_pool=DEBUG, ui_operations=WARNING" -> {'connection_pool': 10, 'ui_operations': 30}
+    levels = {}
+    for part in (text or "").split(','):
+        module, _, level = part.partition('=')
+        if module.strip() and level.strip():
+            levels[module.strip()] = _level(level)
+    return levels
+
+
+class ModuleLevelFilter(logging.Filter):
+    # Per-module levels keyed on record.module, so they also apply to the module-level
+    # logging.debug/info calls that all go through the root logger
+    def __init__(self, default_level, module_levels=None):
+        super().__init__()
+        self.default_level = default_level
+        self.module_levels = dict(module_levels or {})
+
+    def level_for(self, module):
+        return self.module_levels.get(module, self.default_level)
+
+    def filter(self, record):
+        return record.levelno >= self.level_for(record.module)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    # Only records that passed the output filter get here. Their message is built now, while the
+    # args still hold the values they had when logged (they may be mutable objects the caller
+    # keeps changing), the rest of the formatting is left to the listener thread
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class RingBufferHandler(logging.Handler):
+    # Keeps the last capacity records unformatted. When one at dump_level or above arrives, the
+    # buffered records the output filter had dropped are written to target ahead of it, so an
+    # error comes with the debug output that led up to it
+    def __init__(self, capacity, target, output_filter, dump_level=logging.ERROR):
+        super().__init__(logging.DEBUG)
+        self.records = deque(maxlen=capacity)
+        self.target = target
+        self.output_filter = output_filter
+        self.dump_level = dump_level
+
+    def emit(self, record):
+        if record.levelno >= self.dump_level:
+            self.dump()
+            return
+        if record.args and self._large_args(record.args):
+            record.msg, record.args = record.getMessage(), None
+        self.records.append(record)
+
+    @staticmethod
+    def _large_args(args):
+        values = args.values() if isinstance(args, dict) else args
+        return any(isinstance(value, (list, tuple, dict, set, frozenset)) and len(value) > RING_ARG_MAX_ITEMS
+                   for value in values)
+
+    def dump(self):
+        # Thread-safe through Handler.handle's lock when called from emit, acquire it otherwise
+        records, dropped = list(self.records), 0
+        self.records.clear()
+        for record in records:
+            if not self.output_filter.filter(record):
+                self.target.emit(record)
+                dropped += 1
+        return dropped
+
+
+class LoggingSetup:
+    def __init__(self):
+        self.listener = None
+        self.ring_buffer = None
+        self.output_filter = None
+        self._exit_registered = False
+
+    def configure(self, level=None, module_levels=None, log_file=None, ring_size=None):
+        # One configuration for the whole application, called once by main.py. Defaults come from
+        # RECIPEJOY_LOG_LEVEL (INFO), RECIPEJOY_LOG_MODULES ("module=LEVEL,..."), RECIPEJOY_LOG_FILE and
+        # RECIPEJOY_LOG_RING_SIZE (records kept for dump-on-error, off unless set)
+        self.shutdown()
+        level = _level(level if level is not None else os.environ.get('RECIPEJOY_LOG_LEVEL', 'INFO'))
+        levels = parse_module_levels(os.environ.get('RECIPEJOY_LOG_MODULES'))
+        levels.update({module: _level(value) for module, value in (module_levels or {}).items()})
+        log_file = log_file if log_file is not None else os.environ.get('RECIPEJOY_LOG_FILE')
+        if ring_size is None:
+            ring_size = int(os.environ.get('RECIPEJOY_LOG_RING_SIZE') or RING_BUFFER_SIZE)
+
+        formatter = logging.Formatter(LOG_FORMAT)
+        outputs = [logging.StreamHandler(sys.stderr)]
+        if log_file:
+            outputs.append(logging.FileHandler(log_file, encoding='utf-8'))
+        for output in outputs:
+            output.setFormatter(formatter)
+
+        # Writing happens on the listener thread, the GUI thread only enqueues records
+        log_queue = queue.SimpleQueue()
+        self.listener = logging.handlers.QueueListener(log_queue, *outputs)
+        self.output_filter = ModuleLevelFilter(level, levels)
+        queue_handler = LazyQueueHandler(log_queue)
+        queue_handler.addFilter(self.output_filter)
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        handlers = []
+        self.ring_buffer = None
+        if ring_size:
+            # Ahead of the queue handler so dumped context is written before the error itself
+            self.ring_buffer = RingBufferHandler(ring_size, queue_handler, self.output_filter)
+            handlers.append(self.ring_buffer)
+        handlers.append(queue_handler)
+        for handler in handlers:
+            root.addHandler(handler)
+
+        # The root level is the cheapest cut-off, records below it are never created
+        lowest = min([level] + list(levels.values()))
+        root.setLevel(logging.DEBUG if ring_size else lowest)
+        self.listener.start()
+        if not self._exit_registered:
+            atexit.register(self.shutdown)
+            self._exit_registered = True
+
+    def dump_ring_buffer(self):
+        # Writes the buffered records that were not output, e.g. from an exception hook
+        if self.ring_buffer is None:
+            return 0
+        self.ring_buffer.acquire()
+        try:
+            return self.ring_buffer.dump()
+        finally:
+            self.ring_buffer.release()
+
+    def shutdown(self):
+        # Flushes what is still queued, safe to call more than once
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+
+logging_setup = LoggingSetup()
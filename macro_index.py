@@ -0,0 +1,272 @@
+# macro_index.py
+import heapq
+import logging
+import threading
+import time
+
+from nutrition_engine import NUTRIENTS
+
+# Same column order as NUTRIENTS, recipes without totals index as 0
+MACRO_INDEX_QUERY = """
+    SELECT RecId, COALESCE(RecCals, 0), COALESCE(RecCarbs, 0), COALESCE(RecFat, 0), COALESCE(RecProtein, 0),
+           COALESCE(RecServings, 1)
+    FROM Recipes
+"""
+
+# Distance weights when the caller gives none, a gram of macros is worth about 5 kcal
+DEFAULT_MACRO_WEIGHTS = {'calories': 1 / 25, 'carbs': 1.0, 'fat': 1.0, 'protein': 1.0}
+
+# Filtered recommendations brute-force candidate sets up to this share of the catalog
+FILTER_SCAN_RATIO = 0.05
+
+LEAF_SIZE = 16
+
+# Largest IN (...) list sent when refreshing a batch of recipes
+REFRESH_CHUNK_SIZE = 500
+
+
+class MacroIndex:
+    # k-d tree over per-recipe (calories, carbs, fat, protein) for box and nearest-profile queries
+
+    def __init__(self, per_serving=False, rebuild_ratio=0.1):
+        # per_serving indexes each recipe's totals divided by RecServings
+        self.per_serving = per_serving
+        self._lock = threading.RLock()
+        # tree position -> recipe id, and one coordinate list per nutrient
+        self._ids = []
+        self._coords = [[] for _ in NUTRIENTS]
+        self._positions = {}
+        # nested (axis, split, left, right) nodes, leaves are lists of tree positions
+        self._root = None
+        # tree positions whose recipe was changed or deleted since the build
+        self._dead = set()
+        # recipe_id -> vector for recipes added or changed since the build, scanned linearly
+        self._delta = {}
+        # Recipes saved since they were last read
+        self._dirty = set()
+        self.rebuild_ratio = rebuild_ratio
+        self.loaded = False
+
+    def build(self, connection, batch_size=10000):
+        started = time.perf_counter()
+        cursor = connection.cursor()
+        cursor.execute(MACRO_INDEX_QUERY)
+        points = {}
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                points[row[0]] = self._vector(row)
+        with self._lock:
+            self._dirty.clear()
+            self._build(points)
+            self.loaded = True
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        logging.info(f"Macro index built for {len(points)} recipes in {elapsed_ms:.0f} ms")
+
+    def mark_dirty(self, recipe_id):
+        # Called by the recipe write paths, the recipe's totals are re-read before the next query
+        with self._lock:
+            if self.loaded:
+                self._dirty.add(recipe_id)
+
+    def refresh(self, connection):
+        with self._lock:
+            recipe_ids = list(self._dirty)
+            if not recipe_ids:
+                return
+            self._dirty.clear()
+
+        points = {}
+        try:
+            cursor = connection.cursor()
+            for start in range(0, len(recipe_ids), REFRESH_CHUNK_SIZE):
+                chunk = recipe_ids[start:start + REFRESH_CHUNK_SIZE]
+                cursor.execute(MACRO_INDEX_QUERY + f" WHERE RecId IN ({', '.join('?' * len(chunk))})", tuple(chunk))
+                for row in cursor.fetchall():
+                    points[row[0]] = self._vector(row)
+        except Exception:
+            # Still stale, the next query tries again
+            with self._lock:
+                self._dirty.update(recipe_ids)
+            raise
+
+        with self._lock:
+            for recipe_id in recipe_ids:
+                self._discard(recipe_id)
+                if recipe_id in points:
+                    self._delta[recipe_id] = points[recipe_id]
+            if len(self._delta) + len(self._dead) > max(1024, self.rebuild_ratio * len(self._ids)):
+                self._build(self._all_points())
+        logging.debug("Macro index refreshed %s recipe(s)", len(recipe_ids))
+
+    def range_query(self, connection, bounds):
+        # Recipe ids whose values fall inside every (low, high) in bounds, like BETWEEN, in id order
+        self.refresh(connection)
+        ranges = [bounds.get(name, (None, None)) for name in NUTRIENTS]
+        lows = [float('-inf') if low is None else low for low, _ in ranges]
+        highs = [float('inf') if high is None else high for _, high in ranges]
+        with self._lock:
+            matches = []
+            if self._root is not None:
+                self._range(self._root, lows, highs, matches)
+            for recipe_id, vector in self._delta.items():
+                if all(low <= value <= high for low, value, high in zip(lows, vector, highs)):
+                    matches.append(recipe_id)
+            matches.sort()
+            return matches
+
+    def nearest(self, connection, target, k=10, weights=None, accept=None):
+        # k (recipe_id, distance) pairs closest to target by weighted Euclidean distance,
+        # nutrients missing from target are ignored, accept(recipe_id) can reject candidates
+        self.refresh(connection)
+        weights = weights or {}
+        point = [float(target.get(name, 0) or 0) for name in NUTRIENTS]
+        scale = [float(weights.get(name, 1.0)) if name in target else 0.0 for name in NUTRIENTS]
+        with self._lock:
+            # max-heap of (-distance, -recipe_id) so ties keep the lower id
+            best = []
+            if self._root is not None:
+                self._nearest(self._root, point, scale, k, accept, best)
+            for recipe_id, vector in self._delta.items():
+                self._consider(recipe_id, vector, point, scale, k, accept, best)
+            return [(-negative_id, (-negative_distance) ** 0.5)
+                    for negative_distance, negative_id in sorted(best, reverse=True)]
+
+    def nearest_among(self, recipe_ids, target, k=10, weights=None):
+        # Same as nearest, by brute force over a small candidate set such as a tag's recipes
+        weights = weights or {}
+        point = [float(target.get(name, 0) or 0) for name in NUTRIENTS]
+        scale = [float(weights.get(name, 1.0)) if name in target else 0.0 for name in NUTRIENTS]
+        with self._lock:
+            best = []
+            for recipe_id in recipe_ids:
+                vector = self._delta.get(recipe_id)
+                if vector is None:
+                    position = self._positions.get(recipe_id)
+                    if position is None or position in self._dead:
+                        continue
+                    vector = [coords[position] for coords in self._coords]
+                self._consider(recipe_id, vector, point, scale, k, None, best)
+            return [(-negative_id, (-negative_distance) ** 0.5)
+                    for negative_distance, negative_id in sorted(best, reverse=True)]
+
+    def size(self):
+        with self._lock:
+            return len(self._ids) - len(self._dead) + len(self._delta)
+
+    def vector(self, recipe_id):
+        with self._lock:
+            if recipe_id in self._delta:
+                return dict(zip(NUTRIENTS, self._delta[recipe_id]))
+            position = self._positions.get(recipe_id)
+            if position is None or position in self._dead:
+                return None
+            return dict(zip(NUTRIENTS, (coords[position] for coords in self._coords)))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'recipes': self.size(),
+                'tree_points': len(self._ids),
+                'dead': len(self._dead),
+                'delta': len(self._delta),
+                'dirty': len(self._dirty),
+            }
+
+    def _vector(self, row):
+        values = tuple(float(value) for value in row[1:5])
+        if self.per_serving:
+            servings = float(row[5])
+            if servings > 0:
+                return tuple(value / servings for value in values)
+        return values
+
+    def _build(self, points):
+        self._ids = list(points)
+        self._coords = [[points[recipe_id][axis] for recipe_id in self._ids] for axis in range(len(NUTRIENTS))]
+        self._positions = {recipe_id: position for position, recipe_id in enumerate(self._ids)}
+        self._dead = set()
+        self._delta = {}
+        self._root = self._split(list(range(len(self._ids)))) if self._ids else None
+
+    def _split(self, positions):
+        if len(positions) <= LEAF_SIZE:
+            return positions
+        # Split on the nutrient with the widest spread, calories and grams differ by orders of magnitude
+        spreads = []
+        for coords in self._coords:
+            values = [coords[position] for position in positions]
+            spreads.append(max(values) - min(values))
+        axis = max(range(len(spreads)), key=spreads.__getitem__)
+        if spreads[axis] == 0:
+            return positions
+        coords = self._coords[axis]
+        positions.sort(key=coords.__getitem__)
+        middle = len(positions) // 2
+        split = coords[positions[middle]]
+        return (axis, split, self._split(positions[:middle]), self._split(positions[middle:]))
+
+    def _range(self, node, lows, highs, matches):
+        if isinstance(node, list):
+            coords, dead, ids = self._coords, self._dead, self._ids
+            for position in node:
+                if position in dead:
+                    continue
+                if all(lows[axis] <= coords[axis][position] <= highs[axis] for axis in range(len(coords))):
+                    matches.append(ids[position])
+            return
+        axis, split, left, right = node
+        if lows[axis] <= split:
+            self._range(left, lows, highs, matches)
+        if highs[axis] >= split:
+            self._range(right, lows, highs, matches)
+
+    def _nearest(self, node, point, scale, k, accept, best):
+        if isinstance(node, list):
+            coords, dead, ids = self._coords, self._dead, self._ids
+            for position in node:
+                if position not in dead:
+                    vector = [values[position] for values in coords]
+                    self._consider(ids[position], vector, point, scale, k, accept, best)
+            return
+        axis, split, left, right = node
+        difference = point[axis] - split
+        near, far = (left, right) if difference < 0 else (right, left)
+        self._nearest(near, point, scale, k, accept, best)
+        # Everything on the far side is at least this far away along the split axis
+        if len(best) < k or scale[axis] * difference * difference < -best[0][0]:
+            self._nearest(far, point, scale, k, accept, best)
+
+    @staticmethod
+    def _consider(recipe_id, vector, point, scale, k, accept, best):
+        distance = sum(weight * (value - wanted) ** 2 for weight, value, wanted in zip(scale, vector, point))
+        if len(best) >= k and distance >= -best[0][0]:
+            return
+        if accept is not None and not accept(recipe_id):
+            return
+        if len(best) < k:
+            heapq.heappush(best, (-distance, -recipe_id))
+        else:
+            heapq.heapreplace(best, (-distance, -recipe_id))
+
+    def _discard(self, recipe_id):
+        self._delta.pop(recipe_id, None)
+        position = self._positions.get(recipe_id)
+        if position is not None:
+            self._dead.add(position)
+
+    def _all_points(self):
+        points = {}
+        for position, recipe_id in enumerate(self._ids):
+            if position not in self._dead:
+                points[recipe_id] = tuple(coords[position] for coords in self._coords)
+        points.update(self._delta)
+        return points
+
+
+# Marked dirty by RecipeOperations write paths, queried by the Macros and Calorie Range searches
+macro_index = MacroIndex()
+# Same recipes per serving, for recommendations against a single-meal target
+serving_macro_index = MacroIndex(per_serving=True)
@@ -1,17 +1,24 @@
 # main.py
+import os
 import sys
-import logging
 
 from PyQt5.QtWidgets import QApplication
+from logging_config import logging_setup
+from query_metrics import query_metrics
 from ui_operations import MainWindow
 
 
 def main():
-    logging.basicConfig(level=logging.DEBUG)
+    logging_setup.configure()
     app = QApplication(sys.argv)
     main_window = MainWindow()
     main_window.show()
-    sys.exit(app.exec_())
+    exit_code = app.exec_()
+    # RECIPEJOY_QUERY_METRICS_FILE keeps the query timings of the session
+    metrics_file = os.environ.get('RECIPEJOY_QUERY_METRICS_FILE')
+    if metrics_file:
+        query_metrics.export_json(metrics_file)
+    sys.exit(exit_code)
 
 if __name__ == "__main__":
     main()
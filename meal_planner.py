@@ -0,0 +1,231 @@
+# meal_planner.py
+import logging
+import time
+
+from macro_index import DEFAULT_MACRO_WEIGHTS, FILTER_SCAN_RATIO, serving_macro_index
+from nutrition_engine import NUTRIENTS
+
+# Serving counts a slot may use for its recipe
+DEFAULT_SERVING_OPTIONS = (1.0, 1.5, 2.0)
+
+# Nearest recipes kept per slot and serving count, the search space for the branch and bound
+CANDIDATES_PER_SLOT = 25
+
+# (name, MealTypeId or None, share of the daily target) when the caller gives no slots
+DEFAULT_SLOTS = (
+    ("Meal 1", None, 1 / 3),
+    ("Meal 2", None, 1 / 3),
+    ("Meal 3", None, 1 / 3),
+)
+
+
+class _Deadline(Exception):
+    pass
+
+
+class _GoodEnough(Exception):
+    pass
+
+
+class MealPlanner:
+    def __init__(self, index):
+        self.index = index
+
+    def plan(self, connection, target, days=1, slots=None, weights=None, tag_ids=(),
+             serving_options=DEFAULT_SERVING_OPTIONS, time_budget=1.0, tolerance=1.0, repeat_recipes=False):
+        # Picks a recipe and serving count per slot and day so each day's totals land close to target.
+        # Within a day no two slots share a protein type, and recipes are not reused across days
+        # unless repeat_recipes. Every recipe must carry all of tag_ids. A day stops searching once its
+        # weighted squared deviation is within tolerance, or when its share of time_budget runs out.
+        started = time.perf_counter()
+        slots = list(slots or DEFAULT_SLOTS)
+        # Nutrients left out of target do not count towards the score
+        weights = weights or DEFAULT_MACRO_WEIGHTS
+        weights = {name: float(weights.get(name, 1.0)) if name in target else 0.0 for name in NUTRIENTS}
+        target = [float(target.get(name, 0) or 0) for name in NUTRIENTS]
+        scale = [weights[name] for name in NUTRIENTS]
+
+        if not self.index.loaded:
+            self.index.build(connection)
+        self.index.refresh(connection)
+        allowed = self._tagged_recipes(connection, tag_ids)
+        by_meal_type = self._recipes_by_meal_type(connection, {slot[1] for slot in slots if slot[1] is not None})
+
+        plan_days, used, complete = [], set(), True
+        for day in range(days):
+            # Each remaining day gets an equal share of what is left of the budget
+            remaining = time_budget - (time.perf_counter() - started)
+            deadline = time.perf_counter() + max(remaining, 0) / (days - day)
+            options = [self._slot_options(connection, slot, target, weights, allowed, by_meal_type, used,
+                                          serving_options)
+                       for slot in slots]
+            self._attach_proteins(connection, options)
+            choice, score, finished = self._solve(options, target, scale, deadline, tolerance)
+            complete = complete and finished
+            if choice is None:
+                logging.warning(f"No meal plan found for day {day + 1}")
+                break
+
+            entries, totals = [], [0.0] * len(NUTRIENTS)
+            for slot, (recipe_id, servings, vector, _) in zip(slots, choice):
+                entries.append({
+                    'slot': slot[0],
+                    'recipe_id': recipe_id,
+                    'servings': servings,
+                    'nutrition': dict(zip(NUTRIENTS, vector)),
+                })
+                totals = [total + value for total, value in zip(totals, vector)]
+                if not repeat_recipes:
+                    used.add(recipe_id)
+            plan_days.append({'meals': entries, 'totals': dict(zip(NUTRIENTS, totals)), 'score': score})
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        logging.info(f"Meal plan for {days} day(s) found in {elapsed_ms:.0f} ms, complete search: {complete}")
+        return {'days': plan_days, 'complete': complete, 'elapsed_ms': elapsed_ms}
+
+    def _slot_options(self, connection, slot, target, weights, allowed, by_meal_type, used, serving_options):
+        # (recipe_id, servings, nutrient vector, protein id) choices for one slot, closest first
+        _, meal_type_id, share = slot
+        candidates = allowed
+        if meal_type_id is not None:
+            matches = by_meal_type.get(meal_type_id, set())
+            candidates = matches if candidates is None else candidates & matches
+        if candidates is not None and used:
+            candidates = candidates - used
+
+        scale = [weights[name] for name in NUTRIENTS]
+        slot_target = [value * share for value in target]
+        options = {}
+        for servings in serving_options:
+            wanted = dict(zip(NUTRIENTS, (value / servings for value in slot_target)))
+            if candidates is None:
+                accept = (lambda recipe_id: recipe_id not in used) if used else None
+                nearest = self.index.nearest(connection, wanted, CANDIDATES_PER_SLOT, weights, accept)
+            elif len(candidates) <= FILTER_SCAN_RATIO * self.index.size():
+                nearest = self.index.nearest_among(candidates, wanted, CANDIDATES_PER_SLOT, weights)
+            else:
+                nearest = self.index.nearest(connection, wanted, CANDIDATES_PER_SLOT, weights,
+                                             candidates.__contains__)
+            for recipe_id, _ in nearest:
+                per_serving = self.index.vector(recipe_id)
+                vector = tuple(per_serving[name] * servings for name in NUTRIENTS)
+                options[(recipe_id, servings)] = vector
+
+        ranked = sorted(options.items(), key=lambda item: (_deviation(item[1], slot_target, scale), item[0]))
+        return [[recipe_id, servings, vector, None] for (recipe_id, servings), vector in ranked]
+
+    def _solve(self, options, target, scale, deadline, tolerance):
+        # Depth-first branch and bound over the slots, returns (best choice, score, search finished)
+        if any(not slot_options for slot_options in options):
+            return None, None, True
+
+        # Lowest and highest amount of each nutrient the remaining slots can still add
+        count = len(options)
+        suffix_low = [[0.0] * len(NUTRIENTS) for _ in range(count + 1)]
+        suffix_high = [[0.0] * len(NUTRIENTS) for _ in range(count + 1)]
+        for depth in range(count - 1, -1, -1):
+            for axis in range(len(NUTRIENTS)):
+                values = [option[2][axis] for option in options[depth]]
+                suffix_low[depth][axis] = suffix_low[depth + 1][axis] + min(values)
+                suffix_high[depth][axis] = suffix_high[depth + 1][axis] + max(values)
+
+        best = {'score': float('inf'), 'choice': None}
+        chosen = []
+        visited = [0]
+
+        def lower_bound(totals, depth):
+            bound = 0.0
+            for axis, weight in enumerate(scale):
+                low = totals[axis] + suffix_low[depth][axis]
+                high = totals[axis] + suffix_high[depth][axis]
+                if target[axis] < low:
+                    bound += weight * (low - target[axis]) ** 2
+                elif target[axis] > high:
+                    bound += weight * (target[axis] - high) ** 2
+            return bound
+
+        def search(depth, totals, recipes, proteins):
+            visited[0] += 1
+            if visited[0] % 1024 == 0 and time.perf_counter() > deadline:
+                raise _Deadline()
+            if depth == count:
+                score = _deviation(totals, target, scale)
+                if score < best['score']:
+                    best['score'], best['choice'] = score, list(chosen)
+                    if score <= tolerance:
+                        raise _GoodEnough()
+                return
+            if lower_bound(totals, depth) >= best['score']:
+                return
+            for option in options[depth]:
+                recipe_id, _, vector, protein_id = option
+                if recipe_id in recipes or (protein_id is not None and protein_id in proteins):
+                    continue
+                chosen.append(option)
+                recipes.add(recipe_id)
+                if protein_id is not None:
+                    proteins.add(protein_id)
+                search(depth + 1, [total + value for total, value in zip(totals, vector)], recipes, proteins)
+                chosen.pop()
+                recipes.discard(recipe_id)
+                if protein_id is not None:
+                    proteins.discard(protein_id)
+
+        try:
+            search(0, [0.0] * len(NUTRIENTS), set(), set())
+            finished = True
+        except _GoodEnough:
+            finished = True
+        except _Deadline:
+            finished = False
+        return best['choice'], best['score'], finished
+
+    @staticmethod
+    def _tagged_recipes(connection, tag_ids):
+        # Recipes carrying every tag in tag_ids, None when no tags are required
+        tag_ids = list(tag_ids or ())
+        if not tag_ids:
+            return None
+        cursor = connection.cursor()
+        cursor.execute(f"""
+            SELECT RecipeId
+            FROM RecipeTags
+            WHERE TagId IN ({', '.join('?' * len(tag_ids))})
+            GROUP BY RecipeId
+            HAVING COUNT(DISTINCT TagId) = ?
+        """, tuple(tag_ids) + (len(tag_ids),))
+        return {row[0] for row in cursor.fetchall()}
+
+    @staticmethod
+    def _recipes_by_meal_type(connection, meal_type_ids):
+        by_meal_type = {}
+        cursor = connection.cursor()
+        for meal_type_id in meal_type_ids:
+            cursor.execute("SELECT RecId FROM Recipes WHERE MealTypeId = ?", (meal_type_id,))
+            by_meal_type[meal_type_id] = {row[0] for row in cursor.fetchall()}
+        return by_meal_type
+
+    @staticmethod
+    def _attach_proteins(connection, options):
+        # Fill in the protein type of every candidate with one query
+        recipe_ids = list({option[0] for slot_options in options for option in slot_options})
+        if not recipe_ids:
+            return
+        proteins = {}
+        cursor = connection.cursor()
+        for start in range(0, len(recipe_ids), 1000):
+            chunk = recipe_ids[start:start + 1000]
+            cursor.execute(f"SELECT RecId, ProteinId FROM Recipes WHERE RecId IN ({', '.join('?' * len(chunk))})",
+                           tuple(chunk))
+            proteins.update((row[0], row[1]) for row in cursor.fetchall())
+        for slot_options in options:
+            for option in slot_options:
+                option[3] = proteins.get(option[0])
+
+
+def _deviation(values, target, scale):
+    return sum(weight * (value - wanted) ** 2 for weight, value, wanted in zip(scale, values, target))
+
+
+# Plans from the per-serving macro index
+meal_planner = MealPlanner(serving_macro_index)
@@ -0,0 +1,218 @@
+# nutrition_engine.py
+import logging
+import threading
+import time
+
+# NumPy and SciPy add a few hundred ms to startup, they are imported on first use by _import_numpy.
+# Only the bulk recompute needs NumPy, RecipeOperations falls back to SQL without it
+np = None
+sparse = None
+
+# Column order of every totals array, the same order RecipeOperations reports nutrition in
+NUTRIENTS = ('calories', 'carbs', 'fat', 'protein')
+
+# Energy per gram, for the share of calories each macro contributes
+MACRO_ENERGY = {'carbs': 4.0, 'fat': 9.0, 'protein': 4.0}
+
+ENGINE_FOODS_QUERY = """
+    SELECT F.FoodId, COALESCE(SI.NoServe, 0),
+           COALESCE(N.Calories, 0), COALESCE(N.Carbs, 0), COALESCE(N.Fat, 0), COALESCE(N.Protein, 0)
+    FROM Foods F
+    JOIN ServingInfo SI ON F.ServId = SI.ServId
+    JOIN Nutrition N ON F.FoodId = N.FoodId
+"""
+
+ENGINE_RECIPES_QUERY = """
+    SELECT RecId, COALESCE(RecServings, 1),
+           COALESCE(RecCals, 0), COALESCE(RecCarbs, 0), COALESCE(RecFat, 0), COALESCE(RecProtein, 0)
+    FROM Recipes
+"""
+
+# Rows without their own NoServe count as one base serving, like RECIPE_DERIVED_TOTALS_QUERY
+ENGINE_LINKS_QUERY = """
+    SELECT RF.RecId, RF.FoodId, COALESCE(RF.NoServe, SI.NoServe, 0)
+    FROM RecipeFoods RF
+    JOIN Foods F ON RF.FoodId = F.FoodId
+    JOIN ServingInfo SI ON F.ServId = SI.ServId
+"""
+
+WRITE_TOTALS_SQL = "UPDATE Recipes SET RecCals = ?, RecCarbs = ?, RecFat = ?, RecProtein = ? WHERE RecId = ?"
+
+
+def _import_numpy():
+    global np, sparse
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            return False
+        try:
+            from scipy import sparse as scipy_sparse
+        except ImportError:
+            scipy_sparse = None
+        np, sparse = numpy, scipy_sparse
+    return True
+
+
+def _fetch_array(cursor, query, columns, batch_size):
+    cursor.execute(query)
+    chunks = []
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        chunks.append(np.array([tuple(row) for row in rows], dtype=np.float64))
+    if not chunks:
+        return np.empty((0, columns), dtype=np.float64)
+    return np.concatenate(chunks)
+
+
+def _positions(sorted_ids, ids):
+    # Index of each id in sorted_ids, and which ids were found at all
+    positions = np.searchsorted(sorted_ids, ids)
+    positions[positions >= len(sorted_ids)] = 0
+    found = sorted_ids[positions] == ids if len(sorted_ids) else np.zeros(len(ids), dtype=bool)
+    return positions, found
+
+
+class NutritionEngine:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.recipe_ids = None
+        self.servings = None
+        # Totals currently stored in Recipes, to find the rows a recompute actually changes
+        self.stored = None
+        self.food_ids = None
+        # food x nutrient, per base serving of each food
+        self.food_nutrients = None
+        # recipe x food, base servings of each food in each recipe
+        self.quantities = None
+        self.totals = None
+        self.loaded = False
+
+    @staticmethod
+    def available():
+        return _import_numpy()
+
+    def load(self, connection, batch_size=50000):
+        if not _import_numpy():
+            raise RuntimeError("NumPy is required for the nutrition engine")
+        started = time.perf_counter()
+        cursor = connection.cursor()
+        foods = _fetch_array(cursor, ENGINE_FOODS_QUERY, 6, batch_size)
+        recipes = _fetch_array(cursor, ENGINE_RECIPES_QUERY, 6, batch_size)
+        links = _fetch_array(cursor, ENGINE_LINKS_QUERY, 3, batch_size)
+
+        food_order = np.argsort(foods[:, 0], kind='stable')
+        foods = foods[food_order]
+        recipe_order = np.argsort(recipes[:, 0], kind='stable')
+        recipes = recipes[recipe_order]
+
+        food_ids = foods[:, 0].astype(np.int64)
+        base_serving = foods[:, 1]
+        recipe_ids = recipes[:, 0].astype(np.int64)
+
+        recipe_positions, recipe_found = _positions(recipe_ids, links[:, 0].astype(np.int64))
+        food_positions, food_found = _positions(food_ids, links[:, 1].astype(np.int64))
+        keep = recipe_found & food_found
+        recipe_positions, food_positions = recipe_positions[keep], food_positions[keep]
+
+        # Recipe amount in base servings, foods without a base serving contribute nothing
+        base = base_serving[food_positions]
+        scale = np.divide(links[keep, 2], base, out=np.zeros(len(base)), where=base != 0)
+
+        shape = (len(recipe_ids), len(food_ids))
+        if sparse is not None:
+            quantities = sparse.csr_matrix((scale, (recipe_positions, food_positions)), shape=shape)
+        else:
+            # (rows, columns, values) triplets, multiplied below with bincount
+            quantities = (recipe_positions, food_positions, scale, shape)
+
+        with self._lock:
+            self.recipe_ids = recipe_ids
+            self.servings = np.ascontiguousarray(recipes[:, 1])
+            self.stored = np.ascontiguousarray(recipes[:, 2:6])
+            self.food_ids = food_ids
+            self.food_nutrients = np.ascontiguousarray(foods[:, 2:6])
+            self.quantities = quantities
+            self.totals = None
+            self.loaded = True
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        logging.info(f"Nutrition engine loaded {shape[0]} recipes, {shape[1]} foods and "
+                     f"{int(keep.sum())} ingredients in {elapsed_ms:.0f} ms")
+
+    def compute(self):
+        # recipe x nutrient totals, one sparse-by-dense product over the whole catalog
+        with self._lock:
+            if not self.loaded:
+                raise RuntimeError("Nutrition engine is not loaded")
+            if sparse is not None:
+                totals = np.asarray(self.quantities @ self.food_nutrients)
+            else:
+                rows, columns, values, shape = self.quantities
+                contributions = self.food_nutrients[columns] * values[:, None]
+                totals = np.column_stack([np.bincount(rows, weights=contributions[:, column], minlength=shape[0])
+                                          for column in range(len(NUTRIENTS))])
+            self.totals = totals
+            return totals
+
+    def per_serving(self):
+        totals = self._totals()
+        servings = np.where(self.servings > 0, self.servings, 1.0)
+        return totals / servings[:, None]
+
+    def macro_ratios(self):
+        # Share of macro calories from carbs, fat and protein, in that order
+        totals = self._totals()
+        energy = totals[:, 1:4] * np.array([MACRO_ENERGY[name] for name in NUTRIENTS[1:]])
+        energy_total = energy.sum(axis=1, keepdims=True)
+        return np.divide(energy, energy_total, out=np.zeros_like(energy), where=energy_total > 0)
+
+    def totals_for(self, recipe_id):
+        totals = self._totals()
+        position, found = _positions(self.recipe_ids, np.array([recipe_id], dtype=np.int64))
+        if not found[0]:
+            return None
+        return dict(zip(NUTRIENTS, totals[position[0]].tolist()))
+
+    def changed_rows(self, tolerance=0.01):
+        # (RecCals, RecCarbs, RecFat, RecProtein, RecId) rows whose stored totals differ from the computed ones
+        totals = self._totals()
+        changed = np.abs(totals - self.stored).max(axis=1) > tolerance if len(totals) else np.zeros(0, dtype=bool)
+        rows = np.column_stack([totals[changed], self.recipe_ids[changed]])
+        return [tuple(row[:4]) + (int(row[4]),) for row in rows.tolist()]
+
+    def write_totals(self, connection, tolerance=0.01, chunk_size=10000):
+        # Writes only the recipes whose totals changed, the caller commits
+        rows = self.changed_rows(tolerance)
+        cursor = connection.cursor()
+        cursor.fast_executemany = True
+        for start in range(0, len(rows), chunk_size):
+            cursor.executemany(WRITE_TOTALS_SQL, rows[start:start + chunk_size])
+        with self._lock:
+            if rows:
+                changed = np.array([row[4] for row in rows], dtype=np.int64)
+                positions, _ = _positions(self.recipe_ids, changed)
+                self.stored[positions] = self.totals[positions]
+        return [row[4] for row in rows]
+
+    def stats(self):
+        with self._lock:
+            if not self.loaded:
+                return {'loaded': False}
+            ingredients = self.quantities.nnz if sparse is not None else len(self.quantities[2])
+            return {
+                'loaded': True,
+                'recipes': len(self.recipe_ids),
+                'foods': len(self.food_ids),
+                'ingredients': ingredients,
+                'sparse': sparse is not None,
+            }
+
+    def _totals(self):
+        with self._lock:
+            return self.totals if self.totals is not None else self.compute()
+
+
+# Used by RecipeOperations.recompute_all_nutrition
+nutrition_engine = NutritionEngine()
@@ -1,5 +1,7 @@
 # proteins_operations.py
 import logging
+from recipe_cache import recipe_cache
+from reference_cache import reference_cache
 
 class ProteinOperations:
     @staticmethod
@@ -18,8 +20,9 @@ class ProteinOperations:
             # Retrieve the generated ProteinId
             cursor.execute("SELECT @@IDENTITY AS ProteinId")
             protein_id = cursor.fetchone()[0]
+            reference_cache.upsert('proteins', protein_id, protein_name)
 
-            print("Protein added successfully.")
+            logging.info("Protein added successfully.")
             return protein_id
         except Exception as error:
             logging.error(f"Error while adding protein: {error}")
@@ -38,8 +41,11 @@ class ProteinOperations:
                 """,
                 (new_protein_name, protein_id))
             connection.commit()
+            reference_cache.upsert('proteins', protein_id, new_protein_name)
+            # Protein names are part of every cached recipe that uses them
+            recipe_cache.clear()
 
-            print("Protein updated successfully.")
+            logging.info("Protein updated successfully.")
         except Exception as error:
             logging.error(f"Error while updating protein: {error}")
 
@@ -55,7 +61,25 @@ class ProteinOperations:
                 """,
                 (protein_id,))
             connection.commit()
+            reference_cache.remove('proteins', protein_id)
+            recipe_cache.clear()
 
-            print("Protein deleted successfully.")
+            logging.info("Protein deleted successfully.")
         except Exception as error:
-            logging.error(f"Error while deleting protein: {error}")
\ No newline at end of file
+            logging.error(f"Error while deleting protein: {error}")
+
+    @staticmethod
+    def get_all_proteins(connection):
+        try:
+            return reference_cache.rows(connection, 'proteins')
+        except Exception as error:
+            logging.error(f"Error fetching protein names: {error}")
+            return []
+
+    @staticmethod
+    def get_protein_name(connection, protein_id):
+        try:
+            return reference_cache.name_of(connection, 'proteins', protein_id) or ""
+        except Exception as error:
+            logging.error(f"Error fetching protein name: {error}")
+            return ""
\ No newline at end of file
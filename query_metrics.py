@@ -0,0 +1,310 @@
+# query_metrics.py
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import lru_cache
+
+# Upper bounds of the latency histogram buckets in milliseconds, slower statements go in a last bucket
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Queries run outside any action, e.g. from the pool's health check
+NO_ACTION = "(none)"
+
+# Frames of these modules are the UI entry points queries are attributed to
+UI_MODULES = ("ui_operations",)
+# Frames of these modules are skipped when naming a query, it is named after their caller
+WRAPPER_MODULES = (__name__, "unit_of_work")
+
+_WHITESPACE = re.compile(r"\s+")
+# IN (?, ?, ...) lists and multi-row VALUES (?, ?), (?, ?), ... whose length follows the data,
+# collapsed so one statement keeps one key whatever the number of parameters
+_IN_LIST = re.compile(r"\bIN \(\?(?:, ?\?)*\)", re.IGNORECASE)
+_VALUE_ROWS = re.compile(r"(\(\?(?:, ?\?)*\))(?:, ?\(\?(?:, ?\?)*\))+")
+
+
+@lru_cache(maxsize=1024)
+def _normalize_sql(sql):
+    sql = _WHITESPACE.sub(" ", sql).strip().replace("( ", "(").replace(" )", ")")
+    sql = _IN_LIST.sub("IN (?...)", sql)
+    return _VALUE_ROWS.sub(r"\1, ...", sql)
+
+
+def _code_name(code):
+    # co_qualname (Class.method) only exists from Python 3.11
+    return getattr(code, 'co_qualname', code.co_name)
+
+
+def _bucket_label(index):
+    if index < len(LATENCY_BUCKETS_MS):
+        return f"<={LATENCY_BUCKETS_MS[index]:g}"
+    return f">{LATENCY_BUCKETS_MS[-1]:g}"
+
+
+class QueryStats:
+    # Totals and a latency histogram for one named query or one UI action
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.round_trips = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.fetch_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add(self, elapsed_ms, round_trips, failed):
+        self.calls += 1
+        self.errors += 1 if failed else 0
+        self.round_trips += round_trips
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+
+    def percentile(self, fraction):
+        # Upper bound of the bucket the percentile falls in, the maximum for the last bucket
+        wanted = fraction * self.calls
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= wanted:
+                return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return 0.0
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'round_trips': self.round_trips,
+            'rows': self.rows,
+            'total_ms': round(self.total_ms, 3),
+            'mean_ms': round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            'max_ms': round(self.max_ms, 3),
+            'fetch_ms': round(self.fetch_ms, 3),
+            'p50_ms': round(self.percentile(0.5), 3),
+            'p95_ms': round(self.percentile(0.95), 3),
+            'p99_ms': round(self.percentile(0.99), 3),
+            'histogram_ms': {_bucket_label(index): count for index, count in enumerate(self.buckets) if count},
+        }
+
+
+class InstrumentedCursor:
+    # Times execute/executemany and counts the rows fetched, everything else goes to the wrapped cursor
+    def __init__(self, cursor, metrics):
+        object.__setattr__(self, 'wrapped', cursor)
+        object.__setattr__(self, 'metrics', metrics)
+        # (query stats, action stats) of the last statement, fetched rows are added to them
+        object.__setattr__(self, '_targets', ())
+
+    def execute(self, sql, *params):
+        self._run(sql, 1, self.wrapped.execute, sql, *params)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        # pyodbc sends one batch with fast_executemany, one statement per parameter set otherwise
+        if getattr(self.wrapped, 'fast_executemany', False):
+            round_trips = 1
+        elif isinstance(seq_of_params, (list, tuple)):
+            round_trips = len(seq_of_params)
+        else:
+            # Counted as the driver consumes them, streaming callers are not turned into lists
+            counted = [0]
+
+            def counting(params):
+                for item in params:
+                    counted[0] += 1
+                    yield item
+            seq_of_params = counting(seq_of_params)
+            round_trips = lambda: counted[0]
+        self._run(sql, round_trips, self.wrapped.executemany, sql, seq_of_params)
+        return self
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self.wrapped.fetchone()
+        self.metrics.add_rows(self._targets, 0 if row is None else 1, started)
+        return row
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self.wrapped.fetchall()
+        self.metrics.add_rows(self._targets, len(rows), started)
+        return rows
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = self.wrapped.fetchmany(size) if size is not None else self.wrapped.fetchmany()
+        self.metrics.add_rows(self._targets, len(rows), started)
+        return rows
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self.wrapped, name)
+
+    def __setattr__(self, name, value):
+        # e.g. fast_executemany
+        setattr(self.wrapped, name, value)
+
+    def _run(self, sql, round_trips, function, *args):
+        targets = self.metrics.targets(sql)
+        object.__setattr__(self, '_targets', targets)
+        started = time.perf_counter()
+        failed = True
+        try:
+            function(*args)
+            failed = False
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.metrics.add_statement(targets, elapsed_ms, round_trips() if callable(round_trips) else round_trips,
+                                       failed)
+
+
+class InstrumentedConnection:
+    # Hands out instrumented cursors and times commits and rollbacks as their own queries
+    def __init__(self, connection, metrics):
+        object.__setattr__(self, 'wrapped', connection)
+        object.__setattr__(self, 'metrics', metrics)
+
+    def cursor(self):
+        return InstrumentedCursor(self.wrapped.cursor(), self.metrics)
+
+    def commit(self):
+        self.metrics.time_call("COMMIT", self.wrapped.commit)
+
+    def rollback(self):
+        self.metrics.time_call("ROLLBACK", self.wrapped.rollback)
+
+    def __getattr__(self, name):
+        return getattr(self.wrapped, name)
+
+    def __setattr__(self, name, value):
+        # e.g. autocommit
+        setattr(self.wrapped, name, value)
+
+
+class QueryMetrics:
+    # Latency histograms, row counts and round trips per named query and per UI action.
+    # A query is named after the function that executed it (module.Class.method) plus its
+    # SQL; its action is the one set with action(), or else the outermost MainWindow method
+    # on the stack, i.e. the slot the user triggered.
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._queries = {}
+        self._actions = {}
+        self.started_at = datetime.now(timezone.utc)
+
+    def instrument(self, connect):
+        # Wraps a connect() function so every connection it opens is instrumented
+        if not self.enabled:
+            return connect
+        return lambda: InstrumentedConnection(connect(), self)
+
+    @contextmanager
+    def action(self, name):
+        # Attributes the queries run on this thread inside the block to name, e.g. on worker threads
+        previous = getattr(self._local, 'action', None)
+        self._local.action = name
+        try:
+            yield
+        finally:
+            self._local.action = previous
+
+    def current_action(self, default=NO_ACTION):
+        action = getattr(self._local, 'action', None)
+        if action is not None:
+            return action
+        outermost = None
+        frame = sys._getframe(1)
+        while frame is not None:
+            if frame.f_globals.get('__name__') in UI_MODULES:
+                outermost = frame
+            frame = frame.f_back
+        return _code_name(outermost.f_code) if outermost is not None else default
+
+    def targets(self, sql):
+        # (query stats, action stats) for a statement executed by the caller of the cursor
+        frame = sys._getframe(1)
+        while frame is not None and frame.f_globals.get('__name__') in WRAPPER_MODULES:
+            frame = frame.f_back
+        name = f"{frame.f_globals.get('__name__')}.{_code_name(frame.f_code)}" if frame is not None else "?"
+        key = (name, _normalize_sql(sql))
+        action = self.current_action()
+        with self._lock:
+            query = self._queries.get(key)
+            if query is None:
+                query = self._queries[key] = QueryStats()
+            action_stats = self._actions.get(action)
+            if action_stats is None:
+                action_stats = self._actions[action] = QueryStats()
+        return query, action_stats
+
+    def add_statement(self, targets, elapsed_ms, round_trips, failed):
+        with self._lock:
+            for stats in targets:
+                stats.add(elapsed_ms, round_trips, failed)
+
+    def add_rows(self, targets, count, started):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            for stats in targets:
+                stats.rows += count
+                stats.fetch_ms += elapsed_ms
+
+    def time_call(self, sql, function):
+        targets = self.targets(sql)
+        started = time.perf_counter()
+        failed = True
+        try:
+            function()
+            failed = False
+        finally:
+            self.add_statement(targets, (time.perf_counter() - started) * 1000, 1, failed)
+
+    def reset(self):
+        with self._lock:
+            self._queries.clear()
+            self._actions.clear()
+            self.started_at = datetime.now(timezone.utc)
+
+    def snapshot(self):
+        # Slowest first by total time
+        with self._lock:
+            queries = [dict(name=name, sql=sql, **stats.to_dict()) for (name, sql), stats in self._queries.items()]
+            actions = [dict(action=action, **stats.to_dict()) for action, stats in self._actions.items()]
+            started_at = self.started_at
+        queries.sort(key=lambda query: query['total_ms'], reverse=True)
+        actions.sort(key=lambda action: action['total_ms'], reverse=True)
+        return {
+            'started_at': started_at.isoformat(timespec='seconds'),
+            'exported_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'queries': queries,
+            'actions': actions,
+        }
+
+    def export_json(self, path=None):
+        # Returns the snapshot as JSON and writes it to path when given
+        text = json.dumps(self.snapshot(), indent=2)
+        if path:
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write(text)
+            logging.info(f"Query metrics exported to {path}")
+        return text
+
+
+# RECIPEJOY_QUERY_METRICS=0 leaves connections unwrapped
+query_metrics = QueryMetrics(enabled=os.environ.get('RECIPEJOY_QUERY_METRICS', '1') != '0')
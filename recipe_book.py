@@ -0,0 +1,417 @@
+# recipe_book.py
+# Moves recipes between databases as JSONL, one recipe per line, from the repository root:
+#     python recipe_book.py export recipes.jsonl [--page-size 500]
+#     python recipe_book.py import recipes.jsonl [--batch-size 500] [--allow-duplicates]
+# A line holds the recipe with its protein type, meal type, foods (with their base serving and
+# nutrition, so missing foods can be created on import), steps and tags, all by name.
+import argparse
+import itertools
+import json
+import logging
+import sys
+import time
+
+from food_import import FoodImporter
+from food_index import food_index
+from recipes_operations import RecipeOperations
+from reference_cache import reference_cache
+from unit_of_work import UnitOfWork
+
+# Recipes per export page and per import batch, memory stays bounded by one of them whatever the
+# catalog size
+PAGE_SIZE = 500
+# Rows per fetchmany while reading a page
+FETCH_SIZE = 1000
+# Names per IN (...) lookup, well under SQL Server's 2100 parameter limit
+LOOKUP_CHUNK_SIZE = 1000
+
+# Reference rows an import creates when this database lacks them, by reference_cache table
+REFERENCE_INSERTS = {
+    'tags': "INSERT INTO CustomTags (TagName) OUTPUT INSERTED.TagId VALUES (?)",
+    'proteins': "INSERT INTO Proteins (ProteinName) OUTPUT INSERTED.ProteinId VALUES (?)",
+    'meal_types': "INSERT INTO MealType (MealTypeName) OUTPUT INSERTED.MealTypeId VALUES (?)",
+}
+
+# Keyset pages in RecId order
+RECIPE_PAGE_QUERY = """
+    SELECT R.RecId, R.RecName, R.RecServings, R.RecInstructions, R.RecNotes,
+           R.RecCals, R.RecProtein, R.RecCarbs, R.RecFat,
+           P.ProteinName, M.MealTypeName
+    FROM Recipes R
+    LEFT JOIN Proteins P ON R.ProteinId = P.ProteinId
+    LEFT JOIN MealType M ON R.MealTypeId = M.MealTypeId
+    WHERE R.RecId > ?
+    ORDER BY R.RecId
+    OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY
+"""
+
+# Children of the recipes of one page, by RecId range
+PAGE_FOODS_QUERY = """
+    SELECT RF.RecId, F.FoodName, COALESCE(RF.NoServe, SI.NoServe), COALESCE(RF.ServSize, SI.ServSize),
+           SI.NoServe, SI.ServSize, N.Calories, N.Protein, N.Carbs, N.Fat
+    FROM RecipeFoods RF
+    JOIN Foods F ON RF.FoodId = F.FoodId
+    JOIN ServingInfo SI ON F.ServId = SI.ServId
+    LEFT JOIN Nutrition N ON F.FoodId = N.FoodId
+    WHERE RF.RecId BETWEEN ? AND ?
+    ORDER BY RF.RecId, RF.RecFoodId
+"""
+
+PAGE_STEPS_QUERY = """
+    SELECT RecId, StepDescription
+    FROM RecipeSteps
+    WHERE RecId BETWEEN ? AND ?
+    ORDER BY RecId, StepNumber
+"""
+
+PAGE_TAGS_QUERY = """
+    SELECT RT.RecipeId, CT.TagName
+    FROM RecipeTags RT
+    JOIN CustomTags CT ON RT.TagId = CT.TagId
+    WHERE RT.RecipeId BETWEEN ? AND ?
+    ORDER BY RT.RecipeId, CT.TagName
+"""
+
+
+class RecipeBookError(Exception):
+    pass
+
+
+def _name_key(name):
+    # Names match case-insensitively, as they do under SQL Server's default collation
+    return str(name).strip().casefold()
+
+
+def _fetch_grouped(cursor, query, params, fetch_size):
+    # {RecId: [rest of row, ...]} for one page, read fetch_size rows at a time
+    cursor.execute(query, params)
+    grouped = {}
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            break
+        for row in rows:
+            grouped.setdefault(row[0], []).append(tuple(row[1:]))
+    return grouped
+
+
+def read_recipes(file):
+    # (line, recipe dict or None when the line is not a JSON object)
+    for line, text in enumerate(file, start=1):
+        if not text.strip():
+            continue
+        try:
+            item = json.loads(text)
+        except ValueError:
+            item = None
+        yield line, item if isinstance(item, dict) else None
+
+
+class RecipeExporter:
+    # Streams every recipe to JSONL a page at a time. The page's foods, steps and tags come from
+    # one query each over the page's RecId range, read with fetchmany; a single connection has
+    # only one active result set, so they cannot be read alongside the recipes themselves.
+
+    def __init__(self, connection, page_size=PAGE_SIZE, fetch_size=FETCH_SIZE):
+        self.connection = connection
+        self.page_size = page_size
+        self.fetch_size = fetch_size
+
+    def export_file(self, path):
+        with open(path, 'w', encoding='utf-8', newline='\n') as file:
+            return self.export(file)
+
+    def export(self, file):
+        started = time.perf_counter()
+        exported = 0
+        for recipe in self.recipes():
+            file.write(json.dumps(recipe, ensure_ascii=False, separators=(',', ':')))
+            file.write('\n')
+            exported += 1
+        elapsed = time.perf_counter() - started
+        stats = {
+            'exported': exported,
+            'seconds': round(elapsed, 3),
+            'recipes_per_second': round(exported / elapsed) if elapsed else exported,
+        }
+        logging.info(f"Recipe export finished: {stats}")
+        return stats
+
+    def recipes(self):
+        # Recipe dicts in RecId order
+        cursor = self.connection.cursor()
+        last_id = 0
+        while True:
+            cursor.execute(RECIPE_PAGE_QUERY, (last_id, self.page_size))
+            page = cursor.fetchall()
+            if not page:
+                break
+            bounds = (page[0][0], page[-1][0])
+            foods = _fetch_grouped(cursor, PAGE_FOODS_QUERY, bounds, self.fetch_size)
+            steps = _fetch_grouped(cursor, PAGE_STEPS_QUERY, bounds, self.fetch_size)
+            tags = _fetch_grouped(cursor, PAGE_TAGS_QUERY, bounds, self.fetch_size)
+            for row in page:
+                yield self._recipe(row, foods.get(row[0], ()), steps.get(row[0], ()), tags.get(row[0], ()))
+            last_id = bounds[1]
+            logging.debug("Exported recipes up to id %s", last_id)
+
+    @staticmethod
+    def _recipe(row, foods, steps, tags):
+        return {
+            'name': row[1],
+            'servings': row[2],
+            'instructions': row[3],
+            'notes': row[4],
+            'protein_type': row[9],
+            'meal_type': row[10],
+            'nutrition': {'calories': row[5], 'protein': row[6], 'carbs': row[7], 'fat': row[8]},
+            'foods': [{
+                'name': name,
+                'amount': amount,
+                'unit': unit,
+                'serving': {'amount': base_amount, 'unit': base_unit},
+                'nutrition': {'calories': calories, 'protein': protein, 'carbs': carbs, 'fat': fat},
+            } for name, amount, unit, base_amount, base_unit, calories, protein, carbs, fat in foods],
+            'steps': [description for (description,) in steps],
+            'tags': [name for (name,) in tags],
+        }
+
+
+class RecipeImporter:
+    # Reads JSONL written by RecipeExporter and adds the recipes a batch at a time through
+    # RecipeOperations.add_recipes, one UnitOfWork per batch. Tags, protein types and meal
+    # types resolve through in-memory name lookups built once from the reference cache, foods
+    # through one IN (...) query per batch; the ones missing from this database are created in
+    # the batch's transaction, so a failed batch leaves none behind. Recipes whose name is
+    # already taken are skipped unless skip_existing is False.
+
+    def __init__(self, connection, batch_size=PAGE_SIZE, skip_existing=True):
+        self.connection = connection
+        self.batch_size = batch_size
+        self.skip_existing = skip_existing
+        self._lookups = {}
+        # table -> {name key: (id, name)} created by the batch being written, not committed yet
+        self._created = {}
+        self.stats = {}
+        self._food_importer = FoodImporter(connection)
+
+    def import_file(self, path):
+        with open(path, encoding='utf-8-sig') as file:
+            return self.import_recipes(read_recipes(file))
+
+    def import_recipes(self, records):
+        # records are (line, recipe dict), returns the import statistics
+        started = time.perf_counter()
+        self.stats = {'imported': 0, 'skipped': 0, 'existing': 0, 'foods_created': 0, 'tags_created': 0,
+                      'proteins_created': 0, 'meal_types_created': 0}
+        records = iter(records)
+        while True:
+            chunk = list(itertools.islice(records, self.batch_size))
+            if not chunk:
+                break
+            batch = []
+            for line, recipe in chunk:
+                try:
+                    batch.append(self._checked(recipe, line))
+                except RecipeBookError as error:
+                    self._skip(error)
+            if self.skip_existing:
+                batch = self._without_existing(batch)
+            if not batch:
+                continue
+            try:
+                recipe_ids = self._import_batch(batch)
+            except Exception as error:
+                raise RecipeBookError(f"could not add a batch of {len(batch)} recipe(s): {error}") from error
+            self.stats['imported'] += len(recipe_ids)
+            logging.debug("Imported %s recipe(s) so far", self.stats['imported'])
+        # Past max_delta foods the search index is cheaper rebuilt than patched
+        if food_index.loaded and self.stats['foods_created'] > food_index.max_delta:
+            food_index.build(self.connection)
+        elapsed = time.perf_counter() - started
+        self.stats['seconds'] = round(elapsed, 3)
+        self.stats['recipes_per_second'] = round(self.stats['imported'] / elapsed) if elapsed else self.stats['imported']
+        logging.info(f"Recipe import finished: {self.stats}")
+        return self.stats
+
+    def _skip(self, error):
+        self.stats['skipped'] += 1
+        if self.stats['skipped'] <= 10:
+            logging.warning(f"Skipping recipe: {error}")
+
+    @staticmethod
+    def _checked(recipe, line):
+        if recipe is None:
+            raise RecipeBookError(f"line {line}: not a JSON object")
+        name = str(recipe.get('name') or "").strip()
+        if not name:
+            raise RecipeBookError(f"line {line}: missing recipe name")
+        foods = recipe.get('foods') or []
+        if not isinstance(foods, list) or not all(isinstance(food, dict) and str(food.get('name') or "").strip()
+                                                  for food in foods):
+            raise RecipeBookError(f"line {line}: every food needs a name")
+        return dict(recipe, name=name, foods=foods)
+
+    def _without_existing(self, batch):
+        existing = self._existing_names('recipes', "SELECT RecName FROM Recipes WHERE RecName IN ({placeholders})",
+                                        {recipe['name'] for recipe in batch})
+        kept = []
+        for recipe in batch:
+            key = _name_key(recipe['name'])
+            if key in existing:
+                self.stats['existing'] += 1
+                continue
+            # A name repeated within the file is only imported once too
+            existing.add(key)
+            kept.append(recipe)
+        return kept
+
+    def _existing_names(self, what, query, names):
+        found = set()
+        names = list(names)
+        cursor = self.connection.cursor()
+        for start in range(0, len(names), LOOKUP_CHUNK_SIZE):
+            chunk = names[start:start + LOOKUP_CHUNK_SIZE]
+            cursor.execute(query.format(placeholders=", ".join("?" * len(chunk))), tuple(chunk))
+            found.update(_name_key(row[0]) for row in cursor.fetchall())
+        logging.debug("%s of %s %s name(s) already exist", len(found), len(names), what)
+        return found
+
+    def _import_batch(self, batch):
+        # The lookups, caches and statistics only learn of the created rows once they are committed
+        self._created = {table: {} for table in REFERENCE_INSERTS}
+        try:
+            with UnitOfWork(self.connection) as work:
+                food_ids, new_foods = self._food_ids(work, batch)
+                recipe_ids = RecipeOperations.add_recipes(work, self._resolved(work, batch, food_ids))
+                work.after_commit(self._committed, self._created, new_foods)
+        finally:
+            self._created = {}
+        return recipe_ids
+
+    def _committed(self, created, new_foods):
+        for table, items in created.items():
+            lookup = self._lookup(table)
+            for key, (item_id, name) in items.items():
+                lookup[key] = item_id
+                reference_cache.upsert(table, item_id, name)
+            self.stats[f'{table}_created'] += len(items)
+        for food_id, (name, no_serve, serv_size, calories, protein, carbs, fat) in new_foods:
+            if food_index.loaded and self.stats['foods_created'] < food_index.max_delta:
+                food_index.add((food_id, name, no_serve, serv_size, calories, carbs, fat, protein))
+            self.stats['foods_created'] += 1
+
+    def _resolved(self, work, batch, food_ids):
+        # The batch as RecipeOperations.add_recipes takes it, every name replaced by its id
+        recipes = []
+        for recipe in batch:
+            recipes.append({
+                'name': recipe['name'],
+                'servings': recipe.get('servings'),
+                'instructions': recipe.get('instructions'),
+                'notes': recipe.get('notes'),
+                'protein_id': self._reference_id(work, 'proteins', recipe.get('protein_type')),
+                'meal_type_id': self._reference_id(work, 'meal_types', recipe.get('meal_type')),
+                'foods': [(food_ids[_name_key(food['name'])], food.get('amount'), food.get('unit'))
+                          for food in recipe['foods']],
+                'steps': [str(step) for step in recipe.get('steps') or [] if step is not None],
+                'tag_ids': [self._reference_id(work, 'tags', tag) for tag in recipe.get('tags') or [] if tag],
+            })
+        return recipes
+
+    def _reference_id(self, work, table, name):
+        # Id of a tag, protein type or meal type by name, created when this database lacks it
+        if name is None or not str(name).strip():
+            return None
+        name = str(name).strip()
+        key = _name_key(name)
+        lookup = self._lookup(table)
+        if key in lookup:
+            return lookup[key]
+        created = self._created[table]
+        if key not in created:
+            work.cursor.execute(REFERENCE_INSERTS[table], (name,))
+            created[key] = (work.cursor.fetchone()[0], name)
+        return created[key][0]
+
+    def _lookup(self, table):
+        lookup = self._lookups.get(table)
+        if lookup is None:
+            lookup = {}
+            for item_id, name in reference_cache.rows(self.connection, table):
+                # The lowest id wins when a name is there twice
+                if name is not None:
+                    key = _name_key(name)
+                    if key not in lookup or item_id < lookup[key]:
+                        lookup[key] = item_id
+            self._lookups[table] = lookup
+        return lookup
+
+    def _food_ids(self, work, batch):
+        # ({name key: FoodId} for every food of the batch, [(FoodId, row) of the created foods]).
+        # The foods this database lacks are created from their exported serving and nutrition
+        foods = {}
+        for recipe in batch:
+            for food in recipe['foods']:
+                foods.setdefault(_name_key(food['name']), food)
+        food_ids = {}
+        names = [food['name'].strip() for food in foods.values()]
+        cursor = work.cursor
+        for start in range(0, len(names), LOOKUP_CHUNK_SIZE):
+            chunk = names[start:start + LOOKUP_CHUNK_SIZE]
+            cursor.execute(f"SELECT FoodName, MIN(FoodId) FROM Foods WHERE FoodName IN "
+                           f"({', '.join('?' * len(chunk))}) GROUP BY FoodName", tuple(chunk))
+            for name, food_id in cursor.fetchall():
+                key = _name_key(name)
+                if key not in food_ids or food_id < food_ids[key]:
+                    food_ids[key] = food_id
+
+        missing = [(key, food) for key, food in foods.items() if key not in food_ids]
+        new_foods = []
+        if missing:
+            rows = [self._food_row(food) for _, food in missing]
+            created = self._food_importer.insert_batch(rows)
+            for (key, _), food_id, row in zip(missing, created, rows):
+                food_ids[key] = food_id
+                new_foods.append((food_id, row))
+        return food_ids, new_foods
+
+    @staticmethod
+    def _food_row(food):
+        # In food_import.IMPORT_FIELDS order
+        serving = food.get('serving') or {}
+        nutrition = food.get('nutrition') or {}
+        return (food['name'].strip(), serving.get('amount', food.get('amount')), serving.get('unit', food.get('unit')),
+                nutrition.get('calories'), nutrition.get('protein'), nutrition.get('carbs'), nutrition.get('fat'))
+
+
+def main():
+    from logging_config import logging_setup
+    from db_backends import backend_from_env
+
+    parser = argparse.ArgumentParser(description="Export recipes to or import them from a JSONL recipe book")
+    parser.add_argument('direction', choices=('export', 'import'))
+    parser.add_argument('path')
+    parser.add_argument('--page-size', '--batch-size', dest='page_size', type=int, default=PAGE_SIZE)
+    parser.add_argument('--allow-duplicates', action='store_true', help="import recipes whose name already exists")
+    args = parser.parse_args()
+
+    logging_setup.configure()
+    # RECIPEJOY_BACKEND and friends pick the database, as for the application
+    connection = backend_from_env().connect()
+    try:
+        if args.direction == 'export':
+            stats = RecipeExporter(connection, args.page_size).export_file(args.path)
+        else:
+            stats = RecipeImporter(connection, args.page_size, not args.allow_duplicates).import_file(args.path)
+    except (RecipeBookError, OSError) as error:
+        logging.error(f"Recipe {args.direction} failed: {error}")
+        return 1
+    finally:
+        connection.close()
+    print(json.dumps(stats))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
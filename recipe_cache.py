@@ -0,0 +1,121 @@
+# recipe_cache.py
+import logging
+import sys
+import threading
+from collections import OrderedDict
+
+
+def estimate_size(value):
+    # Rough deep size of the dicts/lists/strings that RecipeOperations returns
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(key) + estimate_size(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(estimate_size(item) for item in value)
+    return size
+
+
+class RecipeCache:
+    def __init__(self, max_recipes=512, max_bytes=16 * 1024 * 1024):
+        self.max_recipes = max_recipes
+        self.max_bytes = max_bytes
+
+        self._lock = threading.RLock()
+        # recipe_id -> {part name: value}, least recently used first
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._bytes = 0
+        # Bumped on every invalidation so loads that raced a write are not stored
+        self._epoch = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_or_load(self, recipe_id, part, loader):
+        with self._lock:
+            entry = self._entries.get(recipe_id)
+            if entry is not None and part in entry:
+                self._entries.move_to_end(recipe_id)
+                self.hits += 1
+                return entry[part]
+            self.misses += 1
+            epoch = self._epoch
+
+        value = loader()
+        if value is not None:
+            self._store(recipe_id, {part: value}, epoch)
+        return value
+
+    def get_parts(self, recipe_id, parts):
+        # All requested parts if every one of them is cached, otherwise None
+        with self._lock:
+            entry = self._entries.get(recipe_id)
+            if entry is not None and all(part in entry for part in parts):
+                self._entries.move_to_end(recipe_id)
+                self.hits += 1
+                return {part: entry[part] for part in parts}
+            self.misses += 1
+            return None
+
+    def current_epoch(self):
+        with self._lock:
+            return self._epoch
+
+    def put_parts(self, recipe_id, parts, epoch=None):
+        self._store(recipe_id, parts, self.current_epoch() if epoch is None else epoch)
+
+    def invalidate(self, recipe_id):
+        with self._lock:
+            self._epoch += 1
+            if self._entries.pop(recipe_id, None) is not None:
+                self._bytes -= self._sizes.pop(recipe_id, 0)
+                self.invalidations += 1
+                logging.debug("Recipe cache invalidated recipe %s", recipe_id)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'recipes': len(self._entries),
+                'bytes': self._bytes,
+                'max_recipes': self.max_recipes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+    def _store(self, recipe_id, parts, epoch):
+        with self._lock:
+            if epoch != self._epoch:
+                # A write happened while this value was being loaded, it may already be stale
+                return
+
+            entry = self._entries.setdefault(recipe_id, {})
+            entry.update(parts)
+            self._entries.move_to_end(recipe_id)
+
+            size = estimate_size(entry)
+            self._bytes += size - self._sizes.get(recipe_id, 0)
+            self._sizes[recipe_id] = size
+
+            while self._entries and (len(self._entries) > self.max_recipes or self._bytes > self.max_bytes):
+                evicted_id, _ = self._entries.popitem(last=False)
+                self._bytes -= self._sizes.pop(evicted_id, 0)
+                self.evictions += 1
+
+
+# Shared by RecipeOperations and the write paths that touch recipe data
+recipe_cache = RecipeCache()
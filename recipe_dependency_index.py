@@ -0,0 +1,97 @@
+# recipe_dependency_index.py
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+RECIPE_DEPENDENCY_QUERY = "SELECT FoodId, RecId FROM RecipeFoods"
+
+
+class RecipeDependencyIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        # food_id -> Counter({recipe_id: RecipeFoods rows}), a recipe can list the same food twice
+        self._recipes_by_food = defaultdict(Counter)
+        # recipe_id -> Counter({food_id: RecipeFoods rows}), so a deleted recipe can be dropped
+        self._foods_by_recipe = defaultdict(Counter)
+        self.loaded = False
+
+    def build(self, connection, batch_size=10000):
+        started = time.perf_counter()
+        cursor = connection.cursor()
+        cursor.execute(RECIPE_DEPENDENCY_QUERY)
+        recipes_by_food = defaultdict(Counter)
+        foods_by_recipe = defaultdict(Counter)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for food_id, recipe_id in rows:
+                recipes_by_food[food_id][recipe_id] += 1
+                foods_by_recipe[recipe_id][food_id] += 1
+
+        with self._lock:
+            self._recipes_by_food = recipes_by_food
+            self._foods_by_recipe = foods_by_recipe
+            self.loaded = True
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        logging.info(f"Recipe dependency index built for {len(foods_by_recipe)} recipes in {elapsed_ms:.0f} ms")
+
+    def recipes_using(self, food_id):
+        # Recipe ids that list the food, or None if the index has not been built
+        with self._lock:
+            if not self.loaded:
+                return None
+            return list(self._recipes_by_food.get(food_id, ()))
+
+    def add(self, food_id, recipe_id):
+        with self._lock:
+            if self.loaded:
+                self._recipes_by_food[food_id][recipe_id] += 1
+                self._foods_by_recipe[recipe_id][food_id] += 1
+
+    def remove(self, food_id, recipe_id, count=1):
+        # count=None drops every row linking the food to the recipe
+        with self._lock:
+            if not self.loaded:
+                return
+            recipes = self._recipes_by_food.get(food_id)
+            if recipes is None:
+                return
+            remaining = 0 if count is None else recipes[recipe_id] - count
+            self._set_count(food_id, recipe_id, remaining)
+
+    def remove_recipe(self, recipe_id):
+        with self._lock:
+            if not self.loaded:
+                return
+            for food_id in list(self._foods_by_recipe.get(recipe_id, ())):
+                self._set_count(food_id, recipe_id, 0)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'foods': len(self._recipes_by_food),
+                'recipes': len(self._foods_by_recipe),
+                'links': sum(len(recipes) for recipes in self._recipes_by_food.values()),
+            }
+
+    def _set_count(self, food_id, recipe_id, count):
+        if count > 0:
+            self._recipes_by_food[food_id][recipe_id] = count
+            self._foods_by_recipe[recipe_id][food_id] = count
+            return
+        recipes = self._recipes_by_food.get(food_id)
+        if recipes is not None:
+            recipes.pop(recipe_id, None)
+            if not recipes:
+                del self._recipes_by_food[food_id]
+        foods = self._foods_by_recipe.get(recipe_id)
+        if foods is not None:
+            foods.pop(food_id, None)
+            if not foods:
+                del self._foods_by_recipe[recipe_id]
+
+
+# Kept in sync by the RecipeOperations ingredient write paths, read when a food's nutrition changes
+recipe_dependency_index = RecipeDependencyIndex()
@@ -0,0 +1,193 @@
+# recipe_search_index.py
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+# How much a term counts depending on where in the recipe it appears
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'ingredients': 2.0,
+    'steps': 1.0,
+    'instructions': 1.0,
+    'notes': 1.0,
+}
+
+STOP_WORDS = frozenset({
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'into', 'is', 'it',
+    'of', 'on', 'or', 'the', 'then', 'to', 'until', 'with',
+})
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# Largest IN (...) list sent when refreshing a batch of recipes
+REFRESH_CHUNK_SIZE = 500
+
+
+def tokenize(text):
+    return [token for token in _TOKEN.findall((text or "").casefold()) if token not in STOP_WORDS]
+
+
+class RecipeSearchIndex:
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        # term -> {recipe_id: weighted term frequency}
+        self._postings = defaultdict(dict)
+        # recipe_id -> (weighted document length, {term: weighted term frequency})
+        self._documents = {}
+        self._total_length = 0.0
+        # Recipes saved since they were last indexed
+        self._dirty = set()
+        self.loaded = False
+
+    def build(self, connection):
+        started = time.perf_counter()
+        documents = self._load_documents(connection)
+        with self._lock:
+            self._postings = defaultdict(dict)
+            self._documents = {}
+            self._total_length = 0.0
+            self._dirty.clear()
+            for recipe_id, fields in documents.items():
+                self._add(recipe_id, fields)
+            self.loaded = True
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        logging.info(f"Recipe search index built for {len(documents)} recipes in {elapsed_ms:.0f} ms")
+
+    def mark_dirty(self, recipe_id):
+        # Called by the recipe write paths, the recipe is re-read before the next search
+        with self._lock:
+            if self.loaded:
+                self._dirty.add(recipe_id)
+
+    def refresh(self, connection, recipe_ids=None):
+        with self._lock:
+            if recipe_ids is None:
+                recipe_ids = list(self._dirty)
+            if not recipe_ids:
+                return
+            self._dirty.difference_update(recipe_ids)
+
+        documents = {}
+        try:
+            for start in range(0, len(recipe_ids), REFRESH_CHUNK_SIZE):
+                documents.update(self._load_documents(connection, recipe_ids[start:start + REFRESH_CHUNK_SIZE]))
+        except Exception:
+            # Still stale, the next search tries again
+            with self._lock:
+                self._dirty.update(recipe_ids)
+            raise
+
+        with self._lock:
+            for recipe_id in recipe_ids:
+                self._remove(recipe_id)
+                if recipe_id in documents:
+                    self._add(recipe_id, documents[recipe_id])
+        logging.debug("Recipe search index refreshed %s recipe(s)", len(recipe_ids))
+
+    def search(self, connection, query, k=20):
+        # Top-k (recipe_id, score) pairs ranked by BM25
+        self.refresh(connection)
+        terms = tokenize(query)
+        with self._lock:
+            if not terms or not self._documents:
+                return []
+
+            count = len(self._documents)
+            average_length = self._total_length / count
+            scores = defaultdict(float)
+            for term, query_frequency in Counter(terms).items():
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5))
+                for recipe_id, frequency in posting.items():
+                    length = self._documents[recipe_id][0]
+                    norm = self.k1 * (1 - self.b + self.b * length / average_length)
+                    scores[recipe_id] += query_frequency * idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+            return heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'recipes': len(self._documents),
+                'terms': len(self._postings),
+                'dirty': len(self._dirty),
+            }
+
+    def _add(self, recipe_id, fields):
+        frequencies = defaultdict(float)
+        for field, texts in fields.items():
+            weight = FIELD_WEIGHTS[field]
+            for text in texts:
+                for token in tokenize(text):
+                    frequencies[token] += weight
+        length = sum(frequencies.values())
+        self._documents[recipe_id] = (length, frequencies)
+        self._total_length += length
+        for term, frequency in frequencies.items():
+            self._postings[term][recipe_id] = frequency
+
+    def _remove(self, recipe_id):
+        document = self._documents.pop(recipe_id, None)
+        if document is None:
+            return
+        length, frequencies = document
+        self._total_length -= length
+        for term in frequencies:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(recipe_id, None)
+                if not posting:
+                    del self._postings[term]
+
+    @staticmethod
+    def _load_documents(connection, recipe_ids=None):
+        # recipe_id -> {field: [texts]} for every recipe, or just the given ones
+        if recipe_ids is not None:
+            placeholders = ", ".join("?" * len(recipe_ids))
+            recipe_filter, step_filter, food_filter = (
+                f" WHERE RecId IN ({placeholders})",
+                f" WHERE RecId IN ({placeholders})",
+                f" WHERE RF.RecId IN ({placeholders})",
+            )
+            params = tuple(recipe_ids)
+        else:
+            recipe_filter = step_filter = food_filter = ""
+            params = ()
+
+        documents = {}
+        cursor = connection.cursor()
+        cursor.execute("SELECT RecId, RecName, RecInstructions, RecNotes FROM Recipes" + recipe_filter, params)
+        for recipe_id, name, instructions, notes in cursor:
+            documents[recipe_id] = {
+                'name': [name],
+                'instructions': [instructions],
+                'notes': [notes],
+                'steps': [],
+                'ingredients': [],
+            }
+
+        cursor.execute("SELECT RecId, StepDescription FROM RecipeSteps" + step_filter, params)
+        for recipe_id, description in cursor:
+            if recipe_id in documents:
+                documents[recipe_id]['steps'].append(description)
+
+        cursor.execute("""
+            SELECT RF.RecId, F.FoodName
+            FROM RecipeFoods RF
+            JOIN Foods F ON RF.FoodId = F.FoodId""" + food_filter, params)
+        for recipe_id, food_name in cursor:
+            if recipe_id in documents:
+                documents[recipe_id]['ingredients'].append(food_name)
+        return documents
+
+
+# Marked dirty by RecipeOperations write paths, searched by the find-recipe page
+recipe_search_index = RecipeSearchIndex()
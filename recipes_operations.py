@@ -1,6 +1,172 @@
 # recipes_operations.py
 import logging
-from unittest import result
+import time
+from db_backends import begin_write, dialect_of
+from macro_index import DEFAULT_MACRO_WEIGHTS, FILTER_SCAN_RATIO, macro_index, serving_macro_index
+from meal_planner import meal_planner
+from nutrition_engine import NUTRIENTS, nutrition_engine
+from recipe_cache import recipe_cache
+from recipe_dependency_index import recipe_dependency_index
+from recipe_search_index import recipe_search_index
+from unit_of_work import UnitOfWork
+
+# Recipes whose totals were never stored, they were created before the write paths kept them
+MISSING_TOTALS_CONDITION = "(RecCals IS NULL OR RecCarbs IS NULL OR RecFat IS NULL OR RecProtein IS NULL)"
+
+
+def _stored_or_derived_total(column, nutrient):
+    # The stored total of R, or while it is missing (until backfill_recipe_nutrition has run) the
+    # total derived from RecipeFoods. The subquery only runs for a missing total
+    return f"""COALESCE(R.{column}, (
+               SELECT SUM(N.{nutrient} * COALESCE(RF.NoServe, SI.NoServe) / NULLIF(SI.NoServe, 0))
+               FROM RecipeFoods RF
+               JOIN Foods F ON RF.FoodId = F.FoodId
+               JOIN Nutrition N ON F.FoodId = N.FoodId
+               JOIN ServingInfo SI ON F.ServId = SI.ServId
+               WHERE RF.RecId = R.RecId), 0)"""
+
+
+RECIPE_DETAILS_QUERY = f"""
+    SELECT R.RecName, R.RecServings, R.RecInstructions, R.RecNotes,
+           {_stored_or_derived_total('RecCals', 'Calories')},
+           {_stored_or_derived_total('RecProtein', 'Protein')},
+           {_stored_or_derived_total('RecCarbs', 'Carbs')},
+           {_stored_or_derived_total('RecFat', 'Fat')},
+           P.ProteinName
+    FROM Recipes R
+    LEFT JOIN Proteins P ON R.ProteinId = P.ProteinId
+    WHERE R.RecId = ?
+"""
+
+RECIPE_FOODS_QUERY = """
+    SELECT F.FoodName, COALESCE(RF.NoServe, SI.NoServe), COALESCE(RF.ServSize, SI.ServSize)
+    FROM RecipeFoods RF
+    JOIN Foods F ON RF.FoodId = F.FoodId
+    JOIN ServingInfo SI ON F.ServId = SI.ServId
+    WHERE RF.RecId = ?
+"""
+
+RECIPE_STEPS_QUERY = """
+    SELECT StepNumber, StepDescription
+    FROM RecipeSteps
+    WHERE RecId = ?
+    ORDER BY StepNumber
+"""
+
+# Totals kept up to date by the write paths, no aggregation needed to read them
+RECIPE_TOTAL_NUTRITION_QUERY = f"""
+    SELECT {_stored_or_derived_total('RecCals', 'Calories')},
+           {_stored_or_derived_total('RecCarbs', 'Carbs')},
+           {_stored_or_derived_total('RecFat', 'Fat')},
+           {_stored_or_derived_total('RecProtein', 'Protein')}
+    FROM Recipes R
+    WHERE R.RecId = ?
+"""
+
+# Totals re-derived from RecipeFoods, each food scaled from its base serving to the recipe amount.
+# Rows without their own NoServe count as one base serving.
+RECIPE_DERIVED_TOTALS_QUERY = """
+    SELECT RF.RecId,
+        SUM(N.Calories * COALESCE(RF.NoServe, SI.NoServe) / NULLIF(SI.NoServe, 0)) as TotalCalories,
+        SUM(N.Carbs * COALESCE(RF.NoServe, SI.NoServe) / NULLIF(SI.NoServe, 0)) as TotalCarbs,
+        SUM(N.Fat * COALESCE(RF.NoServe, SI.NoServe) / NULLIF(SI.NoServe, 0)) as TotalFat,
+        SUM(N.Protein * COALESCE(RF.NoServe, SI.NoServe) / NULLIF(SI.NoServe, 0)) as TotalProtein
+    FROM RecipeFoods RF
+    JOIN Foods F ON RF.FoodId = F.FoodId
+    JOIN Nutrition N ON F.FoodId = N.FoodId
+    JOIN ServingInfo SI ON F.ServId = SI.ServId
+    {where}
+    GROUP BY RF.RecId
+"""
+
+# Set-based recompute of the stored totals for a batch of recipes, recipes left without foods get 0
+RECOMPUTE_RECIPE_NUTRITION_SQL = """
+    UPDATE Recipes
+    SET RecCals = COALESCE((
+            SELECT SUM(N.Calories * COALESCE(RF.NoServe, SI.NoServe) / NULLIF(SI.NoServe, 0))
+            FROM RecipeFoods RF
+            JOIN Foods F ON RF.FoodId = F.FoodId
+            JOIN Nutrition N ON F.FoodId = N.FoodId
+            JOIN ServingInfo SI ON F.ServId = SI.ServId
+            WHERE RF.RecId = Recipes.RecId), 0),
+        RecProtein = COALESCE((
+            SELECT SUM(N.Protein * COALESCE(RF.NoServe, SI.NoServe) / NULLIF(SI.NoServe, 0))
+            FROM RecipeFoods RF
+            JOIN Foods F ON RF.FoodId = F.FoodId
+            JOIN Nutrition N ON F.FoodId = N.FoodId
+            JOIN ServingInfo SI ON F.ServId = SI.ServId
+            WHERE RF.RecId = Recipes.RecId), 0),
+        RecCarbs = COALESCE((
+            SELECT SUM(N.Carbs * COALESCE(RF.NoServe, SI.NoServe) / NULLIF(SI.NoServe, 0))
+            FROM RecipeFoods RF
+            JOIN Foods F ON RF.FoodId = F.FoodId
+            JOIN Nutrition N ON F.FoodId = N.FoodId
+            JOIN ServingInfo SI ON F.ServId = SI.ServId
+            WHERE RF.RecId = Recipes.RecId), 0),
+        RecFat = COALESCE((
+            SELECT SUM(N.Fat * COALESCE(RF.NoServe, SI.NoServe) / NULLIF(SI.NoServe, 0))
+            FROM RecipeFoods RF
+            JOIN Foods F ON RF.FoodId = F.FoodId
+            JOIN Nutrition N ON F.FoodId = N.FoodId
+            JOIN ServingInfo SI ON F.ServId = SI.ServId
+            WHERE RF.RecId = Recipes.RecId), 0)
+    WHERE RecId IN ({placeholders})
+"""
+
+# Recipes per recompute statement, well under SQL Server's 2100 parameter limit
+RECOMPUTE_CHUNK_SIZE = 1000
+
+# Adds (or with a negative amount, subtracts) one food's contribution to a recipe's stored totals.
+# Missing totals are left alone, a delta onto them would not be the recipe's total
+APPLY_NUTRITION_DELTA_SQL = f"""
+    UPDATE Recipes
+    SET RecCals = RecCals + COALESCE(? * N.Calories / NULLIF(SI.NoServe, 0), 0),
+        RecProtein = RecProtein + COALESCE(? * N.Protein / NULLIF(SI.NoServe, 0), 0),
+        RecCarbs = RecCarbs + COALESCE(? * N.Carbs / NULLIF(SI.NoServe, 0), 0),
+        RecFat = RecFat + COALESCE(? * N.Fat / NULLIF(SI.NoServe, 0), 0)
+    FROM Foods F
+    JOIN Nutrition N ON N.FoodId = F.FoodId
+    JOIN ServingInfo SI ON SI.ServId = F.ServId
+    WHERE Recipes.RecId = ? AND F.FoodId = ? AND NOT {MISSING_TOTALS_CONDITION}
+"""
+
+# Computes a recipe's totals in full if they are still missing
+RECOMPUTE_MISSING_NUTRITION_SQL = (RECOMPUTE_RECIPE_NUTRITION_SQL.format(placeholders="?")
+                                   + f"    AND {MISSING_TOTALS_CONDITION}\n")
+
+RECIPE_TAGS_QUERY = """
+    SELECT CT.TagId, CT.TagName
+    FROM RecipeTags RT
+    JOIN CustomTags CT ON RT.TagId = CT.TagId
+    WHERE RT.RecipeId = ?
+"""
+
+# Result sets of the recipe page, in the order load_recipe_aggregate reads them
+RECIPE_AGGREGATE_QUERIES = (
+    RECIPE_DETAILS_QUERY,
+    RECIPE_FOODS_QUERY,
+    RECIPE_STEPS_QUERY,
+    RECIPE_TAGS_QUERY,
+)
+RECIPE_AGGREGATE_PARTS = ('details', 'foods', 'steps', 'nutrition', 'tags')
+
+# Columns of a batch insert, in the order add_recipes takes them from each recipe
+RECIPE_INSERT_COLUMNS = ('RecName', 'RecServings', 'RecInstructions', 'RecNotes', 'ProteinId', 'MealTypeId')
+
+# Set-based insert of a batch of recipes on SQL Server. MERGE can output the source RowNo next to
+# the generated RecId, {rows} is one "(?, ?, ?, ?, ?, ?, ?)" per recipe
+INSERT_RECIPES_MERGE_SQL = """
+    SET NOCOUNT ON;
+    MERGE INTO Recipes
+    USING (VALUES {rows}) AS S (RowNo, RecName, RecServings, RecInstructions, RecNotes, ProteinId, MealTypeId)
+    ON 1 = 0
+    WHEN NOT MATCHED THEN
+        INSERT (RecName, RecServings, RecInstructions, RecNotes, ProteinId, MealTypeId)
+        VALUES (S.RecName, S.RecServings, S.RecInstructions, S.RecNotes, S.ProteinId, S.MealTypeId)
+    OUTPUT S.RowNo, INSERTED.RecId;
+"""
+# Recipes per MERGE, their parameters stay under SQL Server's limit of 2100 per request
+INSERT_RECIPES_CHUNK_SIZE = 2000 // (len(RECIPE_INSERT_COLUMNS) + 1)
 
 
 class RecipeOperations:
@@ -29,18 +195,97 @@ class RecipeOperations:
             cursor.execute(query, (recipe_name, servings, instructions, protein_id))
             rec_id = cursor.fetchone()[0]
             connection.commit()
+            RecipeOperations._recipe_changed(rec_id, text_changed=True)
             return rec_id
         except Exception as error:
             logging.error(f"Error adding recipe: {error}")
             connection.rollback()
             return None
 
+    @staticmethod
+    def add_recipes(work, recipes):
+        # Inserts a batch of complete recipes inside the caller's UnitOfWork and returns their ids
+        # in order; the caches follow once it commits. Each recipe is a dict with name, servings,
+        # instructions, notes, protein_id, meal_type_id, foods as (food_id, no_serve, serv_size),
+        # steps as descriptions and tag_ids
+        if not recipes:
+            return []
+        cursor = work.cursor
+        rows = [(recipe['name'], recipe.get('servings') or 1, recipe.get('instructions') or '',
+                 recipe.get('notes'), recipe.get('protein_id'), recipe.get('meal_type_id'))
+                for recipe in recipes]
+        if dialect_of(work.connection) == 'mssql':
+            recipe_ids = RecipeOperations._insert_recipes_mssql(cursor, rows)
+        else:
+            begin_write(work.connection)
+            recipe_ids = RecipeOperations._insert_recipes_sqlite(cursor, rows)
+
+        food_rows = [(recipe_id, food_id, no_serve, serv_size)
+                     for recipe_id, recipe in zip(recipe_ids, recipes)
+                     for food_id, no_serve, serv_size in recipe.get('foods', ())]
+        step_rows = [(recipe_id, number, step)
+                     for recipe_id, recipe in zip(recipe_ids, recipes)
+                     for number, step in enumerate(recipe.get('steps', ()), start=1)]
+        tag_rows = [(recipe_id, tag_id)
+                    for recipe_id, recipe in zip(recipe_ids, recipes)
+                    for tag_id in dict.fromkeys(recipe.get('tag_ids', ()))]
+        # One round trip per child table on SQL Server, pyodbc rejects an empty executemany
+        cursor.fast_executemany = True
+        try:
+            if food_rows:
+                cursor.executemany("INSERT INTO RecipeFoods (RecId, FoodId, NoServe, ServSize) VALUES (?, ?, ?, ?)",
+                                   food_rows)
+            if step_rows:
+                cursor.executemany("INSERT INTO RecipeSteps (RecId, StepNumber, StepDescription) VALUES (?, ?, ?)",
+                                   step_rows)
+            if tag_rows:
+                cursor.executemany("INSERT INTO RecipeTags (RecipeId, TagId) VALUES (?, ?)", tag_rows)
+        finally:
+            cursor.fast_executemany = False
+        # Queued with the caller's other writes
+        RecipeOperations.recompute_recipe_nutrition(work, recipe_ids)
+
+        work.after_commit(RecipeOperations._add_dependencies, [(food_id, recipe_id)
+                                                               for recipe_id, food_id, _, _ in food_rows])
+        work.after_commit(RecipeOperations.recipes_changed, recipe_ids, text_changed=True)
+        logging.debug("Queued %s recipe(s) in one batch", len(recipe_ids))
+        return recipe_ids
+
+    @staticmethod
+    def _add_dependencies(pairs):
+        for food_id, recipe_id in pairs:
+            recipe_dependency_index.add(food_id, recipe_id)
+
+    @staticmethod
+    def _insert_recipes_mssql(cursor, rows):
+        recipe_ids = [None] * len(rows)
+        for start in range(0, len(rows), INSERT_RECIPES_CHUNK_SIZE):
+            chunk = rows[start:start + INSERT_RECIPES_CHUNK_SIZE]
+            values = ", ".join(["(" + ", ".join("?" * (len(RECIPE_INSERT_COLUMNS) + 1)) + ")"] * len(chunk))
+            params = [value for row_no, row in enumerate(chunk, start=start) for value in (row_no, *row)]
+            cursor.execute(INSERT_RECIPES_MERGE_SQL.format(rows=values), params)
+            for row_no, recipe_id in cursor.fetchall():
+                recipe_ids[row_no] = recipe_id
+        return recipe_ids
+
+    @staticmethod
+    def _insert_recipes_sqlite(cursor, rows):
+        # The caller holds the write lock (begin_write), no other writer can claim the same ids
+        cursor.execute("SELECT COALESCE(MAX(RecId), 0) FROM Recipes")
+        first_id = cursor.fetchone()[0] + 1
+        recipe_ids = list(range(first_id, first_id + len(rows)))
+        cursor.executemany(f"INSERT INTO Recipes (RecId, {', '.join(RECIPE_INSERT_COLUMNS)}) "
+                           f"VALUES (?, {', '.join('?' * len(RECIPE_INSERT_COLUMNS))})",
+                           [(recipe_id, *row) for recipe_id, row in zip(recipe_ids, rows)])
+        return recipe_ids
+
     @staticmethod
     def add_tag_to_recipe(connection, recipe_id, tag_id):
         try:
             cursor = connection.cursor()
             cursor.execute("INSERT INTO RecipeTags (RecipeId, TagId) VALUES (?, ?)", (recipe_id, tag_id))
             connection.commit()
+            RecipeOperations._recipe_changed(recipe_id)
             return True
         except Exception as error:
             logging.error(f"Error adding tag to recipe: {error}")
@@ -54,6 +299,7 @@ class RecipeOperations:
             query = "DELETE FROM RecipeTags WHERE RecipeId = ? AND TagId = ?"
             cursor.execute(query, (recipe_id, tag_id))
             connection.commit()
+            RecipeOperations._recipe_changed(recipe_id)
             return True
         except Exception as error:
             logging.error(f"Error removing tag from recipe: {error}")
@@ -63,16 +309,8 @@ class RecipeOperations:
     @staticmethod
     def get_recipe_tags(connection, recipe_id):
         try:
-            cursor = connection.cursor()
-            query = """
-                        SELECT CT.TagName
-                        FROM RecipeTags RT
-                        JOIN CustomTags CT ON RT.TagId = CT.TagId
-                        WHERE RT.RecipeId = ?
-                    """
-            cursor.execute(query, (recipe_id,))
-            results = cursor.fetchall()
-            return [{'name': row[0]} for row in results]
+            return RecipeOperations._cached_part(connection, recipe_id, 'tags', RECIPE_TAGS_QUERY,
+                                                 RecipeOperations._tags_from_rows)
         except Exception as error:
             logging.error(f"Error getting recipe tags: {error}")
             return []
@@ -81,15 +319,10 @@ class RecipeOperations:
     def update_recipe_nutrition(connection, rec_id):
         try:
             cursor = connection.cursor()
-            cursor.execute("""
-                UPDATE Recipes
-                SET RecCals = (SELECT SUM(Calories) FROM Nutrition WHERE FoodId IN (SELECT FoodId FROM RecipeFoods WHERE RecId = ?)),
-                    RecProtein = (SELECT SUM(Protein) FROM Nutrition WHERE FoodId IN (SELECT FoodId FROM RecipeFoods WHERE RecId = ?)),
-                    RecCarbs = (SELECT SUM(Carbs) FROM Nutrition WHERE FoodId IN (SELECT FoodId FROM RecipeFoods WHERE RecId = ?)),
-                    RecFat = (SELECT SUM(Fat) FROM Nutrition WHERE FoodId IN (SELECT FoodId FROM RecipeFoods WHERE RecId = ?))
-                WHERE RecId = ?
-            """, (rec_id, rec_id, rec_id, rec_id, rec_id))
+            # Full recompute from RecipeFoods, used to repair totals that drifted
+            RecipeOperations.recompute_recipe_nutrition(cursor, [rec_id])
             connection.commit()
+            RecipeOperations._recipe_changed(rec_id)
         except Exception as error:
             logging.error(f"Error while updating recipe nutrition: {error}")
 
@@ -122,6 +355,7 @@ class RecipeOperations:
             # Execute the update query
             cursor.execute(update_query, update_params)
             connection.commit()
+            RecipeOperations._recipe_changed(rec_id, text_changed=True)
             return True
         except Exception as error:
             logging.error(f"Error while updating recipe: {error}")
@@ -131,23 +365,21 @@ class RecipeOperations:
     @staticmethod
     def delete_recipe(connection, rec_id):
         try:
-            cursor = connection.cursor()
-
-            # Delete Food associations
-            cursor.execute("""
-                DELETE FROM RecipeFoods
-                WHERE RecId = ?
-                """,
-                (rec_id,))
-            connection.commit()
-
-            # Delete from Recipes table
-            cursor.execute("""
-                DELETE FROM Recipes
-                WHERE RecId = ?
-                """,
-                (rec_id,))
-            connection.commit()
+            # The recipe and everything referencing it go in one transaction and one batch
+            with UnitOfWork(connection) as work:
+                # Delete Food associations, steps and tags
+                work.execute("DELETE FROM RecipeFoods WHERE RecId = ?", (rec_id,))
+                work.execute("DELETE FROM RecipeSteps WHERE RecId = ?", (rec_id,))
+                work.execute("DELETE FROM RecipeTags WHERE RecipeId = ?", (rec_id,))
+
+                # Delete from Recipes table
+                work.execute("""
+                    DELETE FROM Recipes
+                    WHERE RecId = ?
+                    """,
+                    (rec_id,))
+                work.after_commit(recipe_dependency_index.remove_recipe, rec_id)
+                work.after_commit(RecipeOperations._recipe_changed, rec_id, text_changed=True)
 
             logging.info("Recipe deleted successfully.")
         except Exception as error:
@@ -156,18 +388,9 @@ class RecipeOperations:
     @staticmethod
     def get_recipe_foods(connection, recipe_id):
         try:
-            cursor = connection.cursor()
-            query = """
-                SELECT F.FoodName, SI.NoServe, SI.ServSize
-                FROM RecipeFoods RF
-                JOIN Foods F ON RF.FoodId = F.FoodId
-                JOIN ServingInfo SI ON F.ServId = SI.ServId
-                WHERE RF.RecId = ?
-                """
-            cursor.execute(query, (recipe_id,))
-            results = cursor.fetchall()
-            return [{'name': row[0], 'amount': row[1], 'unit': row[2]} for row in results]
-            logging.debug(f"Recipe foods for recipe {recipe_id}: {foods}")
+            foods = RecipeOperations._cached_part(connection, recipe_id, 'foods', RECIPE_FOODS_QUERY,
+                                                  RecipeOperations._foods_from_rows)
+            logging.debug("Recipe foods for recipe %s: %s", recipe_id, foods)
             return foods
         except Exception as error:
             logging.error(f"Error getting recipe foods: {error}")
@@ -178,29 +401,19 @@ class RecipeOperations:
         try:
             cursor = connection.cursor()
 
-            # Insert the serving info
-            cursor.execute("""
-                    INSERT INTO ServingInfo (NoServe, ServSize)
-                    OUTPUT INSERTED.ServId
-                    VALUES (?, ?)
-                    """, (no_serve, serv_size))
-            serv_id = cursor.fetchone()[0]
-
-            # Update the Foods table with the new ServId
+            # Insert into RecipeFoods table, the recipe's amount lives on the association
             cursor.execute("""
-                    UPDATE Foods
-                    SET ServId = ?
-                    WHERE FoodId = ?
-                    """, (serv_id, food_id))
+                INSERT INTO RecipeFoods (RecId, FoodId, NoServe, ServSize)
+                VALUES (?, ?, ?, ?)
+                """, (recipe_id, food_id, no_serve, serv_size))
 
-            # Insert into RecipeFoods table
-            cursor.execute("""
-                INSERT INTO RecipeFoods (RecId, FoodId)
-                VALUES (?, ?)
-                """, (recipe_id, food_id))
+            # Add the food's scaled contribution to the recipe totals
+            RecipeOperations._apply_nutrition_delta(cursor, recipe_id, food_id, float(no_serve))
 
             connection.commit()
-            logging.info(f"Food (ID: {food_id}) added to recipe (ID: {recipe_id}) with new ServId: {serv_id}")
+            recipe_dependency_index.add(food_id, recipe_id)
+            RecipeOperations._recipe_changed(recipe_id, text_changed=True)
+            logging.info(f"Food (ID: {food_id}) added to recipe (ID: {recipe_id}) with {no_serve} {serv_size}")
             return True
         except Exception as error:
             logging.error(f"Error adding food to recipe: {error}", exc_info=True)
@@ -211,17 +424,231 @@ class RecipeOperations:
     def update_recipe_food(connection, rec_food_id, new_no_serve, new_serv_size):
         try:
             cursor = connection.cursor()
+            current = RecipeOperations._get_recipe_food(cursor, rec_food_id)
+            if current is None:
+                logging.warning(f"No recipe food found with RecFoodId: {rec_food_id}")
+                return
+            recipe_id, food_id, old_no_serve = current
+
             cursor.execute("""
                 UPDATE RecipeFoods
                 SET NoServe = ?, ServSize = ?
                 WHERE RecFoodId = ?
             """, (new_no_serve, new_serv_size, rec_food_id))
+
+            # Only the change in amount needs to reach the recipe totals
+            RecipeOperations._apply_nutrition_delta(cursor, recipe_id, food_id,
+                                                    float(new_no_serve) - float(old_no_serve or 0))
             connection.commit()
+            RecipeOperations._recipe_changed(recipe_id)
             logging.info(f"Food updated successfully. RecFoodId: {rec_food_id}")
         except Exception as error:
             logging.error(f"Error updating recipe_food: {error}")
             connection.rollback()
 
+    @staticmethod
+    def remove_recipe_food(connection, rec_food_id):
+        try:
+            cursor = connection.cursor()
+            current = RecipeOperations._get_recipe_food(cursor, rec_food_id)
+            if current is None:
+                logging.warning(f"No recipe food found with RecFoodId: {rec_food_id}")
+                return False
+            recipe_id, food_id, no_serve = current
+
+            cursor.execute("DELETE FROM RecipeFoods WHERE RecFoodId = ?", (rec_food_id,))
+            RecipeOperations._apply_nutrition_delta(cursor, recipe_id, food_id, -float(no_serve or 0))
+            connection.commit()
+            recipe_dependency_index.remove(food_id, recipe_id)
+            RecipeOperations._recipe_changed(recipe_id, text_changed=True)
+            logging.info(f"Food removed from recipe successfully. RecFoodId: {rec_food_id}")
+            return True
+        except Exception as error:
+            logging.error(f"Error removing recipe food: {error}")
+            connection.rollback()
+            return False
+
+    @staticmethod
+    def remove_food_from_recipe(connection, recipe_id, food_id):
+        try:
+            cursor = connection.cursor()
+            cursor.execute("""
+                SELECT SUM(COALESCE(RF.NoServe, SI.NoServe))
+                FROM RecipeFoods RF
+                JOIN Foods F ON RF.FoodId = F.FoodId
+                JOIN ServingInfo SI ON F.ServId = SI.ServId
+                WHERE RF.RecId = ? AND RF.FoodId = ?
+            """, (recipe_id, food_id))
+            removed_amount = cursor.fetchone()[0]
+
+            cursor.execute("DELETE FROM RecipeFoods WHERE RecId = ? AND FoodId = ?", (recipe_id, food_id))
+            if removed_amount:
+                RecipeOperations._apply_nutrition_delta(cursor, recipe_id, food_id, -float(removed_amount))
+            connection.commit()
+            recipe_dependency_index.remove(food_id, recipe_id, count=None)
+            RecipeOperations._recipe_changed(recipe_id, text_changed=True)
+            logging.info(f"Food (ID: {food_id}) removed from recipe (ID: {recipe_id})")
+            return True
+        except Exception as error:
+            logging.error(f"Error removing food from recipe: {error}")
+            connection.rollback()
+            return False
+
+    @staticmethod
+    def verify_recipe_nutrition(connection, recipe_ids=None, tolerance=0.01, repair=False):
+        # Re-derive totals from RecipeFoods and report recipes whose stored totals drifted
+        try:
+            cursor = connection.cursor()
+            if recipe_ids is None:
+                # One pass over the whole catalog
+                chunks = [None]
+            else:
+                recipe_ids = list(recipe_ids)
+                if not recipe_ids:
+                    return []
+                # Chunked like the recompute, under SQL Server's 2100 parameter limit
+                chunks = [tuple(recipe_ids[start:start + RECOMPUTE_CHUNK_SIZE])
+                          for start in range(0, len(recipe_ids), RECOMPUTE_CHUNK_SIZE)]
+
+            drifted = []
+            for chunk in chunks:
+                where, params = "", ()
+                query = "SELECT RecId, RecCals, RecCarbs, RecFat, RecProtein FROM Recipes"
+                if chunk is not None:
+                    placeholders = ', '.join('?' * len(chunk))
+                    where = f"WHERE RF.RecId IN ({placeholders})"
+                    query += f" WHERE RecId IN ({placeholders})"
+                    params = chunk
+                cursor.execute(RECIPE_DERIVED_TOTALS_QUERY.format(where=where), params)
+                derived = {row[0]: tuple(value or 0 for value in row[1:]) for row in cursor.fetchall()}
+                cursor.execute(query, params)
+
+                for row in cursor.fetchall():
+                    stored = tuple(value or 0 for value in row[1:])
+                    expected = derived.get(row[0], (0, 0, 0, 0))
+                    if any(abs(a - b) > tolerance for a, b in zip(stored, expected)):
+                        drifted.append({
+                            'recipe_id': row[0],
+                            'stored': dict(zip(('calories', 'carbs', 'fat', 'protein'), stored)),
+                            'derived': dict(zip(('calories', 'carbs', 'fat', 'protein'), expected)),
+                        })
+
+            if drifted:
+                logging.warning(f"Nutrition totals drifted for {len(drifted)} recipe(s)")
+                if repair:
+                    for entry in drifted:
+                        RecipeOperations.update_recipe_nutrition(connection, entry['recipe_id'])
+            return drifted
+        except Exception as error:
+            logging.error(f"Error verifying recipe nutrition: {error}")
+            return []
+
+    @staticmethod
+    def recompute_recipe_nutrition(cursor, recipe_ids):
+        # Runs inside the caller's transaction, one statement per chunk of recipes. cursor can
+        # also be a UnitOfWork, the statements are then queued with its other writes
+        recipe_ids = list(recipe_ids)
+        for start in range(0, len(recipe_ids), RECOMPUTE_CHUNK_SIZE):
+            chunk = recipe_ids[start:start + RECOMPUTE_CHUNK_SIZE]
+            cursor.execute(RECOMPUTE_RECIPE_NUTRITION_SQL.format(placeholders=", ".join("?" * len(chunk))),
+                           tuple(chunk))
+
+    @staticmethod
+    def recipes_using_food(cursor, food_id):
+        recipe_ids = recipe_dependency_index.recipes_using(food_id)
+        if recipe_ids is None:
+            cursor.execute("SELECT DISTINCT RecId FROM RecipeFoods WHERE FoodId = ?", (food_id,))
+            recipe_ids = [row[0] for row in cursor.fetchall()]
+        return recipe_ids
+
+    @staticmethod
+    def propagate_food_change(work, food_id):
+        # Called by FoodOperations inside the UnitOfWork of a food edit, queues the recompute of
+        # the recipes using the food behind the edit and returns their ids
+        recipe_ids = RecipeOperations.recipes_using_food(work.cursor, food_id)
+        RecipeOperations.recompute_recipe_nutrition(work, recipe_ids)
+        logging.debug("Food %s change recomputes %s recipe(s)", food_id, len(recipe_ids))
+        return recipe_ids
+
+    @staticmethod
+    def recipes_changed(recipe_ids, text_changed=False):
+        for recipe_id in recipe_ids:
+            RecipeOperations._recipe_changed(recipe_id, text_changed)
+
+    @staticmethod
+    def load_dependency_index(connection):
+        try:
+            recipe_dependency_index.build(connection)
+            return True
+        except Exception as error:
+            logging.error(f"Error building recipe dependency index: {error}")
+            return False
+
+    @staticmethod
+    def backfill_recipe_nutrition(connection):
+        # One-time fill of the missing totals, run at startup. Returns the ids of the recipes filled
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f"SELECT RecId FROM Recipes WHERE {MISSING_TOTALS_CONDITION}")
+            recipe_ids = [row[0] for row in cursor.fetchall()]
+            if not recipe_ids:
+                return []
+            RecipeOperations.recompute_recipe_nutrition(cursor, recipe_ids)
+            connection.commit()
+            RecipeOperations.recipes_changed(recipe_ids)
+            logging.info(f"Backfilled nutrition totals of {len(recipe_ids)} recipe(s)")
+            return recipe_ids
+        except Exception as error:
+            logging.error(f"Error backfilling recipe nutrition: {error}")
+            connection.rollback()
+            return None
+
+    @staticmethod
+    def recompute_all_nutrition(connection, tolerance=0.01):
+        # Recomputes every recipe's stored totals, returns the ids of the recipes that changed
+        try:
+            started = time.perf_counter()
+            if nutrition_engine.available():
+                nutrition_engine.load(connection)
+                nutrition_engine.compute()
+                changed = nutrition_engine.write_totals(connection, tolerance)
+            else:
+                cursor = connection.cursor()
+                cursor.execute("SELECT RecId FROM Recipes")
+                changed = [row[0] for row in cursor.fetchall()]
+                RecipeOperations.recompute_recipe_nutrition(cursor, changed)
+            connection.commit()
+            RecipeOperations.recipes_changed(changed)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            logging.info(f"Recomputed recipe nutrition, {len(changed)} recipe(s) changed in {elapsed_ms:.0f} ms")
+            return changed
+        except Exception as error:
+            logging.error(f"Error recomputing recipe nutrition: {error}")
+            connection.rollback()
+            return None
+
+    @staticmethod
+    def get_catalog_nutrition(connection, reload=True):
+        # recipe_id -> {'total', 'per_serving', 'macro_ratios'} for every recipe, computed in bulk
+        try:
+            if reload or not nutrition_engine.loaded:
+                nutrition_engine.load(connection)
+            totals = nutrition_engine.compute()
+            per_serving = nutrition_engine.per_serving()
+            ratios = nutrition_engine.macro_ratios()
+            return {
+                recipe_id: {
+                    'total': dict(zip(NUTRIENTS, total)),
+                    'per_serving': dict(zip(NUTRIENTS, serving)),
+                    'macro_ratios': dict(zip(NUTRIENTS[1:], ratio)),
+                }
+                for recipe_id, total, serving, ratio in zip(nutrition_engine.recipe_ids.tolist(), totals.tolist(),
+                                                            per_serving.tolist(), ratios.tolist())
+            }
+        except Exception as error:
+            logging.error(f"Error computing catalog nutrition: {error}")
+            return {}
+
     @staticmethod
     def save_recipe_steps(connection, recipe_id, steps):
         try:
@@ -232,15 +659,16 @@ class RecipeOperations:
 
             # Delete any existing steps for this recipe
             cursor.execute("DELETE FROM RecipeSteps WHERE RecId = ?", (recipe_id,))
-            logging.debug(f"Deleted existing steps for recipe ID: {recipe_id}")
+            logging.debug("Deleted existing steps for recipe ID: %s", recipe_id)
 
-            # Insert new steps
-            for index, step in enumerate(steps, start=1):
-                cursor.execute("INSERT INTO RecipeSteps (RecId, StepNumber, StepDescription) VALUES (?, ?, ?)",
-                               (recipe_id, index, step))
-                logging.debug(f"Inserted step {index} for recipe ID: {recipe_id}")
+            # Insert new steps in one batch, pyodbc rejects an empty one
+            if steps:
+                cursor.executemany("INSERT INTO RecipeSteps (RecId, StepNumber, StepDescription) VALUES (?, ?, ?)",
+                                   [(recipe_id, index, step) for index, step in enumerate(steps, start=1)])
+            logging.debug("Inserted %s step(s) for recipe ID: %s", len(steps), recipe_id)
 
             connection.commit()
+            RecipeOperations._recipe_changed(recipe_id, text_changed=True)
             logging.info(f"Successfully saved {len(steps)} steps for recipe ID: {recipe_id}")
             return True
         except Exception as error:
@@ -251,31 +679,12 @@ class RecipeOperations:
     @staticmethod
     def get_recipe_details(connection, recipe_id):
         try:
-            cursor = connection.cursor()
-            query = """
-                SELECT R.RecName, R.RecServings, R.RecInstructions, R.RecNotes,
-                       R.RecCals, R.RecProtein, R.RecCarbs, R.RecFat,
-                       P.ProteinName
-                FROM Recipes R
-                LEFT JOIN Proteins P ON R.ProteinId = P.ProteinId
-                WHERE R.RecId = ?
-            """
-            cursor.execute(query, (recipe_id,))
-            result = cursor.fetchone()
-
-            if result:
-                return {
-                    'name': result[0],
-                    'servings': result[1],
-                    'instructions': result[2],
-                    'notes': result[3],
-                    'calories': result[4],
-                    'protein': result[5],
-                    'carbs': result[6],
-                    'fat': result[7],
-                    'protein_type': result[8]
-                }
-                logging.debug(f"Recipe details fetched for ID {recipe_id}: {recipe_details}")
+            recipe_details = RecipeOperations._cached_part(
+                connection, recipe_id, 'details', RECIPE_DETAILS_QUERY,
+                lambda rows: RecipeOperations._details_from_row(rows[0]) if rows else None)
+
+            if recipe_details:
+                logging.debug("Recipe details fetched for ID %s: %s", recipe_id, recipe_details)
                 return recipe_details
             else:
                 logging.error(f"No recipe found with ID: {recipe_id}")
@@ -287,17 +696,9 @@ class RecipeOperations:
     @staticmethod
     def get_recipe_steps(connection, recipe_id):
         try:
-            cursor = connection.cursor()
-            query = """
-                    SELECT StepNumber, StepDescription
-                    FROM RecipeSteps
-                    WHERE RecId = ?
-                    ORDER BY StepNumber
-                """
-            cursor.execute(query, (recipe_id,))
-            results = cursor.fetchall()
-            steps = [{'number': row[0], 'description': row[1]} for row in results]
-            logging.debug(f"Recipe steps for recipe {recipe_id}: {steps}")
+            steps = RecipeOperations._cached_part(connection, recipe_id, 'steps', RECIPE_STEPS_QUERY,
+                                                  RecipeOperations._steps_from_rows)
+            logging.debug("Recipe steps for recipe %s: %s", recipe_id, steps)
             return steps
         except Exception as error:
             logging.error(f"Error getting steps for recipe {recipe_id}: {error}")
@@ -309,6 +710,7 @@ class RecipeOperations:
             cursor = connection.cursor()
             cursor.execute("UPDATE Recipes SET RecInstructions = ? WHERE RecId = ?", (instructions, recipe_id))
             connection.commit()
+            RecipeOperations._recipe_changed(recipe_id, text_changed=True)
             logging.info(f"Recipe instructions updated successfully for RecId: {recipe_id}")
             return True
         except Exception as error:
@@ -319,27 +721,237 @@ class RecipeOperations:
     @staticmethod
     def get_recipe_total_nutrition(connection, recipe_id):
         try:
+            return RecipeOperations._cached_part(
+                connection, recipe_id, 'nutrition', RECIPE_TOTAL_NUTRITION_QUERY,
+                lambda rows: RecipeOperations._nutrition_from_row(rows[0] if rows else None))
+        except Exception as error:
+            logging.error(f"Error calculating total nutrition for recipe: {error}")
+            return {'calories': 0, 'carbs': 0, 'fat': 0, 'protein': 0}
+
+    @staticmethod
+    def load_recipe_aggregate(connection, recipe_id):
+        # Everything the recipe page shows, fetched in a single round trip
+        started = time.perf_counter()
+        try:
+            cached = recipe_cache.get_parts(recipe_id, RECIPE_AGGREGATE_PARTS)
+            if cached is not None:
+                return cached
+
+            epoch = recipe_cache.current_epoch()
             cursor = connection.cursor()
-            query = """
-                SELECT
-                    SUM(N.Calories * RF.NoServe / SI.NoServe) as TotalCalories,
-                    SUM(N.Carbs * RF.NoServe / SI.NoServe) as TotalCarbs,
-                    SUM(N.Fat * RF.NoServe / SI.NoServe) as TotalFat,
-                    SUM(N.Protein * RF.NoServe / SI.NoServe) as TotalProtein,
-                FROM RecipeFoods RF
-                JOIN Foods F ON RF.FoodId = F.FoodId
-                JOIN Nutrition N ON F.FoodId = N.FoodId
-                JOIN ServingInfo SI ON F.ServId = SI.ServId
-                WHERE RF.RecId = ?
-            """
-            cursor.execute(query, (recipe_id,))
-            results = cursor.fetchone()
-            return {
-                'calories': round(result[0] or 0, 2),
-                'carbs': round(result[1] or 0, 2),
-                'fat': round(results[2] or 0, 2),
-                'protein': round(results[3] or 0, 2),
+            if dialect_of(connection) == 'mssql':
+                # One batch returning a result set per query
+                batch = "SET NOCOUNT ON;\n" + ";\n".join(RECIPE_AGGREGATE_QUERIES)
+                cursor.execute(batch, (recipe_id,) * len(RECIPE_AGGREGATE_QUERIES))
+                result_sets = [cursor.fetchall()]
+                while cursor.nextset():
+                    result_sets.append(cursor.fetchall())
+            else:
+                # Embedded databases have no round trip to save, run the statements back to back
+                result_sets = []
+                for query in RECIPE_AGGREGATE_QUERIES:
+                    cursor.execute(query, (recipe_id,))
+                    result_sets.append(cursor.fetchall())
+
+            details_rows, food_rows, step_rows, tag_rows = result_sets
+            if not details_rows:
+                logging.error(f"No recipe found with ID: {recipe_id}")
+                return None
+
+            details = RecipeOperations._details_from_row(details_rows[0])
+            aggregate = {
+                'details': details,
+                'foods': RecipeOperations._foods_from_rows(food_rows),
+                'steps': RecipeOperations._steps_from_rows(step_rows),
+                # The stored totals are already part of the details row
+                'nutrition': RecipeOperations._nutrition_from_row(
+                    (details['calories'], details['carbs'], details['fat'], details['protein'])),
+                'tags': RecipeOperations._tags_from_rows(tag_rows),
             }
+            recipe_cache.put_parts(recipe_id, aggregate, epoch)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            logging.debug("Recipe aggregate for ID %s loaded in %.1f ms", recipe_id, elapsed_ms)
+            return aggregate
         except Exception as error:
-            logging.error(f"Error calculating total nutrition for recipe: {error}")
-            return {'calories': 0, 'carbs': 0, 'fat': 0, 'protein': 0}
\ No newline at end of file
+            logging.error(f"Error loading recipe aggregate for recipe {recipe_id}: {error}", exc_info=True)
+            raise
+
+    @staticmethod
+    def load_search_index(connection):
+        try:
+            recipe_search_index.build(connection)
+            return True
+        except Exception as error:
+            logging.error(f"Error building recipe search index: {error}")
+            return False
+
+    @staticmethod
+    def search_recipes(connection, query, k=20):
+        # Ranked (recipe_id, score) pairs over names, ingredients, steps, instructions and notes
+        try:
+            if not recipe_search_index.loaded:
+                recipe_search_index.build(connection)
+            return recipe_search_index.search(connection, query, k)
+        except Exception as error:
+            logging.error(f"Error searching recipes for '{query}': {error}")
+            return []
+
+    @staticmethod
+    def find_recipes_by_macros(connection, bounds):
+        # Recipe ids whose stored totals fall inside bounds, {'protein': (low, high), ...}
+        try:
+            if not macro_index.loaded:
+                macro_index.build(connection)
+            return macro_index.range_query(connection, bounds)
+        except Exception as error:
+            logging.error(f"Error searching recipes by macros {bounds}: {error}")
+            return []
+
+    @staticmethod
+    def nearest_recipes_by_macros(connection, target, k=10, weights=None, per_serving=False,
+                                  tag_id=None, protein_id=None):
+        # (recipe_id, distance) pairs closest to a {'calories': .., 'protein': ..} target,
+        # optionally per serving and limited to one tag and/or protein type
+        try:
+            started = time.perf_counter()
+            index = serving_macro_index if per_serving else macro_index
+            if not index.loaded:
+                index.build(connection)
+            weights = weights or DEFAULT_MACRO_WEIGHTS
+
+            allowed = RecipeOperations._recipe_filter(connection, tag_id, protein_id)
+            if allowed is None:
+                results = index.nearest(connection, target, k, weights)
+            elif len(allowed) <= FILTER_SCAN_RATIO * index.size():
+                index.refresh(connection)
+                results = index.nearest_among(allowed, target, k, weights)
+            else:
+                results = index.nearest(connection, target, k, weights, accept=allowed.__contains__)
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            logging.debug("Nearest recipes to %s found in %.1f ms", target, elapsed_ms)
+            return results
+        except Exception as error:
+            logging.error(f"Error finding recipes near {target}: {error}")
+            return []
+
+    @staticmethod
+    def plan_meals(connection, target, days=1, slots=None, tag_ids=(), time_budget=1.0):
+        # Best plan found within time_budget seconds, see MealPlanner.plan for the result layout
+        try:
+            return meal_planner.plan(connection, target, days=days, slots=slots, tag_ids=tag_ids,
+                                     time_budget=time_budget)
+        except Exception as error:
+            logging.error(f"Error planning meals for {target}: {error}")
+            return None
+
+    @staticmethod
+    def _recipe_filter(connection, tag_id=None, protein_id=None):
+        # Set of recipe ids matching every given filter, None when there are no filters
+        cursor = connection.cursor()
+        if tag_id is not None and protein_id is not None:
+            # Intersect in the database so only the matching ids come back
+            cursor.execute("""
+                SELECT R.RecId
+                FROM Recipes R
+                JOIN RecipeTags RT ON RT.RecipeId = R.RecId
+                WHERE RT.TagId = ? AND R.ProteinId = ?
+            """, (tag_id, protein_id))
+        elif tag_id is not None:
+            cursor.execute("SELECT RecipeId FROM RecipeTags WHERE TagId = ?", (tag_id,))
+        elif protein_id is not None:
+            cursor.execute("SELECT RecId FROM Recipes WHERE ProteinId = ?", (protein_id,))
+        else:
+            return None
+        return {row[0] for row in cursor.fetchall()}
+
+    @staticmethod
+    def data_version():
+        # Changes whenever any recipe is written
+        return recipe_cache.current_epoch()
+
+    @staticmethod
+    def get_recipe_rows(connection, recipe_ids):
+        # Full Recipes rows in the order of recipe_ids
+        rows_by_id = {}
+        cursor = connection.cursor()
+        recipe_ids = list(recipe_ids)
+        for start in range(0, len(recipe_ids), RECOMPUTE_CHUNK_SIZE):
+            chunk = recipe_ids[start:start + RECOMPUTE_CHUNK_SIZE]
+            cursor.execute(f"SELECT * FROM Recipes WHERE RecId IN ({', '.join('?' * len(chunk))})", tuple(chunk))
+            rows_by_id.update((row[0], row) for row in cursor.fetchall())
+        return [rows_by_id[recipe_id] for recipe_id in recipe_ids if recipe_id in rows_by_id]
+
+    @staticmethod
+    def _recipe_changed(recipe_id, text_changed=False):
+        # Every write path ends here once its changes are committed
+        recipe_cache.invalidate(recipe_id)
+        macro_index.mark_dirty(recipe_id)
+        serving_macro_index.mark_dirty(recipe_id)
+        if text_changed:
+            recipe_search_index.mark_dirty(recipe_id)
+
+    @staticmethod
+    def _get_recipe_food(cursor, rec_food_id):
+        # (RecId, FoodId, amount counted in the recipe totals) for one RecipeFoods row
+        cursor.execute("""
+            SELECT RF.RecId, RF.FoodId, COALESCE(RF.NoServe, SI.NoServe)
+            FROM RecipeFoods RF
+            JOIN Foods F ON RF.FoodId = F.FoodId
+            JOIN ServingInfo SI ON F.ServId = SI.ServId
+            WHERE RF.RecFoodId = ?
+        """, (rec_food_id,))
+        return cursor.fetchone()
+
+    @staticmethod
+    def _apply_nutrition_delta(cursor, recipe_id, food_id, amount):
+        # Runs after the RecipeFoods change, so a recipe with missing totals gets them from it
+        if amount:
+            cursor.execute(APPLY_NUTRITION_DELTA_SQL, (amount, amount, amount, amount, recipe_id, food_id))
+        cursor.execute(RECOMPUTE_MISSING_NUTRITION_SQL, (recipe_id,))
+
+    @staticmethod
+    def _cached_part(connection, recipe_id, part, query, from_rows):
+        # Serve one part of a recipe from the recipe cache, querying only on a miss
+        def load():
+            cursor = connection.cursor()
+            cursor.execute(query, (recipe_id,))
+            return from_rows(cursor.fetchall())
+        return recipe_cache.get_or_load(recipe_id, part, load)
+
+    @staticmethod
+    def _details_from_row(row):
+        return {
+            'name': row[0],
+            'servings': row[1],
+            'instructions': row[2],
+            'notes': row[3],
+            'calories': row[4],
+            'protein': row[5],
+            'carbs': row[6],
+            'fat': row[7],
+            'protein_type': row[8]
+        }
+
+    @staticmethod
+    def _foods_from_rows(rows):
+        return [{'name': row[0], 'amount': row[1], 'unit': row[2]} for row in rows]
+
+    @staticmethod
+    def _steps_from_rows(rows):
+        return [{'number': row[0], 'description': row[1]} for row in rows]
+
+    @staticmethod
+    def _nutrition_from_row(row):
+        if row is None:
+            return {'calories': 0, 'carbs': 0, 'fat': 0, 'protein': 0}
+        return {
+            'calories': round(row[0] or 0, 2),
+            'carbs': round(row[1] or 0, 2),
+            'fat': round(row[2] or 0, 2),
+            'protein': round(row[3] or 0, 2),
+        }
+
+    @staticmethod
+    def _tags_from_rows(rows):
+        return [{'id': row[0], 'name': row[1]} for row in rows]
\ No newline at end of file
@@ -0,0 +1,89 @@
+# reference_cache.py
+import logging
+import threading
+
+# Small lookup tables read by combo boxes and tables on every page, as (id, name) rows
+REFERENCE_QUERIES = {
+    'proteins': "SELECT ProteinId, ProteinName FROM Proteins",
+    'tags': "SELECT TagId, TagName FROM CustomTags",
+    'measurements': "SELECT MeasId, MeasName FROM Measurements",
+    'search_categories': "SELECT CategoryId, CategoryName FROM SearchCategories",
+    'meal_types': "SELECT MealTypeId, MealTypeName FROM MealType",
+}
+
+# Tables the UI lists alphabetically, the rest keep database order
+SORTED_TABLES = {'proteins', 'tags', 'measurements'}
+
+
+class ReferenceDataCache:
+    def __init__(self):
+        self._lock = threading.RLock()
+        # table -> {id: name}
+        self._tables = {}
+        # table -> rows as handed out, rebuilt lazily after a change
+        self._rows = {}
+        self.loads = 0
+
+    def load(self, connection, tables=None):
+        tables = tables or list(REFERENCE_QUERIES)
+        cursor = connection.cursor()
+        loaded = {}
+        for table in tables:
+            cursor.execute(REFERENCE_QUERIES[table])
+            loaded[table] = {row[0]: row[1] for row in cursor.fetchall()}
+
+        with self._lock:
+            for table, items in loaded.items():
+                self._tables[table] = items
+                self._rows.pop(table, None)
+            self.loads += 1
+        logging.debug("Reference data loaded: %s", ', '.join(f'{table}={len(items)}' for table, items in loaded.items()))
+
+    def is_loaded(self, table):
+        with self._lock:
+            return table in self._tables
+
+    def rows(self, connection, table):
+        # (id, name) rows for a table, read from the database only the first time
+        with self._lock:
+            if table not in self._tables:
+                self.load(connection, [table])
+            rows = self._rows.get(table)
+            if rows is None:
+                rows = list(self._tables[table].items())
+                if table in SORTED_TABLES:
+                    rows.sort(key=lambda row: (row[1] or "").casefold())
+                self._rows[table] = rows
+            return list(rows)
+
+    def name_of(self, connection, table, item_id):
+        with self._lock:
+            if table not in self._tables:
+                self.load(connection, [table])
+            return self._tables[table].get(item_id)
+
+    def upsert(self, table, item_id, name):
+        # Called by the add_*/update_* operations after their commit
+        with self._lock:
+            if table in self._tables:
+                self._tables[table][item_id] = name
+                self._rows.pop(table, None)
+
+    def remove(self, table, item_id):
+        with self._lock:
+            if table in self._tables:
+                self._tables[table].pop(item_id, None)
+                self._rows.pop(table, None)
+
+    def invalidate(self, table=None):
+        with self._lock:
+            if table is None:
+                self._tables.clear()
+                self._rows.clear()
+            else:
+                self._tables.pop(table, None)
+                self._rows.pop(table, None)
+
+
+# Shared by the *Operations classes and the UI
+reference_cache = ReferenceDataCache()
@@ -0,0 +1,78 @@
+# startup_warmup.py
+import logging
+import time
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from db_backends import DB_ERRORS
+from food_operations import FoodOperations
+from query_metrics import query_metrics
+from recipes_operations import RecipeOperations
+from reference_cache import reference_cache
+
+
+class WarmupSignals(QObject):
+    finished = pyqtSignal(bool, float)
+
+
+class WarmupTask(QRunnable):
+    def __init__(self, database_manager):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.database_manager = database_manager
+        self.signals = WarmupSignals()
+
+    def run(self):
+        started = time.perf_counter()
+        connected = False
+        try:
+            with query_metrics.action('startup_warmup'):
+                connected = self._run()
+        except Exception as error:
+            logging.error(f"Error warming up the database caches: {error}")
+        finally:
+            self.signals.finished.emit(connected, (time.perf_counter() - started) * 1000)
+
+    def _run(self):
+        if not self.database_manager.connect_to_database():
+            return False
+        # Loaded on a pooled connection, the GUI thread keeps database_manager.connection
+        with self.database_manager.get_connection() as connection:
+            try:
+                reference_cache.load(connection)
+            except DB_ERRORS as error:
+                logging.error(f"Error loading reference data: {error}")
+            # Before anything reads the stored recipe totals
+            RecipeOperations.backfill_recipe_nutrition(connection)
+            FoodOperations.load_search_index(connection)
+            RecipeOperations.load_search_index(connection)
+            RecipeOperations.load_dependency_index(connection)
+        return True
+
+
+class StartupWarmup(QObject):
+    # Connects to the database and loads the reference data and search indexes on a worker
+    # thread while the home page is already shown. finished(connected, elapsed_ms) arrives on
+    # the GUI thread.
+    finished = pyqtSignal(bool, float)
+
+    def __init__(self, database_manager, parent=None):
+        super().__init__(parent)
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(1)
+        self._task = WarmupTask(database_manager)
+        self._task.signals.finished.connect(self._on_finished)
+        self.done = False
+        self.connected = False
+
+    def start(self):
+        self.thread_pool.start(self._task)
+
+    def wait(self, timeout_ms=-1):
+        return self.thread_pool.waitForDone(timeout_ms)
+
+    def _on_finished(self, connected, elapsed_ms):
+        self.done = True
+        self.connected = connected
+        logging.info(f"Startup warmup finished in {elapsed_ms:.0f} ms, connected: {connected}")
+        self.finished.emit(connected, elapsed_ms)
@@ -0,0 +1,198 @@
+# table_models.py
+from PyQt5.QtCore import QAbstractTableModel, QEvent, QModelIndex, Qt
+from PyQt5.QtGui import QColor, QFont, QPalette
+from PyQt5.QtWidgets import (QAbstractItemView, QApplication, QHeaderView, QStyle, QStyledItemDelegate,
+                             QStyleOptionButton)
+
+# Same colour as the styled QPushButtons on the other pages
+BUTTON_COLOR = QColor(139, 196, 190)
+
+
+class RowTableModel(QAbstractTableModel):
+    # Read-only table over a list of rows. columns are (header, field) pairs where field is a
+    # position in the row or a function of the row; actions are (label, callback) pairs shown
+    # as button columns after them, callback(row) runs on click. Nothing is created per row,
+    # the view only asks for the cells it paints.
+
+    def __init__(self, columns, actions=(), bold_headers=False, parent=None):
+        super().__init__(parent)
+        self.columns = list(columns)
+        self.actions = list(actions)
+        self.bold_headers = bold_headers
+        self._rows = []
+
+    def set_rows(self, rows, columns=None):
+        self.beginResetModel()
+        self._rows = rows if isinstance(rows, list) else list(rows)
+        if columns is not None:
+            self.columns = list(columns)
+        self.endResetModel()
+
+    def row(self, number):
+        return self._rows[number]
+
+    def is_action(self, column):
+        return column >= len(self.columns)
+
+    def trigger(self, row, column):
+        _, callback = self.actions[column - len(self.columns)]
+        callback(self._rows[row])
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns) + len(self.actions)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        column = index.column()
+        if self.is_action(column):
+            return self.actions[column - len(self.columns)][0]
+        field = self.columns[column][1]
+        row = self._rows[index.row()]
+        return str(field(row) if callable(field) else row[field])
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and section < self.columnCount():
+            if role == Qt.DisplayRole:
+                if self.is_action(section):
+                    return ""
+                header = self.columns[section][0]
+                if header is not None:
+                    return header
+            elif role == Qt.FontRole and self.bold_headers:
+                font = QFont()
+                font.setBold(True)
+                return font
+        return super().headerData(section, orientation, role)
+
+
+class PagedTableModel(RowTableModel):
+    # RowTableModel filled a page at a time. set_page shows the first page and the view pulls
+    # the next one through fetchMore when scrolled to the end. fetch_page(connection, after)
+    # runs on the query runner under key and returns (rows, after), after is None on the last page.
+
+    def __init__(self, runner, key, columns, actions=(), bold_headers=False, on_error=None, parent=None):
+        super().__init__(columns, actions, bold_headers, parent)
+        self.runner = runner
+        self.key = key
+        self.on_error = on_error
+        self._fetch_page = None
+        self._after = None
+        self._pending = False
+        # Bumped on every reset, pages requested before it are dropped
+        self._generation = 0
+
+    def set_rows(self, rows, columns=None):
+        self._stop()
+        super().set_rows(rows, columns)
+
+    def set_page(self, page, fetch_page, columns=None):
+        rows, after = page
+        # Copied, later pages are appended to it
+        self.set_rows(list(rows), columns)
+        if after is not None:
+            self._fetch_page = fetch_page
+            self._after = after
+
+    def complete(self):
+        return self._fetch_page is None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._fetch_page is not None and not self._pending
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        self._pending = True
+        generation = self._generation
+        self.runner.submit(self.key, self._fetch_page, self._after,
+                           on_result=lambda page: self._append(generation, page),
+                           on_error=lambda error: self._failed(generation, error))
+
+    def _append(self, generation, page):
+        if generation != self._generation:
+            return
+        rows, after = page
+        self._pending = False
+        self._after = after
+        if after is None:
+            self._fetch_page = None
+        if rows:
+            first = len(self._rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+            self._rows.extend(rows)
+            self.endInsertRows()
+
+    def _failed(self, generation, error):
+        if generation != self._generation:
+            return
+        # No retry on every scroll, the rows loaded so far stay
+        self._pending = False
+        self._fetch_page = None
+        if self.on_error is not None:
+            self.on_error(error)
+
+    def _stop(self):
+        self._generation += 1
+        self._fetch_page = None
+        self._after = None
+        if self._pending:
+            self.runner.cancel(self.key)
+            self._pending = False
+
+
+class ButtonDelegate(QStyledItemDelegate):
+    # Paints the action columns of a RowTableModel as buttons and runs the action on click
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._pressed = None
+
+    def paint(self, painter, option, index):
+        button = QStyleOptionButton()
+        button.rect = option.rect.adjusted(2, 2, -2, -2)
+        button.text = index.data()
+        button.state = QStyle.State_Enabled
+        if self._pressed == (index.row(), index.column()):
+            button.state |= QStyle.State_Sunken
+        else:
+            button.state |= QStyle.State_Raised
+        button.palette = QPalette(option.palette)
+        button.palette.setColor(QPalette.Button, BUTTON_COLOR)
+        style = option.widget.style() if option.widget is not None else QApplication.style()
+        style.drawControl(QStyle.CE_PushButton, button, painter, option.widget)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseButtonPress and event.button() == Qt.LeftButton:
+            self._pressed = (index.row(), index.column())
+            return True
+        if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
+            pressed, self._pressed = self._pressed, None
+            if pressed == (index.row(), index.column()) and option.rect.contains(event.pos()):
+                model.trigger(index.row(), index.column())
+            return True
+        return False
+
+
+def bind_view(view, model):
+    # Shows model in a QTableView, with button delegates on its action columns
+    previous = view.model()
+    if previous is not None:
+        for column in range(previous.columnCount()):
+            view.setItemDelegateForColumn(column, None)
+    view.setModel(model)
+    delegate = getattr(view, '_button_delegate', None)
+    if delegate is None:
+        delegate = view._button_delegate = ButtonDelegate(view)
+    for column in range(len(model.columns), model.columnCount()):
+        view.setItemDelegateForColumn(column, delegate)
+    view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+    view.setSelectionBehavior(QAbstractItemView.SelectRows)
+    view.setWordWrap(False)
+    # Fixed row heights, the view never measures rows it does not show
+    header = view.verticalHeader()
+    header.setSectionResizeMode(QHeaderView.Fixed)
+    header.setDefaultSectionSize(view.fontMetrics().height() + 12)
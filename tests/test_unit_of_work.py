@@ -0,0 +1,50 @@
+# tests/test_unit_of_work.py
+import pytest
+
+from db_backends import SqliteBackend
+from unit_of_work import UnitOfWork
+
+
+@pytest.fixture
+def connection():
+    connection = SqliteBackend(':memory:').connect()
+    cursor = connection.cursor()
+    cursor.execute("INSERT INTO ServingInfo (ServId, NoServe, ServSize) VALUES (1, 1, 'cup')")
+    connection.commit()
+    yield connection
+    connection.close()
+
+
+def no_serve(connection):
+    cursor = connection.cursor()
+    cursor.execute("SELECT NoServe FROM ServingInfo WHERE ServId = 1")
+    return cursor.fetchone()[0]
+
+
+def test_failed_statement_rolls_back_the_whole_unit(connection):
+    callbacks = []
+    with pytest.raises(Exception):
+        with UnitOfWork(connection) as work:
+            work.execute("UPDATE ServingInfo SET NoServe = 5 WHERE ServId = 1")
+            # Duplicate key, fails when the queued writes are sent on commit
+            work.execute("INSERT INTO ServingInfo (ServId, NoServe, ServSize) VALUES (1, 2, 'g')")
+            work.after_commit(callbacks.append, 'committed')
+
+    # A later, unrelated commit on the same connection must not persist the first update
+    cursor = connection.cursor()
+    cursor.execute("INSERT INTO ServingInfo (ServId, NoServe, ServSize) VALUES (2, 1, 'g')")
+    connection.commit()
+    assert no_serve(connection) == 1
+    assert callbacks == []
+
+
+def test_statements_are_committed_together(connection):
+    callbacks = []
+    with UnitOfWork(connection) as work:
+        work.execute("UPDATE ServingInfo SET NoServe = 5 WHERE ServId = 1")
+        work.execute("INSERT INTO ServingInfo (ServId, NoServe, ServSize) VALUES (2, 2, 'g')")
+        work.after_commit(callbacks.append, 'committed')
+
+    connection.rollback()
+    assert no_serve(connection) == 5
+    assert callbacks == ['committed']
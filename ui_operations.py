@@ -4,14 +4,23 @@ from PyQt5 import QtWidgets, QtCore, QtGui
 from PyQt5.QtWidgets import QMessageBox, QTableWidgetItem, QInputDialog, QPushButton, QLabel, QTextEdit
 from PyQt5.QtCore import pyqtSignal
 from UI_Files.ui_mainwindow import Ui_MainWindow
+from async_queries import AsyncQueryRunner
+from incremental_search import IncrementalSearch
 from database import DatabaseManager
 from customTags_operations import CustomTagOperations
 from food_operations import FoodOperations
 from proteins_operations import ProteinOperations
+from query_metrics import query_metrics
 from recipes_operations import RecipeOperations
-from pyodbc import Error as PyodbcError
+from reference_cache import reference_cache
+from startup_warmup import StartupWarmup
+from table_models import PagedTableModel, RowTableModel, bind_view
 
-logging.basicConfig(level=logging.DEBUG)
+# Recipe search categories that search as you type
+INCREMENTAL_RECIPE_CATEGORIES = ("Recipe Name", "Keyword")
+
+# Rows per page of the SQL recipe searches
+RESULTS_PAGE_SIZE = 200
 
 class CustomButton(QPushButton):
     clicked_with_row = pyqtSignal(int)
@@ -39,13 +48,8 @@ class MainWindow(QtWidgets.QMainWindow):
         self.current_recipe_foods = []
         self.temp_recipe_data = {}
 
-        # Database and custom operations setup
+        # Database and custom operations setup, the connection is made by StartupWarmup below
         self.database_manager = DatabaseManager()
-        if not self.database_manager.connect_to_database():
-            logging.error("Failed to connect to the database")
-            return
-
-        logging.info("Database connected successfully")
 
         # Initialize operations that depend on the database
         self.custom_tag_operations = CustomTagOperations()
@@ -53,17 +57,101 @@ class MainWindow(QtWidgets.QMainWindow):
         self.protein_operations = ProteinOperations()
         self.recipes_operations = RecipeOperations()
 
+        # Searches and page loads run on worker threads, each with its own pooled connection
+        self.async_queries = AsyncQueryRunner(self.database_manager, parent=self)
+        self.busy_indicator = QtWidgets.QProgressBar()
+        self.busy_indicator.setRange(0, 0)
+        self.busy_indicator.setMaximumWidth(120)
+        self.busy_indicator.hide()
+        self.ui.statusbar.addPermanentWidget(self.busy_indicator)
+        self.async_queries.busy_changed.connect(self.on_queries_busy_changed)
+        self.setup_table_models()
+
+        # Search as you type, narrowing terms are answered from the previous results
+        # Results are (rows, after) pages, only a complete result set can be refined
+        self.food_search = IncrementalSearch(
+            self.async_queries, 'food_search', FoodOperations.search_foods_page,
+            on_result=lambda term, page: self.populate_matching_foods_list(page, term),
+            refine=self.refine_food_page, version=FoodOperations.data_version, parent=self)
+        self.recipe_search_category = None
+        self.recipe_search = IncrementalSearch(
+            self.async_queries, 'recipe_search', None,
+            on_result=lambda term, page: self.populate_results_table(page, self.recipe_search_category, term),
+            refine=self.refine_recipe_page, version=RecipeOperations.data_version, parent=self)
+
         self.setup_connections()
         self.connectUI()
-        self.show()
 
-        self.populate_protein_combo_box()
+        # The home page shows right away, what needs the database is enabled once it is connected
+        # and the lookup tables and search indexes are loaded. Pages fill themselves when first opened
+        self.set_database_actions_enabled(False)
+        self.show()
+        self.ui.statusbar.showMessage("Connecting to the database...")
+        self.startup = StartupWarmup(self.database_manager, parent=self)
+        self.startup.finished.connect(self.on_startup_finished)
+        self.startup.start()
+
+    def set_database_actions_enabled(self, enabled):
+        self.ui.findArecipeButton.setEnabled(enabled)
+        self.ui.submitArecipeButton.setEnabled(enabled)
+        self.ui.menuManage_Data.setEnabled(enabled)
+
+    def on_startup_finished(self, connected, elapsed_ms):
+        if not connected:
+            logging.error("Failed to connect to the database")
+            self.ui.statusbar.showMessage("Could not connect to the database.")
+            return
+        logging.info("Database connected successfully")
+        self.set_database_actions_enabled(True)
+        self.ui.statusbar.clearMessage()
+
+    def setup_table_models(self):
+        # Model-backed tables, rows stay plain tuples and only visible cells are drawn
+        # Search results and the foods list load a page at a time as they are scrolled
+        self.results_model = PagedTableModel(
+            self.async_queries, 'recipe_search_more', [],
+            on_error=lambda error: self.show_query_error("loading more recipes", error), parent=self)
+        bind_view(self.ui.resultsTable, self.results_model)
+
+        self.matching_foods_model = PagedTableModel(
+            self.async_queries, 'food_search_more',
+            [("Food Name", lambda food: food.name)],
+            [("Add to Recipe", self.add_food_to_recipe)], bold_headers=True,
+            on_error=lambda error: self.show_query_error("loading more foods", error), parent=self)
+        bind_view(self.ui.recipeIngredientsList, self.matching_foods_model)
+
+        self.tags_model = RowTableModel(
+            [("Tag Name", 1)],
+            [("Edit", lambda tag: self.edit_tag(tag[0])), ("Remove", lambda tag: self.remove_tag(tag[0]))],
+            bold_headers=True, parent=self)
+        # get_recipe_tags rows are {'id', 'name'} dicts
+        self.recipe_tags_model = RowTableModel(
+            [("Tag Name", lambda tag: tag['name'])],
+            [("Remove", lambda tag: self.remove_tag_from_recipe(tag['id']))], bold_headers=True, parent=self)
+        bind_view(self.ui.tagsTableWidget, self.tags_model)
+
+        # (FoodId, FoodName, NoServe, ServSize, Calories, Carbs, Fat, Protein) rows
+        self.foods_model = PagedTableModel(
+            self.async_queries, 'foods_table_more',
+            [("Food Name", 1), ("Quantity", 2), ("Size", 3), ("Calories", 4), ("Carbs", 5), ("Fat", 6),
+             ("Protein", 7)],
+            [("Edit", lambda food: self.edit_food(food[0])), ("Remove", lambda food: self.remove_food(food[0]))],
+            on_error=lambda error: self.show_query_error("loading more foods", error), parent=self)
+        bind_view(self.ui.foodsTable, self.foods_model)
+
+        self.protein_types_model = RowTableModel(
+            [("Protein Type", 1)],
+            [("Edit", lambda protein: self.edit_protein_type(protein[0])),
+             ("Remove", lambda protein: self.remove_protein_type(protein[0]))], bold_headers=True, parent=self)
+        bind_view(self.ui.proteinTypesTable, self.protein_types_model)
 
     def setup_connections(self):
         button_style = "background-color: rgb(139, 196, 190);"
         self.ui.submitButton.clicked.connect(self.handle_recipe_name_submission)
         self.ui.addFoodsButton.clicked.connect(self.navigate_to_add_foods_page)
         self.ui.ingredientSearchButton.clicked.connect(self.search_foods)
+        self.ui.findIngredientSearch.textChanged.connect(self.food_search.set_term)
+        self.ui.searchLineEdit.textChanged.connect(self.on_recipe_criteria_edited)
         self.ui.saveButton_5.clicked.connect(self.save_steps_and_continue)
         self.ui.addStepButton.clicked.connect(self.add_step_to_recipe)
 
@@ -73,6 +161,9 @@ class MainWindow(QtWidgets.QMainWindow):
         self.home_action = QtWidgets.QAction("Home", self)
         self.ui.menuHome.addAction(self.home_action)
         self.home_action.triggered.connect(self.navigate_to_home_page)
+        self.export_query_metrics_action = QtWidgets.QAction("Export Query Metrics...", self)
+        self.ui.menuHome.addAction(self.export_query_metrics_action)
+        self.export_query_metrics_action.triggered.connect(self.export_query_metrics)
         self.ui.actionCustom_Tags.triggered.connect(self.on_action_custom_tags_triggered)
         self.ui.actionFood_and_Nutrition_Info.triggered.connect(self.navigate_to_food_and_nutrition_info_page)
         self.ui.actionProtein_Types.triggered.connect(self.navigate_to_protein_types_page)
@@ -105,6 +196,8 @@ class MainWindow(QtWidgets.QMainWindow):
         logging.debug("Navigating to the Find Recipe page.")
         self.ui.stackedWidget.setCurrentIndex(1)
         logging.debug("Current index set to 1")
+        if self.ui.searchCategoryComboBox.count() == 0:
+            self.populate_search_categories()
 
     def navigate_to_submit_recipe_page(self):
         logging.debug("Navigating to the Submit Recipe page.")
@@ -156,7 +249,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def navigate_to_edit_existing_food_page(self, food_details, food_id):
         try:
-            logging.debug(f"Navigating to edit existing food page for food ID: {food_id}")
+            logging.debug("Navigating to edit existing food page for food ID: %s", food_id)
             self.ui.stackedWidget.setCurrentIndex(10)
 
             # Check if food_details has the expected number of elements
@@ -288,27 +381,15 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def add_tag_to_current_recipe(self, tag_id):
         if RecipeOperations.add_tag_to_recipe(self.database_manager.connection, self.current_recipe_id, tag_id):
-            logging.debug(f"Tag added to recipe successfully")
+            logging.debug("Tag added to recipe successfully")
             self.update_recipe_tags_display()
         else:
             QMessageBox.warning(self, "Error", "Failed to add tag to the recipe")
 
     def update_recipe_tags_display(self):
         tags = RecipeOperations.get_recipe_tags(self.database_manager.connection, self.current_recipe_id)
-
-        self.ui.tagsTableWidget.setRowCount(0)  # Clear the existing rows
-
-        for tag in tags:
-            row_position = self.ui.tagsTableWidget.rowCount()
-            self.ui.tagsTableWidget.insertRow(row_position)
-
-            tag_name_item = QTableWidgetItem(tag[1])
-            self.ui.tagsTableWidget.setItem(row_position, 0, tag_name_item)
-
-            remove_button = QPushButton("Remove")
-            remove_button.setStyleSheet("background-color: rgb(139, 196, 190);")
-            remove_button.clicked.connect(lambda _, t_id=tag[0]: self.remove_tag_from_recipe(t_id))
-            self.ui.tagsTableWidget.setCellWidget(row_position, 1, remove_button)
+        self.recipe_tags_model.set_rows(tags)
+        bind_view(self.ui.tagsTableWidget, self.recipe_tags_model)
 
     def remove_tag_from_recipe(self, tag_id):
         try:
@@ -326,37 +407,14 @@ class MainWindow(QtWidgets.QMainWindow):
     def populate_tags_table(self):
         try:
             logging.debug("Populating Tags table.")
-            cursor = self.database_manager.connection.cursor()
-            cursor.execute("SELECT TagId, TagName FROM CustomTags ORDER BY TagName")
-            tags = cursor.fetchall()
-            self.ui.tagsTableWidget.setRowCount(0)
-            for tag_id, tag_name in tags:
-                self.add_tag_to_table(tag_name, tag_id)
+            tags = self.custom_tag_operations.get_all_tags(self.database_manager.connection)
+            self.tags_model.set_rows(tags)
+            bind_view(self.ui.tagsTableWidget, self.tags_model)
             logging.info("Tags table populated successfully.")
         except Exception as error:
             logging.error(f"Error populating tags table: {error}")
             QMessageBox.warning(self, "Error", f"Error populating tags table: {str(error)}")
 
-    def add_tag_to_table(self, tag_name, tag_id):
-        row_position = self.ui.tagsTableWidget.rowCount()
-        self.ui.tagsTableWidget.insertRow(row_position)
-        tag_item = QTableWidgetItem(tag_name)
-        self.ui.tagsTableWidget.setItem(row_position, 0, tag_item)
-
-        # Adding edit and remove buttons
-        button_style = "background-color: rgb(139, 196, 190);"
-        edit_button = QPushButton("Edit")
-        edit_button.setStyleSheet(button_style)
-        remove_button = QPushButton("Remove")
-        remove_button.setStyleSheet(button_style)
-
-        # Connecting signals to pass the current tag_id
-        edit_button.clicked.connect(lambda _, id=tag_id: self.edit_tag(id))
-        remove_button.clicked.connect(lambda _, id=tag_id: self.remove_tag(id))
-
-        self.ui.tagsTableWidget.setCellWidget(row_position, 1, edit_button)
-        self.ui.tagsTableWidget.setCellWidget(row_position, 2, remove_button)
-
     def edit_tag(self, tag_id):
         logging.info(f"Editing tag ID: {tag_id}")
         current_tag_name = self.find_current_tag_name(tag_id)
@@ -384,10 +442,7 @@ class MainWindow(QtWidgets.QMainWindow):
                 QMessageBox.warning(self, "Error", f"Error removing tag: {str(error)}")
 
     def find_current_tag_name(self, tag_id):
-        cursor = self.database_manager.connection.cursor()
-        cursor.execute("SELECT TagName FROM CustomTags WHERE TagId = ?", (tag_id,))
-        result = cursor.fetchone()
-        return result[0] if result else ""
+        return self.custom_tag_operations.get_tag_name(self.database_manager.connection, tag_id)
 
     def populate_tags_list(self):
         try:
@@ -436,8 +491,8 @@ class MainWindow(QtWidgets.QMainWindow):
             new_protein_id = self.ui.proteinComboBox.currentData()
             new_recipe_notes = self.ui.notesTextEdit.toPlainText()
 
-            logging.debug(f"New servings: {new_servings}, New protein ID: {new_protein_id}")
-            logging.debug(f"Current recipe ID: {self.current_recipe_id}")
+            logging.debug("New servings: %s, New protein ID: %s", new_servings, new_protein_id)
+            logging.debug("Current recipe ID: %s", self.current_recipe_id)
 
             # Update the recipe
             success = RecipeOperations.update_recipe(
@@ -448,7 +503,7 @@ class MainWindow(QtWidgets.QMainWindow):
                 notes=new_recipe_notes
             )
 
-            logging.debug(f"Recipe update success: {success}")
+            logging.debug("Recipe update success: %s", success)
 
             if success:
                 logging.info("Recipe updated successfully.")
@@ -457,13 +512,13 @@ class MainWindow(QtWidgets.QMainWindow):
                 QMessageBox.information(self, "Success", "Recipe saved successfully!")
 
                 # Populate the recipe page with the new information
-                logging.debug(f"Populating recipe page for recipe ID: {self.current_recipe_id}")
+                logging.debug("Populating recipe page for recipe ID: %s", self.current_recipe_id)
                 self.populate_recipe_page(self.current_recipe_id)
 
                 # Navigate to the recipe page
-                logging.debug(f"Current stacked widget index before switch: {self.ui.stackedWidget.currentIndex()}")
+                logging.debug("Current stacked widget index before switch: %s", self.ui.stackedWidget.currentIndex())
                 self.ui.stackedWidget.setCurrentIndex(2)
-                logging.debug(f"Current stacked widget index after switch: {self.ui.stackedWidget.currentIndex()}")
+                logging.debug("Current stacked widget index after switch: %s", self.ui.stackedWidget.currentIndex())
             else:
                 logging.warning("Failed to save recipe")
                 QMessageBox.warning(self, "Error", "Failed to save recipe. Please try again.")
@@ -473,17 +528,22 @@ class MainWindow(QtWidgets.QMainWindow):
             QMessageBox.critical(self, "Error", f"An error occurred while saving and showing the recipe: {str(error)}")
 
     def populate_recipe_page(self, recipe_id):
-        try:
-            logging.info(f"Populating recipe page for recipe ID: {recipe_id}")
+        logging.info(f"Populating recipe page for recipe ID: {recipe_id}")
 
-            # Verify that self.current_recipe_id is set correctly
-            logging.debug(f"Current recipe ID: {self.current_recipe_id}")
-            if self.current_recipe_id != recipe_id:
-                logging.warning(f"Mismatch between current_recipe_id ({self.current_recipe_id}) and passed recipe_id ({recipe_id})")
+        # Verify that self.current_recipe_id is set correctly
+        logging.debug("Current recipe ID: %s", self.current_recipe_id)
+        if self.current_recipe_id != recipe_id:
+            logging.warning(f"Mismatch between current_recipe_id ({self.current_recipe_id}) and passed recipe_id ({recipe_id})")
 
-            # Fetch recipe details
-            recipe = RecipeOperations.get_recipe_details(self.database_manager.connection, recipe_id)
-            logging.debug(f"Recipe details: {recipe}")
+        # Fetch the whole recipe in one round trip, off the GUI thread
+        self.async_queries.submit('recipe_page', RecipeOperations.load_recipe_aggregate, recipe_id,
+                                  on_result=lambda aggregate: self.show_recipe_page(recipe_id, aggregate),
+                                  on_error=lambda error: self.show_query_error("loading the recipe", error))
+
+    def show_recipe_page(self, recipe_id, aggregate):
+        try:
+            recipe = aggregate['details'] if aggregate else None
+            logging.debug("Recipe details: %s", recipe)
 
             if recipe is None:
                 logging.warning(f"No recipe found with ID: {recipe_id}")
@@ -492,33 +552,33 @@ class MainWindow(QtWidgets.QMainWindow):
 
             # Populate recipe name
             self.ui.recipeNameLabel.setText(recipe['name'])
-            logging.debug(f"Set recipe name: {recipe['name']}")
+            logging.debug("Set recipe name: %s", recipe['name'])
 
             # Populate serving size
             self.ui.servingSizeLine.setText(str(recipe['servings']))
-            logging.debug(f"Set serving size: {recipe['servings']}")
+            logging.debug("Set serving size: %s", recipe['servings'])
 
             # Populate ingredients
-            ingredients = RecipeOperations.get_recipe_foods(self.database_manager.connection, recipe_id)
+            ingredients = aggregate['foods']
             self.ui.ingredientsTable.clear()
             for ingredient in ingredients:
                 item = QtWidgets.QListWidgetItem(f"{ingredient['name']} - {ingredient['amount']} {ingredient['unit']}")
                 self.ui.ingredientsTable.addItem(item)
-            logging.debug(f"Populated ingredients: {len(ingredients)} items")
+            logging.debug("Populated ingredients: %s items", len(ingredients))
 
             # Populate steps
-            steps = RecipeOperations.get_recipe_steps(self.database_manager.connection, recipe_id)
+            steps = aggregate['steps']
             self.ui.stepsTable.clear()
             for step in steps:
                 item = QtWidgets.QListWidgetItem(f"{step['number']}. {step['description']}")
                 self.ui.stepsTable.addItem(item)
-            logging.debug(f"Populated steps: {len(steps)} items")
+            logging.debug("Populated steps: %s items", len(steps))
 
             # Populate notes tab
             self.ui.notesTextEdit_2.setPlainText(recipe['notes'])
 
-            # Calculate and populate nutrition tab
-            total_nutrition = RecipeOperations.get_recipe_total_nutrition(self.database_manager.connection, recipe_id)
+            # Populate nutrition tab
+            total_nutrition = aggregate['nutrition']
             self.ui.nutritionTable.setRowCount(1)
             self.ui.nutritionTable.setColumnCount(4)
             self.ui.nutritionTable.setHorizontalHeaderLabels(["Calories", "Carbs (g)", "Fat (g)", "Protein (g)"])
@@ -529,92 +589,212 @@ class MainWindow(QtWidgets.QMainWindow):
 
             # Populate tags tab
             self.ui.tagsListWidget_2.clear()
-            tags = RecipeOperations.get_recipe_tags(self.database_manager.connection, recipe_id)
-            for tag in tags:
+            for tag in aggregate['tags']:
                 self.ui.tagsListWidget_2.addItem(tag['name'])
 
             logging.info("Recipe page populated successfully")
 
-            self.ui.recipePage.update()
-            QtWidgets.QApplication.processEvents()
-
-            logging.info("Forced UI update after populating the recipe page")
-
         except Exception as error:
             logging.error(f"Error populating recipe page: {error}", exc_info=True)
             QMessageBox.critical(self, "Error", f"An error occurred while loading the recipe: {str(error)}")
 
     def execute_recipe_search(self):
         category = self.ui.searchCategoryComboBox.currentText()
-        criteria = self.ui.searchCriteriaLineEdit.text()
+        criteria = self.ui.searchLineEdit.text()
         try:
             self.fetch_recipes_by_criteria(category, criteria)
         except Exception as error:
             logging.error(f"Error performing serach: {error}")
             QMessageBox.warning(self, "Error", f"Error performing search: {str(error)}")
 
+    def on_recipe_criteria_edited(self, text):
+        category = self.ui.searchCategoryComboBox.currentText()
+        if category not in INCREMENTAL_RECIPE_CATEGORIES:
+            return
+        if category != self.recipe_search_category:
+            # Results of another category cannot be refined
+            self.recipe_search.invalidate()
+            self.recipe_search.query = lambda connection, term: self.query_recipes(connection, category, term)
+            self.recipe_search_category = category
+        self.recipe_search.set_term(text)
+
+    def refine_recipe_page(self, page, term):
+        # Name matches narrow like LIKE '%term%', ranked keyword results have to be searched again
+        rows, after = page
+        if self.recipe_search_category != "Recipe Name" or after is not None:
+            return None
+        return [row for row in rows if term.casefold() in (row[1] or "").casefold()], None
+
+    def refine_food_page(self, page, term):
+        foods, after = page
+        if after is not None:
+            return None
+        return [food for food in foods if term.casefold() in (food.name or "").casefold()], None
+
     def fetch_recipes_by_criteria(self, category, criteria):
-        logging.debug(f"Fetching recipes by criteria: Category - {category}, Criteria - {criteria}")
+        logging.debug("Fetching recipes by criteria: Category - %s, Criteria - %s", category, criteria)
+        # A newer search replaces one still running
+        self.async_queries.submit('recipe_search', self.query_recipes, category, criteria,
+                                  on_result=lambda page: self.populate_results_table(page, category, criteria),
+                                  on_error=lambda error: self.show_query_error("performing search", error))
+
+    def query_recipes(self, connection, category, criteria, after=None):
+        # Runs on a worker thread, returns a (rows, after) page for the results table. The SQL
+        # searches page in RecId order and after is the last RecId shown, None once all are in
         try:
-            cursor = self.database_manager.connection.cursor()
+            if category == "Keyword":
+                return self.fetch_recipes_by_keyword(connection, criteria), None
+            if category == "Closest Macros":
+                return self.fetch_recipes_by_macro_target(connection, criteria), None
+            if category == "Meal Plan":
+                return self.fetch_meal_plan(connection, criteria), None
+            if category in ("Calorie Range", "Macros"):
+                return self.fetch_recipes_by_macros(connection, category, criteria), None
+
+            cursor = connection.cursor()
             query_map = {
                 "Recipe Name": ("SELECT * FROM Recipes WHERE RecName LIKE ?", ("%" + criteria + "%",)),
-                "Calorie Range": ("SELECT * FROM Recipes WHERE RecCals BETWEEN ? AND ?", tuple(map(int, criteria.split("-")))),
-                "Macros": ("""SELECT * FROM Recipes
-                                WHERE RecProtein BETWEEN ? AND ?
-                                AND RecCarbs BETWEEN ? AND ?
-                                AND RecFat BETWEEN ? AND ?""", tuple(map(int, criteria.split(',')))),
                 "Meal Type": ("SELECT * FROM Recipes WHERE MealTypeId IN (SELECT MealTypeId FROM MealType WHERE MealTypeName = ?)",
                 (criteria,)),
                 "Protein Type": ("SELECT * FROM Recipes WHERE ProteinId IN (SELECT ProteinId FROM Proteins WHERE ProteinName = ?)",
                 (criteria,)),
-                "Custom Tags": ("SELECT * FROM Recipes WHERE TagId IN (SELECT TagId FROM CustomTags WHERE TagName = ?)",
+                "Custom Tags": ("SELECT * FROM Recipes WHERE RecId IN (SELECT RT.RecipeId FROM RecipeTags RT JOIN CustomTags CT ON RT.TagId = CT.TagId WHERE CT.TagName = ?)",
                 (criteria,))
             }
-            query, params = query_map(category, (None, None))
+            query, params = query_map.get(category, (None, None))
             if query is None:
                 raise ValueError(f"Invalid category: {category}")
 
+            if after is not None:
+                query += " AND RecId > ?"
+                params += (after,)
+            query += " ORDER BY RecId OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY"
+            params += (RESULTS_PAGE_SIZE,)
             cursor.execute(query, params)
             results = cursor.fetchall()
-            self.populate_results_table(results)
-            logging.info("Recipe search executed nad results populated successfully.")
+            logging.info("Recipe search executed successfully.")
+            return results, (results[-1][0] if len(results) == RESULTS_PAGE_SIZE else None)
         except Exception as error:
             logging.error(f"Error fetching recipes: {error}")
             raise
 
-    def populate_results_table(self, results):
+    def fetch_recipes_by_keyword(self, connection, criteria, k=50):
+        # Ranked full-text search over names, ingredients, steps, instructions and notes
+        ranked = RecipeOperations.search_recipes(connection, criteria, k)
+        if not ranked:
+            return []
+        recipe_ids = [recipe_id for recipe_id, _ in ranked]
+        return RecipeOperations.get_recipe_rows(connection, recipe_ids)
+
+    def fetch_recipes_by_macros(self, connection, category, criteria):
+        # Box query on the in-memory macro index instead of BETWEEN scans on Recipes
+        if category == "Calorie Range":
+            low, high = map(int, criteria.split("-"))
+            bounds = {'calories': (low, high)}
+        else:
+            values = list(map(int, criteria.split(',')))
+            bounds = {'protein': tuple(values[0:2]), 'carbs': tuple(values[2:4]), 'fat': tuple(values[4:6])}
+        recipe_ids = RecipeOperations.find_recipes_by_macros(connection, bounds)
+        return RecipeOperations.get_recipe_rows(connection, recipe_ids)
+
+    def fetch_recipes_by_macro_target(self, connection, criteria, k=20):
+        # criteria like "protein=40, carbs=50, fat=15, calories=600, per serving, tag=Quick, protein type=Chicken"
+        target, per_serving, tag_id, protein_id = {}, False, None, None
+        for part in criteria.split(','):
+            name, _, value = part.partition('=')
+            name, value = name.strip().lower(), value.strip()
+            if name in ('calories', 'carbs', 'fat', 'protein'):
+                target[name] = float(value)
+            elif name == 'per serving':
+                per_serving = True
+            elif name == 'k':
+                k = int(value)
+            elif name == 'tag':
+                tag_id = self.find_reference_id(connection, 'tags', value)
+            elif name == 'protein type':
+                protein_id = self.find_reference_id(connection, 'proteins', value)
+            elif name:
+                raise ValueError(f"Unknown macro target '{part.strip()}'")
+        if not target:
+            raise ValueError("Enter at least one of calories, carbs, fat or protein, e.g. protein=40, fat=15")
+
+        ranked = RecipeOperations.nearest_recipes_by_macros(connection, target, k,
+                                                            per_serving=per_serving, tag_id=tag_id,
+                                                            protein_id=protein_id)
+        return RecipeOperations.get_recipe_rows(connection, [recipe_id for recipe_id, _ in ranked])
+
+    def fetch_meal_plan(self, connection, criteria):
+        # criteria like "calories=2000, protein=150, carbs=200, fat=70, days=3, meals=Breakfast/Lunch/Dinner,
+        # tag=Quick, budget=2", one row per planned meal: (day, meal, servings, recipe id, name, macros)
+        target, days, slots, tag_ids, budget = {}, 1, None, [], 1.0
+        for part in criteria.split(','):
+            name, _, value = part.partition('=')
+            name, value = name.strip().lower(), value.strip()
+            if name in ('calories', 'carbs', 'fat', 'protein'):
+                target[name] = float(value)
+            elif name == 'days':
+                days = int(value)
+            elif name == 'budget':
+                budget = float(value)
+            elif name == 'tag':
+                tag_ids.append(self.find_reference_id(connection, 'tags', value))
+            elif name == 'meals':
+                meals = [meal.strip() for meal in value.split('/') if meal.strip()]
+                slots = [(meal, self.find_reference_id(connection, 'meal_types', meal), 1 / len(meals))
+                         for meal in meals]
+            elif name:
+                raise ValueError(f"Unknown meal plan setting '{part.strip()}'")
+        if not target:
+            raise ValueError("Enter a daily target, e.g. calories=2000, protein=150")
+
+        plan = RecipeOperations.plan_meals(connection, target, days, slots, tag_ids, budget)
+        if not plan or not plan['days']:
+            return []
+        recipe_ids = [meal['recipe_id'] for day in plan['days'] for meal in day['meals']]
+        names = {row[0]: row[1] for row in RecipeOperations.get_recipe_rows(connection, recipe_ids)}
+        rows = []
+        for day_number, day in enumerate(plan['days'], start=1):
+            for meal in day['meals']:
+                nutrition = meal['nutrition']
+                rows.append((day_number, meal['slot'], meal['servings'], meal['recipe_id'],
+                             names.get(meal['recipe_id']),
+                             *(round(nutrition[name], 1) for name in ('calories', 'carbs', 'fat', 'protein'))))
+        return rows
+
+    def find_reference_id(self, connection, table, name):
+        for item_id, item_name in reference_cache.rows(connection, table):
+            if (item_name or "").casefold() == name.casefold():
+                return item_id
+        raise ValueError(f"No {table[:-1].replace('_', ' ')} named '{name}'")
+
+    def populate_results_table(self, page, category, criteria):
         logging.debug("Populating results table with search results.")
-        self.ui.resultsTableWidget.setRowCount(0)
-        for row_number, row_data in enumerate(results):
-            self.ui.resultsTableWidget.insertRow(row_number)
-            for column_number, data in enumerate(row_data):
-                self.ui.resultsTableWidget.setItem(row_number, column_number, QTableWidgetItem(str(data)))
+        self.ui.resultsTable.setEnabled(True)
+        # Row shapes differ between search categories, the columns follow the widest row
+        width = max((len(row_data) for row_data in page[0]), default=0)
+        self.results_model.set_page(
+            page, lambda connection, after: self.query_recipes(connection, category, criteria, after),
+            columns=[(None, column) for column in range(width)])
         logging.info("Results table populated successfully.")
 
     def onSearchCategoryChanged(self, index):
-        logging.debug(f"Search category changed to index {index}")
-        self.ui.searchCriteriaLineEdit.hide()
-        self.ui.minCalLineEdit.hide()
-        self.ui.maxCalLineEdit.hide()
+        logging.debug("Search category changed to index %s", index)
+        # Typed results of the previous category cannot be refined
+        self.recipe_search.invalidate()
+        self.recipe_search_category = None
+        # Every category reads its criteria from searchLineEdit
+        self.ui.calorieMinLineEdit.hide()
+        self.ui.calorieMaxLineEdit.hide()
         self.ui.fatLineEdit.hide()
         self.ui.carbsLineEdit.hide()
         self.ui.proteinLineEdit.hide()
-        if index == 0:  # Recipe Name
-            self.ui.searchCriteriaLineEdit.show()
-        elif index == 1:  # Calorie Range
-            self.ui.minCalLineEdit.show()
-            self.ui.maxCalLineEdit.show()
+        if index == 1:  # Calorie Range
+            self.ui.calorieMinLineEdit.show()
+            self.ui.calorieMaxLineEdit.show()
         elif index == 2:  # Macros
             self.ui.fatLineEdit.show()
             self.ui.carbsLineEdit.show()
             self.ui.proteinLineEdit.show()
-        elif index == 3:  # Meal Type
-            self.ui.searchCriteriaLineEdit.show()
-        elif index == 4:  # Protein Type
-            self.ui.searchCriteriaLineEdit.show()
-        elif index == 5:  # Custom Tags
-            self.ui.searchCriteriaLineEdit.show()
         logging.debug("UI updated based on selected search category.")
 
     def populate_search_categories(self):
@@ -665,7 +845,7 @@ class MainWindow(QtWidgets.QMainWindow):
         logging.info("Foods list table updated successfully.")
 
     def handle_food_selection(self, food):
-        logging.debug(f"Food selected: {food.FoodName}")
+        logging.debug("Food selected: %s", food.FoodName)
         self.selected_food = food
         self.ui.numberOfServingsInput.show()
         self.ui.servingSizeInput.show()
@@ -675,7 +855,7 @@ class MainWindow(QtWidgets.QMainWindow):
         try:
             logging.debug("handle_recipe_name_submission called")
             recipe_name = self.ui.recipeNamefield.text().strip()
-            logging.debug(f"Recipe name: {recipe_name}")
+            logging.debug("Recipe name: %s", recipe_name)
             if recipe_name:
                 logging.debug("Checking if recipe name exists.")
                 if not RecipeOperations.recipe_name_exists(self.database_manager.connection, recipe_name):
@@ -709,12 +889,12 @@ class MainWindow(QtWidgets.QMainWindow):
         logging.debug("add_step_to_recipe called")
         try:
             step_text = self.ui.stepTextEdit.toPlainText().strip()
-            logging.debug(f"Step text: {step_text}")
+            logging.debug("Step text: %s", step_text)
             if step_text:
                 row_position = self.ui.recipeStepsTable.rowCount()
                 self.insert_step(step_text, row_position)
                 self.ui.stepTextEdit.clear()
-                logging.debug(f"Step added successfully at row {row_position}")
+                logging.debug("Step added successfully at row %s", row_position)
             else:
                 QMessageBox.warning(self, "Error", "Please enter a step before adding.")
         except Exception as error:
@@ -749,23 +929,23 @@ class MainWindow(QtWidgets.QMainWindow):
         self.ui.recipeStepsTable.setCellWidget(row_position, 2, move_up_button)
         self.ui.recipeStepsTable.setCellWidget(row_position, 3, move_down_button)
 
-        logging.debug(f"Step inserted at row {row_position}")
+        logging.debug("Step inserted at row %s", row_position)
 
     def delete_step(self, row):
-        logging.debug(f"Attempting to delete step at row {row}")
+        logging.debug("Attempting to delete step at row %s", row)
         confirm = QMessageBox.question(self, 'Delete Step',
                                        "Are you sure you want to delete this step?",
                                        QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
         if confirm == QMessageBox.Yes:
             self.ui.recipeStepsTable.removeRow(row)
-            logging.debug(f"Step at row {row} deleted")
+            logging.debug("Step at row %s deleted", row)
             for i in range(row, self.ui.recipeStepsTable.rowCount()):
                 self.update_step_buttons(i)
         else:
             logging.debug("Step deletion cancelled")
 
     def move_step_up(self, row):
-        logging.debug(f"Moving step up from row {row}")
+        logging.debug("Moving step up from row %s", row)
         if row > 0:
             for col in range(self.ui.recipeStepsTable.columnCount()):
                 current_item = self.ui.recipeStepsTable.takeItem(row, col)
@@ -775,10 +955,10 @@ class MainWindow(QtWidgets.QMainWindow):
 
             self.update_step_buttons(row - 1)
             self.update_step_buttons(row)
-            logging.debug(f"Step moved up to row {row - 1}")
+            logging.debug("Step moved up to row %s", row - 1)
 
     def move_step_down(self, row):
-        logging.debug(f"Moving step down from row {row}")
+        logging.debug("Moving step down from row %s", row)
         if row < self.ui.recipeStepsTable.rowCount() - 1:
             for col in range(self.ui.recipeStepsTable.columnCount()):
                 current_item = self.ui.recipeStepsTable.takeItem(row, col)
@@ -788,7 +968,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
             self.update_step_buttons(row + 1)
             self.update_step_buttons(row)
-            logging.debug(f"Step moved down to row {row + 1}")
+            logging.debug("Step moved down to row %s", row + 1)
 
     def update_step_buttons(self, row):
         button_style = "background-color: rgb(139, 196, 190);"
@@ -924,21 +1104,23 @@ class MainWindow(QtWidgets.QMainWindow):
             QMessageBox.warning(self, "Error", "Please enter a search term.")
 
     def search_foods(self):
-        try:
-            search_term = self.ui.findIngredientSearch.text().strip()
-            if not search_term:
-                QMessageBox.warning(self, "Error", "Please enter a search term.")
-                return
+        search_term = self.ui.findIngredientSearch.text().strip()
+        if not search_term:
+            QMessageBox.warning(self, "Error", "Please enter a search term.")
+            return
 
-            matching_foods = FoodOperations.search_foods(self.database_manager.connection, search_term)
-            if not matching_foods:
+        self.food_search.run_now(search_term, on_result=self.show_matching_foods)
+
+    def show_matching_foods(self, search_term, page):
+        try:
+            if not page[0]:
                 reply = QMessageBox.question(self, 'Food Not Found',
                                             f"'{search_term}' not found. Do you want to add it?",
                                             QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
                 if reply == QMessageBox.Yes:
                     self.navigate_to_edit_food_page(new_food_name=search_term)
             else:
-                self.populate_matching_foods_list(matching_foods)
+                self.populate_matching_foods_list(page, search_term)
 
             logging.info(f"Food search completed for term: {search_term}")
         except Exception as error:
@@ -947,18 +1129,10 @@ class MainWindow(QtWidgets.QMainWindow):
 
 
 
-    def populate_matching_foods_list(self, foods):
+    def populate_matching_foods_list(self, page, search_term):
         try:
-            self.ui.recipeIngredientsList.setRowCount(0)
-            for food in foods:
-                row = self.ui.recipeIngredientsList.rowCount()
-                self.ui.recipeIngredientsList.insertRow(row)
-                self.ui.recipeIngredientsList.setItem(row, 0, QTableWidgetItem(food.name))
-                add_button = QPushButton("Add to Recipe")
-                add_button.setStyleSheet("background-color: rgb(139, 196, 190);")
-                add_button.clicked.connect(lambda _, f=food: self.add_food_to_recipe(f))
-                self.ui.recipeIngredientsList.setCellWidget(row, 1, add_button)
-
+            self.matching_foods_model.set_page(
+                page, lambda connection, after: FoodOperations.search_foods_page(connection, search_term, after))
             logging.info("Matching foods list populated successfully.")
         except Exception as error:
             logging.error(f"Error populating matching foods list: {error}")
@@ -1021,7 +1195,7 @@ class MainWindow(QtWidgets.QMainWindow):
                                             QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
 
             if reply == QMessageBox.Yes:
-                RecipeOperations.remove_food_from_recipe(self.database_manager.connection, rec_food_id)
+                RecipeOperations.remove_recipe_food(self.database_manager.connection, rec_food_id)
                 QMessageBox.information(self, "Success", "Food item removed from recipe successfully.")
                 self.populate_foods_list()  # Refresh the list
         except Exception as e:
@@ -1115,7 +1289,7 @@ class MainWindow(QtWidgets.QMainWindow):
             QMessageBox.warning(self, "Error", f"Failed to remove food from recipe: {str(error)}")
 
     def insert_recipe_into_database(self, recipe_name):
-        logging.debug(f"Inserting recipe into database: {recipe_name}")
+        logging.debug("Inserting recipe into database: %s", recipe_name)
         try:
             cursor = self.database_manager.connection.cursor()
             query = "INSERT INTO Recipes (RecName) VALUES (?)"
@@ -1132,7 +1306,7 @@ class MainWindow(QtWidgets.QMainWindow):
             return None
 
     def navigate_to_add_recipe_details_page(self, rec_id):
-        logging.debug(f"Navigating to add recipe details page for recipe ID: {rec_id}")
+        logging.debug("Navigating to add recipe details page for recipe ID: %s", rec_id)
         pass
 
     def add_new_food_item(self):
@@ -1182,48 +1356,24 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def populate_foods_table(self):
         logging.debug("Populating foods table")
+        self.async_queries.submit('foods_table', FoodOperations.get_foods_page,
+                                  on_result=self.fill_foods_table,
+                                  on_error=lambda error: self.show_query_error("loading foods", error))
+
+    def fill_foods_table(self, page):
         try:
-            cursor = self.database_manager.connection.cursor()
-            query = """SELECT Foods.FoodId, Foods.FoodName, ServingInfo.NoServe, ServingInfo.ServSize, 
-                       Nutrition.Calories, Nutrition.Carbs, Nutrition.Fat, Nutrition.Protein 
-                       FROM Foods
-                       JOIN ServingInfo ON Foods.ServId = ServingInfo.ServId
-                       JOIN Nutrition ON Foods.FoodId = Nutrition.FoodId"""
-            cursor.execute(query)
-            rows = cursor.fetchall()
-
-            self.ui.foodsTable.setRowCount(0)
-            for row_number, row_data in enumerate(rows):
-                self.ui.foodsTable.insertRow(row_number)
-                food_id = row_data[0]
-                for column_number, data in enumerate(row_data[1:]):
-                    self.ui.foodsTable.setItem(row_number, column_number, QTableWidgetItem(str(data)))
-                self.add_food_action_buttons(row_number, food_id)
+            self.foods_model.set_page(page, FoodOperations.get_foods_page)
             logging.info("Foods table populated successfully")
-        except PyodbcError as error:
+        except Exception as error:
             logging.error(f"Error populating foods table: {error}")
             QMessageBox.warning(self, "Error", f"Failed to laod foods: {str(error)}")
 
-    def add_food_action_buttons(self, row, food_id):
-        button_style = "background-color: rgb(139, 196, 190);"
-
-        edit_button = QPushButton("Edit")
-        edit_button.setStyleSheet(button_style)
-        edit_button.clicked.connect(lambda _, id=food_id: self.edit_food(id))
-
-        remove_button = QPushButton("Remove")
-        remove_button.setStyleSheet(button_style)
-        remove_button.clicked.connect(lambda _, id=food_id: self.remove_food(id))
-
-        self.ui.foodsTable.setCellWidget(row, self.ui.foodsTable.columnCount() -2, edit_button)
-        self.ui.foodsTable.setCellWidget(row, self.ui.foodsTable.columnCount() -1, remove_button)
-
     def edit_food(self, food_id):
         try:
             logging.info(f"Editing food ID: {food_id}")
             food_details = self.get_food_details(food_id)
             if food_details:
-                logging.debug(f"Food details retrieved: {food_details}")
+                logging.debug("Food details retrieved: %s", food_details)
                 self.navigate_to_edit_existing_food_page(food_details, food_id)
             else:
                 logging.warning(f"Failed to fetch details for food Id: {food_id}")
@@ -1310,20 +1460,11 @@ class MainWindow(QtWidgets.QMainWindow):
         else:
             QMessageBox.information(self, "Input Error", "Protein type name cannot be empty.")
 
-    def get_protein_names(self, connection):
-        try:
-            cursor = connection.cursor()
-            cursor.execute("SELECT ProteinId, ProteinName FROM Proteins ORDER BY ProteinName")
-            return cursor.fetchall()
-        except Exception as error:
-            logging.error(f"Error fetching protein name: {error}")
-            return[]
-
     def populate_protein_combo_box(self):
         logging.debug("Populating protein combo box")
         try:
-            proteins = self.get_protein_names(self.database_manager.connection)
-            logging.debug(f"Fetched proteins {proteins}")
+            proteins = ProteinOperations.get_all_proteins(self.database_manager.connection)
+            logging.debug("Fetched proteins %s", proteins)
             self.ui.proteinComboBox.clear()
             self.ui.proteinComboBox.addItem("Select Protein Type", None)
             for protein_id, protein_name in proteins:
@@ -1335,37 +1476,13 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def populate_protein_types_table(self):
         try:
-            cursor = self.database_manager.connection.cursor()
-            cursor.execute("SELECT ProteinId, ProteinName FROM Proteins ORDER BY ProteinName")
-            protein_types = cursor.fetchall()
-
-            self.ui.proteinTypesTable.setRowCount(0)
-            self.ui.proteinTypesTable.setColumnCount(3)
-
-            for row, (protein_id, protein_name) in enumerate(protein_types):
-                self.ui.proteinTypesTable.insertRow(row)
-                self.ui.proteinTypesTable.setItem(row, 0, QTableWidgetItem(protein_name))
-                self.add_protein_type_action_buttons(row, protein_id)
-
+            protein_types = ProteinOperations.get_all_proteins(self.database_manager.connection)
+            self.protein_types_model.set_rows(protein_types)
             logging.info("Protein types table populated successfully.")
         except Exception as error:
             logging.error(f"Error populating protein types table: {error}")
             QMessageBox.warning(self, "Error", f"Failed to load protein types: {str(error)}")
 
-    def add_protein_type_action_buttons(self, row, protein_id):
-        button_style = "background-color: rgb(139, 196, 190);"
-
-        edit_button = QPushButton("Edit")
-        edit_button.setStyleSheet(button_style)
-        edit_button.clicked.connect(lambda _, id=protein_id: self.edit_protein_type(id))
-
-        remove_button = QPushButton("Remove")
-        remove_button.setStyleSheet(button_style)
-        remove_button.clicked.connect(lambda _, id=protein_id: self.remove_protein_type(id))
-
-        self.ui.proteinTypesTable.setCellWidget(row, 1, edit_button)
-        self.ui.proteinTypesTable.setCellWidget(row, 2, remove_button)
-
     def edit_protein_type(self, protein_id):
         current_name = self.get_protein_type_name(protein_id)
         new_name, ok = QInputDialog.getText(self, "Edit Protein Type", "Enter new protein type name:",
@@ -1392,23 +1509,40 @@ class MainWindow(QtWidgets.QMainWindow):
                 QMessageBox.warning(self, "Error", f"Failed to remove protein type: {str(error)}")
 
     def get_protein_type_name(self, protein_id):
-        cursor = self.database_manager.connection.cursor()
-        cursor.execute("SELECT ProteinName FROM Proteins WHERE ProteinId = ?", (protein_id,))
-        result = cursor.fetchone()
-        return result[0] if result else ""
+        return ProteinOperations.get_protein_name(self.database_manager.connection, protein_id)
+
+    def on_queries_busy_changed(self, busy):
+        self.busy_indicator.setVisible(busy)
+        if busy:
+            self.ui.statusbar.showMessage("Loading...")
+        else:
+            self.ui.statusbar.clearMessage()
 
-    def get_protein_names(self, connection):
+    def export_query_metrics(self):
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Export Query Metrics", "query_metrics.json",
+                                                        "JSON files (*.json)")
+        if not path:
+            return
         try:
-            cursor = connection.cursor()
-            cursor.execute("SELECT ProteinId, ProteinName FROM Proteins ORDER BY ProteinName")
-            return cursor.fetchall()
-        except Exception as error:
-            logging.error(f"Error fetching protein names: {error}")
-            return[]
+            query_metrics.export_json(path)
+            self.ui.statusbar.showMessage(f"Query metrics exported to {path}", 5000)
+        except OSError as error:
+            logging.error(f"Error exporting query metrics: {error}")
+            QMessageBox.warning(self, "Error", f"Could not export the query metrics: {error}")
+
+    def show_query_error(self, action, error):
+        QMessageBox.warning(self, "Error", f"An error occurred while {action}: {str(error)}")
 
     def closeEvent(self, event):
         # Close database connection if initialized
         logging.info("Closing application and disconnection from database.")
+        if hasattr(self, 'startup'):
+            # The pool is still being created while the warmup runs
+            self.startup.wait(30000)
+        if hasattr(self, 'async_queries'):
+            # Drop pending work and let running queries return their connections first
+            self.async_queries.cancel_all()
+            self.async_queries.wait(5000)
         if hasattr(self, 'database_manager'):
             self.database_manager.close_connection()
         event.accept()
\ No newline at end of file
@@ -0,0 +1,102 @@
+# unit_of_work.py
+import logging
+
+from db_backends import dialect_of
+
+# Parameters per SQL Server batch, under its limit of 2100 per request
+MAX_BATCH_PARAMS = 2000
+
+
+def _flatten_params(params):
+    # Same calling conventions as cursor.execute: (sql, (a, b)) or (sql, a, b)
+    if len(params) == 1 and isinstance(params[0], (list, tuple)):
+        return tuple(params[0])
+    return tuple(params)
+
+
+def _batches(statements):
+    # Joins the statements into as few T-SQL batches as the parameter limit allows
+    batch, params = [], []
+    for sql, statement_params in statements:
+        if batch and len(params) + len(statement_params) > MAX_BATCH_PARAMS:
+            yield batch, params
+            batch, params = [], []
+        batch.append(sql.strip().rstrip(';'))
+        params.extend(statement_params)
+    if batch:
+        yield batch, params
+
+
+class UnitOfWork:
+    # One transaction for the statements of one logical write. Reads run right away on cursor,
+    # execute() queues a write. The queued writes are sent on commit, as a single batch on SQL
+    # Server, followed by a single commit; an exception inside the block rolls everything back.
+    # Callbacks registered with after_commit (cache updates) run once the data is committed.
+    #     with UnitOfWork(connection) as work:
+    #         work.execute("DELETE FROM RecipeSteps WHERE RecId = ?", (recipe_id,))
+    #         work.after_commit(recipe_cache.invalidate, recipe_id)
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.cursor = connection.cursor()
+        self._statements = []
+        self._callbacks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            # commit rolls back itself when a queued write fails
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+    def execute(self, sql, *params):
+        self._statements.append((sql, _flatten_params(params)))
+        return self
+
+    def after_commit(self, callback, *args, **kwargs):
+        self._callbacks.append((callback, args, kwargs))
+
+    def flush(self):
+        # Sends the queued writes inside the open transaction, e.g. before reading them back
+        statements, self._statements = self._statements, []
+        if not statements:
+            return
+        if dialect_of(self.connection) == 'mssql':
+            for batch, params in _batches(statements):
+                # NOCOUNT keeps the row count messages of the earlier statements out of the results,
+                # XACT_ABORT makes an error abort the whole batch instead of just its statement
+                sql = "SET NOCOUNT ON;\nSET XACT_ABORT ON;\n" + ";\n".join(batch) + ";"
+                if params:
+                    self.cursor.execute(sql, params)
+                else:
+                    self.cursor.execute(sql)
+        else:
+            # SQLite runs in process, there is no round trip to save
+            for sql, params in statements:
+                self.cursor.execute(sql, params)
+        logging.debug("Unit of work flushed %s statement(s)", len(statements))
+
+    def commit(self):
+        try:
+            self.flush()
+            self.connection.commit()
+        except Exception:
+            # The writes sent before the failing one would otherwise stay pending on the
+            # connection, and the next commit would persist them
+            self.rollback()
+            raise
+        callbacks, self._callbacks = self._callbacks, []
+        for callback, args, kwargs in callbacks:
+            callback(*args, **kwargs)
+
+    def rollback(self):
+        self._statements.clear()
+        self._callbacks.clear()
+        try:
+            self.connection.rollback()
+        except Exception as error:
+            logging.warning(f"Rollback of unit of work failed: {error}")